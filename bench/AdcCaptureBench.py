@@ -0,0 +1,191 @@
+# Benchmark: background ADC capture with the timer and the DMA backends.
+#
+# First both channels are captured on their own, with nothing else running, at
+# several rates.  For each backend and rate it reports the samples captured a
+# second and the share of the CPU the capture takes, from the Pico costs of
+# each ADC read and interrupt entry.  The simulated Timer does not charge an
+# interrupt entry, so one is added here for each timer tick.  The timer backend
+# converts every sample on the CPU, so it runs out of CPU long before the ADC
+# runs out of speed, and rates where a tick takes longer than the time between
+# ticks are left out.  The DMA backend only interrupts once a block.
+#
+# Then a consumer that takes a fixed time to use each block is run against the
+# DMA backend.  Once it takes longer than a block, blocks are missed and the
+# block being used is written over before the consumer is done with it.
+#
+# Last it checks on the host that read() hands out the block itself and does
+# not allocate, and compares that with copying the block.
+#
+#   python3 bench/AdcCaptureBench.py --seconds 2
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+from SimClock import clock, SimulationEnd
+
+import micropython
+
+from AdcCapture      import AdcCapture
+from AdcDmaBackend   import AdcDmaBackend
+from AdcTimerBackend import AdcTimerBackend
+
+CHANNELS = [1, 0]       # Potentiometers A and B
+RATES    = [1000, 5000, 20000, 100000]
+
+
+def makeBackend(name: str):
+    if ( name == "dma" ):
+        return AdcDmaBackend()
+    return AdcTimerBackend()
+
+
+# Run until the end time, sleeping like the test bed main loop
+def runUntilEnd():
+    try:
+        while ( True ):
+            clock.idle()
+    except SimulationEnd:
+        pass
+
+
+# Capture for seconds with nothing else running
+#
+# Returns (samples per second of each channel, share of the CPU used).
+def throughput(name: str, hz: int, blockSamples: int, seconds: float):
+    SimHardware.reset(seconds)
+    SimHardware.costs.update(SimHardware.PICO_COSTS)
+    SimHardware.setAdc(27, SimHardware.noisyPot(30000, 300, seed=1))
+    SimHardware.setAdc(26, SimHardware.noisyPot(10000, 300, seed=2))
+
+    busy   = [0]
+    charge = SimHardware.charge
+
+    def countingCharge(kind, count=1):
+        busy[0] += SimHardware.costs[kind] * count
+        charge(kind, count)
+
+    lastUs = [0]
+
+    def handler(capture):
+        lastUs[0] = clock.nowUs
+
+    backend = makeBackend(name)
+    capture = AdcCapture(CHANNELS, blockSamples, backend)
+    SimHardware.charge = countingCharge
+    try:
+        capture.start(hz, handler)
+        runUntilEnd()
+    finally:
+        SimHardware.charge = charge
+        capture.stop()
+
+    if ( name == "timer" ):
+        busy[0] += (capture.sequence * blockSamples + backend.index // len(CHANNELS)) * SimHardware.costs["irqEntry"]
+    if ( lastUs[0] == 0 ):
+        return 0.0, busy[0] / (seconds * 1000000)
+    return capture.sequence * blockSamples * 1000000 / lastUs[0], busy[0] / (seconds * 1000000)
+
+
+# Pico time of one timer tick: an interrupt entry and a read of each channel
+def timerTickUs():
+    costs = SimHardware.PICO_COSTS
+    return costs["irqEntry"] + len(CHANNELS) * costs["adcRead"]
+
+
+# Run a consumer that takes costUs to use each block
+#
+# Returns (blocks used, blocks missed, blocks written over while in use).
+def consumer(hz: int, blockSamples: int, costUs: int, seconds: float):
+    SimHardware.reset(seconds)
+    SimHardware.costs.update(SimHardware.PICO_COSTS)
+    SimHardware.setAdc(27, SimHardware.noisyPot(30000, 300, seed=1))
+    SimHardware.setAdc(26, SimHardware.noisyPot(10000, 300, seed=2))
+
+    counts  = { "used": 0, "overwritten": 0 }
+    capture = AdcCapture(CHANNELS, blockSamples, AdcDmaBackend())
+
+    def useBlock(arg):
+        block = capture.read()
+        if ( block == None ):
+            return
+        capture.average(block, 0)
+        clock.charge(costUs)
+        counts["used"] += 1
+        if ( not capture.valid() ):
+            counts["overwritten"] += 1
+
+    def handler(capture):
+        try:
+            micropython.schedule(useBlock, None)
+        except RuntimeError:
+            pass
+
+    capture.start(hz, handler)
+    runUntilEnd()
+    capture.stop()
+    return counts["used"], capture.missed, counts["overwritten"]
+
+
+# Host bytes allocated for each block read, handing out the block with read()
+# and copying it
+def readAllocations(blockSamples: int, reads: int):
+    capture = AdcCapture(CHANNELS, blockSamples, AdcDmaBackend())
+    results = []
+    for copy in (False, True):
+        kept = []
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for n in range(reads):
+            capture.blockDone()
+            block = capture.read()
+            if ( copy ):
+                block = bytes(block)
+            kept.append(block)
+        allocated = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        shared = all(isinstance(block, memoryview) and block.obj in capture.buffers for block in kept)
+        # Less the list that keeps the blocks alive until they are counted
+        allocated -= sys.getsizeof(kept)
+        results.append((allocated / reads, shared))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=2.0, help="simulated time of each run")
+    parser.add_argument("--block", type=int, default=200, help="samples of each channel in a block")
+    args = parser.parse_args(argv)
+
+    print("Both channels captured alone, %d samples a block" % args.block)
+    print("backend   rate Hz  captured/s    CPU")
+    for name in ("timer", "dma"):
+        for hz in RATES:
+            if ( name == "timer" and timerTickUs() * hz > 1000000 ):
+                # The next tick would be due before this one is done
+                print("%-7s  %7d  too fast, a tick takes %d us" % (name, hz, timerTickUs()))
+                continue
+            rate, cpu = throughput(name, hz, args.block, args.seconds)
+            print("%-7s  %7d  %10.0f  %5.1f%%" % (name, hz, rate, cpu * 100))
+
+    hz      = 20000
+    blockUs = args.block * 1000000 // hz
+    print("Consumer of DMA blocks at %d Hz, one block every %d us" % (hz, blockUs))
+    print("consumer us  used  missed  written over")
+    for costUs in (blockUs // 5, blockUs * 4 // 5, blockUs * 6 // 5, blockUs * 5 // 2):
+        used, missed, overwritten = consumer(hz, args.block, costUs, args.seconds)
+        print("%11d  %4d  %6d  %12d" % (costUs, used, missed, overwritten))
+
+    (viewBytes, shared), (copyBytes, copied) = readAllocations(args.block, 1000)
+    print("Bytes allocated for each block read: memoryview %.0f (%s the capture buffer), copy %.0f" %
+          (viewBytes, "shares" if shared else "does not share", copyBytes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# Benchmark: host/MotorAnalysis.py on a synthetic run file in the GB range.
+#
+# Writes a run file of made up characterization runs: each run drives two
+# motors up and down a 32 step duty staircase, forward then backward, with a
+# first order speed response, a dead band and a little speed noise.  Each
+# motor of each run gets its own speed, start duty, stall duty and time
+# constant, which are kept so the analysis can be checked against them.
+#
+# The analysis is then run in a child process, streaming the file through
+# memory mapped chunks and, to compare, loading it whole.  It reports the
+# time, the throughput and the child's peak memory, and how close the dead
+# band edges and rise times came to the made up ones.
+#
+# Needs numpy.  The run file is kept, so later runs can skip writing it with --keep.
+#
+#   python3 bench/AnalysisBench.py --gigabytes 1 --path /tmp/runs.ttm
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HOST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "host")
+sys.path.insert(0, HOST_DIR)
+
+import MotorAnalysis
+
+from MotorAnalysis import RECORD
+
+SAMPLE_US   = 2000      # 500 records a second for each motor
+HOLD        = 250       # Records at each step of the staircase
+REST        = 500       # Records stopped before each direction
+STEPS       = 32
+MOTORS      = 2
+BATCH_RUNS  = 50
+
+
+# The command schedule of one run: (direction, duty, records) for each segment
+def schedule():
+    stairs = [int((n + 0.5) * 65536 / STEPS) for n in range(STEPS)]
+    segments = []
+    for direction in (MotorAnalysis.FORWARD, MotorAnalysis.BACKWARD):
+        segments.append((0, 0, REST))
+        for duty in stairs + stairs[::-1]:
+            segments.append((direction, duty, HOLD))
+    return segments
+
+
+# Make up the motors of count runs
+def makeMotors(rng, count: int):
+    shape = (count, MOTORS)
+    start = rng.uniform(14000, 22000, shape)
+    return {
+        "noLoadRpm": rng.normal(200, 10, shape),
+        "startDuty": start,
+        "stallDuty": start * rng.uniform(0.6, 0.8, shape),
+        "tauMs":     rng.uniform(40, 80, shape),
+    }
+
+
+# Returns the records of a batch of runs, run by run and motor by motor
+def makeRuns(rng, motors, firstRun: int, segments):
+    count  = len(motors["tauMs"])
+    total  = sum(records for direction, duty, records in segments)
+    out    = np.empty((count, MOTORS, total), RECORD)
+    rpm    = np.zeros((count, MOTORS))
+    offset = 0
+    for direction, duty, records in segments:
+        running = rpm >= 5.0
+        edge    = np.where(running, motors["stallDuty"], motors["startDuty"])
+        if ( direction == 0 or duty < 1 ):
+            target = np.zeros_like(rpm)
+        else:
+            useful = (duty - motors["stallDuty"]) / (65535 - motors["stallDuty"])
+            target = np.where(duty >= edge, motors["noLoadRpm"] * (0.15 + 0.85 * useful), 0.0)
+        # Coasting to a stop takes three times as long as a driven change of speed
+        tau    = np.where(target == 0, 3 * motors["tauMs"], motors["tauMs"]) * 1000.0
+        t      = np.arange(records) * SAMPLE_US
+        speed  = target[..., None] + (rpm - target)[..., None] * np.exp(-t / tau[..., None])
+
+        part = out[:, :, offset:offset + records]
+        part["rpm"]       = speed
+        part["duty"]      = duty
+        part["direction"] = direction
+        part["pins"]      = 0 if direction == 0 else (2 if direction == MotorAnalysis.FORWARD else 1)
+        rpm     = speed[..., -1]
+        offset += records
+
+    out["run"]     = (firstRun + np.arange(count))[:, None, None]
+    out["motor"]   = np.arange(MOTORS)[None, :, None]
+    out["time_us"] = np.arange(total) * SAMPLE_US
+    out["rpm"]    += rng.normal(0, 0.3, out.shape).astype(np.float32)
+    # A measured speed is never negative for these directions
+    np.maximum(out["rpm"], 0, out=out["rpm"])
+    return out.reshape(-1)
+
+
+# Write a run file of about the given size.  Returns the made up motors.
+def writeRuns(path: str, gigabytes: float, seed: int):
+    rng      = np.random.default_rng(seed)
+    segments = schedule()
+    perRun   = MOTORS * sum(records for direction, duty, records in segments) * RECORD.itemsize
+    runs     = max(1, int(gigabytes * (1 << 30) / perRun))
+    motors   = makeMotors(rng, runs)
+    if ( os.path.exists(path) ):
+        os.remove(path)
+    for first in range(0, runs, BATCH_RUNS):
+        batch = { name: value[first:first + BATCH_RUNS] for name, value in motors.items() }
+        MotorAnalysis.appendRuns(path, makeRuns(rng, batch, first, segments))
+    np.savez(path + ".truth.npz", **motors)
+    return motors
+
+
+# Returns the peak memory of this process in MB.  VmHWM is used where there is
+# one, as ru_maxrss of a new process can hold the peak of the process that
+# started it.
+def peakMB():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if ( line.startswith("VmHWM:") ):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Run in the child process: analyze the file and print what the parent checks
+def child(path: str, chunk: int):
+    start = time.perf_counter()
+    segments, result = MotorAnalysis.analyze(path, chunk)
+    seconds = time.perf_counter() - start
+    peak    = peakMB()
+    truth = np.load(path + ".truth.npz")
+    forward = 0
+    startError = result["startDuty"][:, :, forward] - truth["startDuty"]
+    stallError = result["stallDuty"][:, :, forward] - truth["stallDuty"]
+    riseRatio  = result["riseMs"][:, :, forward] / (truth["tauMs"] * np.log(9))
+    print(json.dumps({
+        "seconds":    seconds,
+        "peakMB":     peak,
+        "segments":   len(segments),
+        "runs":       len(result["runs"]),
+        "startError": [float(np.nanmean(startError)), float(np.nanmax(np.abs(startError)))],
+        "stallError": [float(np.nanmean(stallError)), float(np.nanmax(np.abs(stallError)))],
+        "riseRatio":  float(np.nanmedian(riseRatio)),
+        "mismatch":   float(np.nanmedian(result["runMismatch"][:, forward])),
+    }))
+
+
+# Returns the result of child() for one chunk size
+def runChild(path: str, chunk: int):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", path, "--chunk", str(chunk)],
+                            stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--gigabytes", type=float, default=1.0, help="size of the run file")
+    parser.add_argument("--path", default=os.path.join(tempfile.gettempdir(), "AnalysisBench.ttm"))
+    parser.add_argument("--keep", action="store_true", help="use the run file from an earlier run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--chunk", type=int, default=1 << 20, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if ( args.child ):
+        child(args.child, args.chunk)
+        return
+
+    if ( not (args.keep and os.path.exists(args.path)) ):
+        start = time.perf_counter()
+        writeRuns(args.path, args.gigabytes, args.seed)
+        seconds = time.perf_counter() - start
+        print("Wrote %s: %.2f GB in %.1f s" % (args.path, os.path.getsize(args.path) / (1 << 30), seconds))
+    size    = os.path.getsize(args.path)
+    records = MotorAnalysis.recordCount(args.path)
+    print("%d records of %d bytes" % (records, RECORD.itemsize))
+    print()
+
+    print("%-22s %9s %9s %10s %12s" % ("", "seconds", "MB/s", "records/s", "peak MB"))
+    for label, chunk in (("chunks of 256k records", 1 << 18), ("chunks of 1M records", 1 << 20),
+                         ("chunks of 4M records", 1 << 22), ("whole file in memory", 0)):
+        result = runChild(args.path, chunk)
+        print("%-22s %9.2f %9.0f %10.3g %12.0f" %
+              (label, result["seconds"], size / (1 << 20) / result["seconds"], records / result["seconds"],
+               result["peakMB"]))
+
+    print()
+    print("%d runs, %d segments" % (result["runs"], result["segments"]))
+    print("Start duty found - made up: mean %+.0f, worst %.0f counts (staircase step %d)" %
+          (result["startError"][0], result["startError"][1], 65536 // STEPS))
+    print("Stall duty found - made up: mean %+.0f, worst %.0f counts" % tuple(result["stallError"]))
+    print("Rise time found / first order 10-90%% rise: median %.2f" % result["riseRatio"])
+    print("Median forward mismatch between the motors of a run: %.1f%%" % (100 * result["mismatch"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Benchmark: time from a button being pressed to its motor changing direction.
+#
+# Runs TTMotorTestBed.py against the simulated Pico with bouncing button
+# presses at random times and noisy potentiometers.  The latency of a press is
+# the simulated time from the first contact to the first write to one of that
+# motor's direction pins or to its PWM duty.  Pico operation costs are set to rough MicroPython
+# figures so the handlers take simulated time.
+#
+#   python3 bench/ButtonLatencyBench.py --seconds 600 --presses 200
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+
+# Button GPIO pin --> the motor's (IN1, IN2, PWM) GPIO pins
+BUTTON_PINS = { 17: (5, 6, 4), 16: (9, 10, 8) }
+
+
+def percentile(values, fraction: float):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=600.0)
+    parser.add_argument("--presses", type=int, default=200)
+    parser.add_argument("--bounces", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng     = random.Random(args.seed)
+    presses = []
+
+    def setup():
+        SimHardware.costs.update(SimHardware.PICO_COSTS)
+        SimHardware.setAdc(27, SimHardware.noisyPot(30000, 300, seed=args.seed))
+        SimHardware.setAdc(26, SimHardware.noisyPot(20000, 300, seed=args.seed + 1))
+        # Presses are at least a second apart so each one is a separate toggle
+        slot = (args.seconds - 2) / args.presses
+        for n in range(args.presses):
+            gpio    = rng.choice(list(BUTTON_PINS))
+            seconds = 1 + n * slot + rng.uniform(0, slot / 2)
+            SimHardware.pressButton(gpio, seconds, holdMs=150, bounces=args.bounces, seed=rng.random())
+            presses.append((int(seconds * 1000000), gpio))
+
+    stats = SimRunner.runScript(SCRIPT, args.seconds, setup=setup)
+
+    latencies = []
+    missed    = 0
+    for pressUs, gpio in presses:
+        writes = [rec[0] for rec in SimHardware.trace
+                  if rec[1] in (SimHardware.TRACE_PIN, SimHardware.TRACE_DUTY) and
+                     rec[2] in BUTTON_PINS[gpio] and rec[0] >= pressUs]
+        if ( writes and writes[0] - pressUs < 1000000 ):
+            latencies.append(writes[0] - pressUs)
+        else:
+            missed += 1
+
+    print("Simulated %.0f s in %.2f s, %d presses, %d without a motor write" %
+          (stats["simSeconds"], stats["wallSeconds"], len(presses), missed))
+    if ( latencies ):
+        print("Button to motor latency (us): min %d  median %d  p99 %d  max %d" %
+              (min(latencies), percentile(latencies, 0.5), percentile(latencies, 0.99), max(latencies)))
+    print("Wakeups per simulated second: %.1f" % (stats["wakeups"] / stats["simSeconds"]))
+
+
+if __name__ == "__main__":
+    main()
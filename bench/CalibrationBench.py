@@ -0,0 +1,158 @@
+# Benchmark: dead band calibration and the potentiometer to duty lookup table.
+#
+# First TTMotorTestBed.py is run with calibrate set and simulated motors with
+# encoders, so the calibration is measured automatically and saved.  The start
+# and stall duties found are compared with the ones the motor model gives.  The
+# potentiometers read from 400 to 64800, like the test bed ones, and are swept
+# back and forth while their range is measured.
+#
+# Then the test bed is run open loop, with and without the saved calibration,
+# while potentiometer A is turned slowly from one end to the other.  For each
+# it reports how much of the knob leaves the motor stopped, and the top duty.
+#
+# Last it compares the host time of one table lookup with working the same
+# mapping out with arithmetic.  On the Pico the arithmetic is worse than on the
+# host, as its products are too big for a small int and allocate memory.
+#
+#   python3 bench/CalibrationBench.py
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+from SimMotor import SimMotor
+
+from MotorCalibration import MotorCalibration
+
+SCRIPT  = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+POT_MIN = 400
+POT_MAX = 64800
+VOLTS   = 7.4
+
+# Larger ints are allocated on the heap in MicroPython on the Pico
+SMALL_INT_MAX = (1 << 30) - 1
+
+
+# Potentiometer turned from end to end and back every periodSeconds, resting
+# at each end for a quarter of the time
+def sweepPot(periodSeconds: float):
+    quarterUs = int(periodSeconds * 250000)
+
+    def source(nowUs):
+        phase = (nowUs // quarterUs) % 4
+        part  = nowUs % quarterUs
+        if ( phase == 0 ):
+            return POT_MIN
+        elif ( phase == 1 ):
+            return POT_MIN + (POT_MAX - POT_MIN) * part // quarterUs
+        elif ( phase == 2 ):
+            return POT_MAX
+        return POT_MAX - (POT_MAX - POT_MIN) * part // quarterUs
+
+    return source
+
+
+def calibrate(path: str):
+    def setup():
+        SimHardware.setAdc(27, sweepPot(2.0))
+        SimHardware.setAdc(26, sweepPot(2.0))
+        SimMotor(4, 5, 6, gpioEncoder=2, gpioStandby=15, batteryVolts=VOLTS)
+        SimMotor(8, 9, 10, gpioEncoder=3, gpioStandby=15, batteryVolts=VOLTS)
+
+    constants = { "calibrate": True, "calibrationFile": path, "gpioEncA": 2, "gpioEncB": 3 }
+    stats = SimRunner.runScript(SCRIPT, 60, setup=setup, constants=constants)
+    with open(path) as file:
+        return json.load(file), stats["output"]
+
+
+# Turn pot A from POT_MIN to POT_MAX over seconds with motor A FORWARD
+def knob(path: str, seconds: float):
+    motors = []
+
+    def setup():
+        SimHardware.setAdc(27, SimHardware.turnPot(POT_MIN, POT_MAX, 1, seconds, noise=300, seed=1))
+        SimHardware.pressButton(17, 0.5)
+        motor = SimMotor(4, 5, 6, gpioStandby=15, batteryVolts=VOLTS)
+        motor.record(10000)
+        motors.append(motor)
+
+    SimRunner.runScript(SCRIPT, seconds + 2, setup=setup, constants={ "calibrationFile": path })
+
+    startUs = 1000000
+    spanUs  = seconds * 1000000
+    moving  = [us for us, rpm, amps in motors[0].history if us > startUs and rpm > 0.5]
+    dead    = (moving[0] - startUs) / spanUs if moving else 1.0
+    topDuty = max(rec[3] for rec in SimHardware.traceOf(SimHardware.TRACE_DUTY, 4))
+    return dead, topDuty
+
+
+# Host time of mapping one value with the table and with arithmetic, both
+# written inline, and the largest intermediate value of the arithmetic
+def mappingCost(calibration):
+    table  = calibration.buildTable()
+    shift  = calibration.TABLE_SHIFT
+    values = list(range(0, 65536, 7))
+    low    = calibration.potMin + calibration.offBand
+    high   = calibration.potMax - calibration.offBand
+    full   = calibration.FULL
+    start  = calibration.lowDuty()
+    span   = full - start
+
+    begin = time.perf_counter_ns()
+    for value in values:
+        duty = table[value >> shift]
+    tableNs = (time.perf_counter_ns() - begin) / len(values)
+
+    begin = time.perf_counter_ns()
+    for value in values:
+        if ( value <= low ):
+            duty = 0
+        elif ( value >= high ):
+            duty = full
+        else:
+            duty = start + (value - low) * span // (high - low)
+    arithmeticNs = (time.perf_counter_ns() - begin) / len(values)
+
+    return tableNs, arithmeticNs, (high - low) * span
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=20.0, help="time to turn the knob end to end")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "calibration.json")
+        values, output = calibrate(path)
+        print("Saved calibration: %s" % json.dumps(values))
+
+        # Duties the motor model starts at, and stops at, with the default
+        # friction, start drive, rated voltage and no-load speed
+        friction, startDrive = 0.12, 0.22
+        expectStart = startDrive * 6.0 / VOLTS * 65535
+        expectStall = friction * 6.0 / VOLTS * 65535
+        print("Motor model: starts at duty %.0f, stops at duty %.0f" % (expectStart, expectStall))
+
+        print("calibration       dead knob  top duty")
+        for label, file in (("none", os.path.join(folder, "missing.json")), ("calibrated", path)):
+            dead, topDuty = knob(file, args.seconds)
+            print("%-16s  %8.0f%%  %8d" % (label, dead * 100, topDuty))
+
+        calibration = MotorCalibration(offBand=1500)
+        calibration.fromDict(values["A"])
+        tableNs, arithmeticNs, largest = mappingCost(calibration)
+        print("Mapping one value: table %.0f ns, arithmetic %.0f ns (host)" % (tableNs, arithmeticNs))
+        print("Largest product in the arithmetic: %d, %s the Pico's small int limit of %d" %
+              (largest, "over" if largest > SMALL_INT_MAX else "under", SMALL_INT_MAX))
+
+
+if __name__ == "__main__":
+    main()
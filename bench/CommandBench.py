@@ -0,0 +1,157 @@
+# Benchmark: round trip time and command rate of the binary command protocol.
+#
+# The Pico end is src/CommandProtocol.py driving two TTMotors on the simulated
+# machine module, in a host thread that reads one end of a pseudo terminal.
+# host/CommandClient.py talks to the other end, the way it talks to the Pico's
+# USB serial port.  The times are host times over the pseudo terminal, so they
+# leave out the USB link and the Pico's slower parsing, but show what batching
+# commands into frames and keeping several frames in flight buys.
+#
+# It also checks that parsing and running a frame does not allocate on the Pico
+# end, apart from the reply write.
+#
+#   python3 bench/CommandBench.py --commands 20000
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import tty
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "sim"))
+sys.path.insert(0, os.path.join(ROOT, "host"))
+
+import SimHardware
+import SimRunner
+
+import CommandClient
+
+from CommandProtocol import CommandProtocol
+from TTMotor         import TTMotor
+
+# (commands per frame, frames in flight)
+SETTINGS = [(1, 1), (1, 8), (16, 1), (16, 8), (50, 8)]
+
+
+# Stream that writes the replies to a file descriptor
+class FdStream:
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    def write(self, data):
+        return os.write(self.fd, data)
+
+
+# Stream that throws the replies away
+class NullStream:
+    def write(self, data):
+        return len(data)
+
+
+def makeMotors():
+    SimHardware.reset()
+    return [TTMotor(4, 5, 6), TTMotor(8, 9, 10)]
+
+
+# Pico end: feed everything read from fd to the protocol until it is closed
+def serve(fd: int, protocol):
+    while ( True ):
+        try:
+            data = os.read(fd, 4096)
+        except OSError:
+            return
+        if ( not data ):
+            return
+        protocol.feed(data)
+
+
+async def latency(client, count: int):
+    times = []
+    for n in range(count):
+        start = time.perf_counter_ns()
+        await client.ping()
+        times.append((time.perf_counter_ns() - start) / 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99)]
+
+
+async def rate(client, commands: int, batch: int, window: int):
+    client.window = asyncio.Semaphore(window)
+    frames = commands // batch
+
+    async def sender(first: int):
+        for n in range(first, frames, window):
+            await client.request(*(CommandClient.speed(n & 1, (n * 97) % 65535 - 32767) for m in range(batch)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender(first) for first in range(window)))
+    return frames * batch / (time.perf_counter() - start)
+
+
+async def session(args):
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    protocol = CommandProtocol(makeMotors(), FdStream(slave))
+    thread   = threading.Thread(target=serve, args=(slave, protocol), daemon=True)
+    thread.start()
+
+    client = CommandClient.CommandClient(timeout=1.0)
+    client.openFd(master)
+    try:
+        median, worst = await latency(client, args.pings)
+        print("Ping round trip: median %.0f us, 99th percentile %.0f us" % (median, worst))
+
+        print("per frame  in flight  commands/s")
+        for batch, window in SETTINGS:
+            print("%9d  %9d  %10.0f" % (batch, window, await rate(client, args.commands, batch, window)))
+
+        motors = await client.query()
+        print("Motor state after the run: %s, %d frames sent again, %d bad frames" %
+              (motors, client.resent, protocol.badFrames))
+    finally:
+        client.close()
+        os.close(slave)
+
+
+# Host bytes allocated and host time for each frame of batch speed commands
+def parseCost(batch: int, frames: int):
+    protocol = CommandProtocol(makeMotors(), NullStream())
+    frame    = CommandClient.encodeFrame(1, b"".join(CommandClient.speed(n & 1, 1000 + n) for n in range(batch)))
+    protocol.feed(frame)
+
+    start = time.perf_counter_ns()
+    for n in range(frames):
+        protocol.feed(frame)
+    hostNs = (time.perf_counter_ns() - start) / frames
+
+    # The simulator's trace of the duty writes would grow
+    SimHardware.traceOn = False
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(frames):
+        protocol.feed(frame)
+    kept = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return hostNs / batch, kept
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--commands", type=int, default=20000, help="speed commands sent for each setting")
+    parser.add_argument("--pings", type=int, default=2000, help="pings timed one at a time")
+    args = parser.parse_args(argv)
+
+    asyncio.run(session(args))
+
+    perCommandNs, kept = parseCost(16, 2000)
+    print("Parsing and running a speed command: %.0f ns of host time, %d bytes kept after 2000 frames" %
+          (perCommandNs, kept))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Benchmark: button interrupt handler time and missed or extra presses under bounce.
+#
+# Runs TTMotorTestBed.py against the simulated Pico for several contact bounce
+# patterns.  For each pattern it reports how long the button interrupt handler
+# runs, both in simulated Pico time and in host time, and compares the number of
+# presses with the number of direction changes the motors made.  A press that
+# does not change the direction is missed; a direction change without a press
+# is extra, usually bounce on release being taken as a new press.
+#
+#   python3 bench/DebounceBench.py --presses 100
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+
+# Button GPIO pin --> the motor's (IN1, IN2) GPIO pins
+BUTTON_PINS = { 17: (5, 6), 16: (9, 10) }
+
+# (bounce transitions per edge, bounce window in ms)
+PATTERNS = ( (0, 0), (2, 1), (5, 5), (10, 10), (20, 20) )
+
+
+# Count the changes in a motor's direction pins in the trace
+def directionChanges(pins):
+    levels  = { pins[0]: 0, pins[1]: 0 }
+    current = (0, 0)
+    changes = 0
+    for rec in SimHardware.traceOf(SimHardware.TRACE_PIN):
+        if ( rec[2] in levels ):
+            levels[rec[2]] = rec[3]
+            state = (levels[pins[0]], levels[pins[1]])
+            if ( state != current ):
+                current = state
+                changes += 1
+    return changes
+
+
+def runPattern(bounces: int, bounceMs: int, presses: int, seed: int):
+    rng    = random.Random(seed)
+    counts = { gpio: 0 for gpio in BUTTON_PINS }
+
+    def setup():
+        SimHardware.costs.update(SimHardware.PICO_COSTS)
+        SimHardware.timeIsr = True
+        # The motors only drive their direction pins when they have a speed
+        SimHardware.setAdc(27, 30000)
+        SimHardware.setAdc(26, 30000)
+        for n in range(presses):
+            gpio = rng.choice(list(BUTTON_PINS))
+            counts[gpio] += 1
+            SimHardware.pressButton(gpio, 1 + n * 0.6, holdMs=rng.randint(80, 300),
+                                    bounces=bounces, bounceMs=bounceMs, seed=rng.random())
+
+    SimRunner.runScript(SCRIPT, 2 + presses * 0.6, setup=setup)
+    SimHardware.timeIsr = False
+
+    missed = 0
+    extra  = 0
+    for gpio, pins in BUTTON_PINS.items():
+        # Every press moves the motor to the next direction in the toggle cycle,
+        # which is exactly one change of the direction pins.
+        changes = directionChanges(pins)
+        if ( changes < counts[gpio] ):
+            missed += counts[gpio] - changes
+        else:
+            extra  += changes - counts[gpio]
+
+    simUs  = [t[0] for t in SimHardware.isrTimes]
+    hostNs = [t[1] for t in SimHardware.isrTimes]
+    return len(simUs), max(simUs), sum(hostNs) / len(hostNs) / 1000, missed, extra
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--presses", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    print("bounces  window  handler runs  max sim us  mean host us  missed  extra")
+    for bounces, bounceMs in PATTERNS:
+        runs, maxSimUs, meanHostUs, missed, extra = runPattern(bounces, bounceMs, args.presses, args.seed)
+        print("%7d  %4dms  %12d  %10d  %12.1f  %6d  %5d" %
+              (bounces, bounceMs, runs, maxSimUs, meanHostUs, missed, extra))
+
+
+if __name__ == "__main__":
+    main()
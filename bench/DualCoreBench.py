@@ -0,0 +1,100 @@
+# Benchmark: control loop jitter with the test bed on one core and on two cores.
+#
+# Runs TTMotorTestBed.py with both potentiometers being turned back and forth,
+# a button pressed every half second and a status line printed every statusMs,
+# so there is plenty of printing.  Printing is charged usbByte microseconds of
+# Pico time per byte; a larger cost stands in for a slow USB host.
+#
+# The control loop period is measured from the times potentiometer A is read.
+# On one core the reads come from the potentiometer timer through
+# micropython.schedule(), so they wait for any print that is running.  On two
+# cores the control loop on core 1 reads them and core 0 does the printing.
+# It also reports the time from each button press to the first write to its
+# motor, a direction pin or, while ramping, its PWM duty.
+#
+#   python3 bench/DualCoreBench.py --seconds 30
+
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+
+NOMINAL_US = 20000      # potSampleMs in the test bed
+BUTTON_A   = 17
+PINS_A     = (4, 5, 6)     # PWM, IN1 and IN2 of motor A
+
+
+def run(seconds: float, dualCore: bool, usbByteUs: int):
+    readTimes = []
+    presses   = []
+
+    def setup():
+        SimHardware.costs.update(SimHardware.PICO_COSTS)
+        SimHardware.costs["usbByte"] = usbByteUs
+
+        turnA = SimHardware.turnPot(5000, 60000, 0, 1.5, noise=300, seed=1)
+        turnB = SimHardware.turnPot(60000, 5000, 0, 1.5, noise=300, seed=2)
+
+        # Back and forth every 3 seconds, logging the read times of pot A
+        def potA(nowUs):
+            readTimes.append(nowUs)
+            return turnA(nowUs % 3000000 if (nowUs // 3000000) % 2 == 0 else 3000000 - nowUs % 3000000)
+
+        def potB(nowUs):
+            return turnB(nowUs % 3000000)
+
+        SimHardware.setAdc(27, potA)
+        SimHardware.setAdc(26, potB)
+        at = 0.25
+        while ( at < seconds - 0.5 ):
+            SimHardware.pressButton(BUTTON_A, at, holdMs=100, bounces=2, seed=int(at * 100))
+            presses.append(int(at * 1000000))
+            at += 0.5
+
+    constants = { "dualCore": dualCore, "statusMs": 50 }
+    SimRunner.runScript(SCRIPT, seconds, setup=setup, constants=constants)
+
+    # Reads less than 1ms apart are the oversampled reads of one sample
+    starts = []
+    for timeUs in readTimes:
+        if ( not starts or timeUs - starts[-1] > 1000 ):
+            starts.append(timeUs)
+    periods = [b - a for a, b in zip(starts, starts[1:])]
+    errors  = sorted(abs(period - NOMINAL_US) for period in periods)
+
+    # Press to the first write to motor A after it
+    changes   = [rec[0] for rec in SimHardware.trace
+                 if rec[1] in (SimHardware.TRACE_PIN, SimHardware.TRACE_DUTY) and rec[2] in PINS_A]
+    latencies = []
+    for pressUs in presses:
+        after = [timeUs for timeUs in changes if timeUs >= pressUs]
+        if ( after ):
+            latencies.append(after[0] - pressUs)
+
+    return (statistics.pstdev(periods), errors[len(errors) * 99 // 100], errors[-1],
+            statistics.median(latencies), max(latencies))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--usb", type=int, nargs="+", default=[0, 5, 20], help="usbByte costs in us to try")
+    args = parser.parse_args(argv)
+
+    print("usb us/byte  mode      period stdev us  p99 jitter us  max jitter us  press median us  press max us")
+    for usbByteUs in args.usb:
+        for label, dualCore in (("1 core", False), ("2 cores", True)):
+            stdev, p99, worst, median, slowest = run(args.seconds, dualCore, usbByteUs)
+            print("%11d  %-8s  %15.0f  %13d  %13d  %15.0f  %12d" %
+                  (usbByteUs, label, stdev, p99, worst, median, slowest))
+
+
+if __name__ == "__main__":
+    main()
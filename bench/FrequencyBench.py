@@ -0,0 +1,180 @@
+# Benchmark: PWM frequency sweep, and the RP2040 PWM slice checks.
+#
+# First the slice checks: two motors on GPIO 4 and 5 share PWM slice 2, so
+# they must run at one frequency, and two motors on GPIO 4 and 20 are the same
+# channel of slice 2 and cannot both work at all.
+#
+# Then two simulated TT motors from different lots, with their own winding
+# time constant and H-Bridge switching losses (see sim/SimMotor.py), are each
+# driven straight through every frequency and duty of the sweep, to work out
+# the speed per amp the model gives and so the best frequency of each motor.
+#
+# Last TTMotorTestBed.py runs its frequency sweep against the same simulated
+# motors, reading the speed from their encoders and the battery current from
+# a simulated current sense amplifier on GPIO 28.  It reports the scores and
+# the best frequency the test bed found for each motor, next to the model's.
+#
+#   python3 bench/FrequencyBench.py
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimMotor
+import SimRunner
+
+from SimClock import clock
+
+from MotorControl import MotorControl
+from TTMotor      import TTMotor
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+VOLTS  = 7.4
+
+FREQS  = [500, 1000, 2000, 5000, 10000, 20000, 30000, 50000]
+DUTIES = [16000, 24000, 40000, 65535]
+
+# Counts per amp of the test bed's current sense amplifier
+COUNTS_PER_AMP = 19859
+
+# The two lots of motors: (PWM, IN1, IN2, encoder) pins and model parameters
+MOTORS = {
+    "A": ((4, 5, 6, 2),  { "inductanceUs": 300.0, "switchNs": 250.0, "switchCoulombs": 1.0e-7 }),
+    "B": ((8, 9, 10, 3), { "inductanceUs": 900.0, "switchNs": 600.0, "switchCoulombs": 4.0e-7 }),
+}
+
+
+def checkSlices():
+    print("PWM slice checks:")
+    SimHardware.reset(1.0)
+    control = MotorControl(15, TTMotor(4, 5, 6), TTMotor(5, 9, 10))
+    print("  GPIO 4 and 5 at 10000Hz: accepted")
+    try:
+        control.setFrequency(20000, 4)
+    except ValueError as error:
+        print("  GPIO 4 to 20000Hz: %s" % error)
+    control.setFrequency(20000, 4, shared=True)
+    print("  GPIO 4 to 20000Hz, shared: GPIO 4 at %dHz, GPIO 5 at %dHz" %
+          (SimHardware.pwmFreq[4], SimHardware.pwmFreq[5]))
+
+    for label, freqB, gpioB in (("GPIO 4 at 10000Hz, GPIO 5 at 20000Hz", 20000, 5),
+                                ("GPIO 4 and 20", 10000, 20)):
+        SimHardware.reset(1.0)
+        try:
+            MotorControl(15, TTMotor(4, 5, 6), TTMotor(gpioB, 9, 10, freq=freqB))
+            print("  %s: accepted" % label)
+        except ValueError as error:
+            print("  %s: %s" % (label, error))
+
+
+# Drive one model motor straight through the sweep.
+#
+# Returns { freq: (RPM per amp, mean RPM, mean battery amps) }
+def modelScores(pins, params, settleMs=300, holdMs=500, restMs=1000):
+    gpioPWM, gpioIN1, gpioIN2, gpioEncoder = pins
+    SimHardware.reset(None)
+    motor   = TTMotor(gpioPWM, gpioIN1, gpioIN2)
+    control = MotorControl(15, motor)
+    model   = SimMotor.SimMotor(gpioPWM, gpioIN1, gpioIN2, gpioStandby=15, batteryVolts=VOLTS, **params)
+
+    scores = {}
+    for freq in FREQS:
+        control.setFrequency(freq, gpioPWM)
+        motor.writeOutput(motor.STOPPED, 0)
+        clock.advance(restMs * 1000)
+        rpm  = 0.0
+        amps = 0.0
+        for duty in DUTIES:
+            motor.writeOutput(motor.FORWARD, duty)
+            clock.advance(settleMs * 1000)
+            for ms in range(holdMs):
+                clock.advance(1000)
+                rpm  += model.rpm
+                amps += model.batteryAmps
+        samples = len(DUTIES) * holdMs
+        scores[freq] = (rpm / amps if amps > 0 else 0.0, rpm / samples, amps / samples)
+    model.stop()
+    return scores
+
+
+# Run the test bed's sweep against the simulated motors.
+#
+# Returns ({ motor name: [(freq, score)] }, { motor name: best freq }, simulated seconds, wall seconds)
+def testBedSweep(path: str):
+    models = []
+
+    def setup():
+        SimHardware.setAdc(27, SimHardware.noisyPot(30000, 300, seed=1))
+        SimHardware.setAdc(26, SimHardware.noisyPot(20000, 300, seed=2))
+        for name, (pins, params) in MOTORS.items():
+            gpioPWM, gpioIN1, gpioIN2, gpioEncoder = pins
+            models.append(SimMotor.SimMotor(gpioPWM, gpioIN1, gpioIN2, gpioEncoder=gpioEncoder, gpioStandby=15,
+                                            batteryVolts=VOLTS, **params))
+        SimHardware.setAdc(28, SimMotor.batteryCurrent(models, COUNTS_PER_AMP))
+
+    perMotor = len(FREQS) * (1000 + len(DUTIES) * (300 + 500)) / 1000
+    constants = { "sweepFreqs": FREQS, "sweepDuties": DUTIES, "calibrationFile": path,
+                  "gpioEncA": MOTORS["A"][0][3], "gpioEncB": MOTORS["B"][0][3], "gpioCurrent": 28,
+                  "currentCountsPerAmp": COUNTS_PER_AMP }
+    stats = SimRunner.runScript(SCRIPT, 2 * perMotor + 2, setup=setup, constants=constants)
+
+    scores = {}
+    name   = None
+    for line in stats["output"].splitlines():
+        found = re.match(r"Motor\s+(\w+)\s+: sweeping", line)
+        if ( found ):
+            name = found.group(1)
+            scores[name] = []
+        found = re.match(r"\s+(\d+) Hz: score\s+(-?\d+)", line)
+        if ( found and name != None ):
+            scores[name].append((int(found.group(1)), int(found.group(2))))
+    with open(path) as file:
+        saved = json.load(file)
+    best = { name: values["pwmFreq"] for name, values in saved.items() }
+    return scores, best, stats["simSeconds"], stats["wallSeconds"]
+
+
+# Returns the best frequency of scores the way FrequencySweep.best() picks it
+def pickBest(scores, tolerance=2):
+    top = max(score for freq, score in scores)
+    return max(freq for freq, score in scores if score >= top - abs(top) * tolerance / 100)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    args = parser.parse_args(argv)
+
+    checkSlices()
+    print()
+
+    model = {}
+    for name, (pins, params) in MOTORS.items():
+        model[name] = modelScores(pins, params)
+
+    with tempfile.TemporaryDirectory() as folder:
+        scores, best, simSeconds, wall = testBedSweep(os.path.join(folder, "calibration.json"))
+
+    print("Sweep of %d frequencies x %d duties, %.0f simulated seconds in %.1f s" %
+          (len(FREQS), len(DUTIES), simSeconds, wall))
+    print("RPM per amp:")
+    print("%8s" % "freq" + "".join("%10s %10s" % ("model " + name, "test bed") for name in MOTORS))
+    for n, freq in enumerate(FREQS):
+        row = "%8d" % freq
+        for name in MOTORS:
+            row += "%10.0f %10s" % (model[name][freq][0], scores[name][n][1] if name in scores else "-")
+        print(row)
+    row = "%8s" % "best"
+    for name in MOTORS:
+        modelBest = pickBest([(freq, values[0]) for freq, values in model[name].items()])
+        row += "%10d %10d" % (modelBest, best.get(name, 0))
+    print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# Benchmark: updating 2 to 8 motors on 1 to 4 TB6612FNG modules.
+#
+# For each group size, every motor is given a new signed speed on every update,
+# cycling through FORWARD, STOPPED and BACKWARD speeds so the direction pins
+# change too.  It compares MotorGroup.setSpeeds() with calling changeSpeed()
+# on each module in turn after setting the directions by hand, the way the two
+# motor test bed does it.  For each it reports the cost of one update, in
+# simulated Pico time and in host time, and the skew: the time between the
+# first and last direction pin change of an update.  Memory blocks kept by
+# src code are counted; the last speed held in each motor's fields is a heap
+# object in CPython but a small int on the Pico, so a few are expected.
+#
+#   python3 bench/GroupBench.py --updates 2000
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+from array import array
+
+from SimClock import clock
+
+from MotorControl import MotorControl
+from MotorGroup   import MotorGroup
+from TTMotor      import TTMotor
+
+# One module per 7 GPIOs: PWMA, AIN1, AIN2, PWMB, BIN1, BIN2, STANDBY
+def makeBridges(count: int):
+    bridges = []
+    for n in range(count):
+        base = 7 * n
+        bridges.append(MotorControl(base + 6, TTMotor(base, base + 1, base + 2), TTMotor(base + 3, base + 4, base + 5)))
+    return bridges
+
+
+# Signed speeds for each update: each motor moves through a different part of the cycle
+def speedTable(motors: int, updates: int):
+    cycle  = (40000, 0, -40000, 0, 20000, -20000)
+    tables = []
+    for update in range(updates):
+        tables.append(array("i", [cycle[(update + n) % len(cycle)] for n in range(motors)]))
+    return tables
+
+
+def skewUs(updateStarts):
+    # Largest time between the first and last direction pin change of one update
+    worst = 0
+    pins  = SimHardware.traceOf(SimHardware.TRACE_PIN)
+    index = 0
+    for start, end in updateStarts:
+        times = []
+        while ( index < len(pins) and pins[index][0] < end ):
+            if ( pins[index][0] >= start ):
+                times.append(pins[index][0])
+            index += 1
+        if ( times ):
+            worst = max(worst, times[-1] - times[0])
+    return worst
+
+
+def run(bridgeCount: int, updates: int, useGroup: bool):
+    SimHardware.reset()
+    SimHardware.costs.update(SimHardware.PICO_COSTS)
+    bridges = makeBridges(bridgeCount)
+    group   = MotorGroup(bridges) if useGroup else None
+    motors  = [motor for bridge in bridges for motor in bridge.motorList]
+    tables  = speedTable(len(motors), updates)
+
+    def update(speeds):
+        if ( useGroup ):
+            group.setSpeeds(speeds)
+            return
+        for n in range(len(motors)):
+            speed = speeds[n]
+            motors[n].currentDirection = TTMotor.FORWARD if speed > 0 else TTMotor.BACKWARD if speed < 0 else TTMotor.STOPPED
+        for n in range(bridgeCount):
+            bridges[n].changeSpeed(frontSpeed=abs(speeds[2 * n]), backSpeed=abs(speeds[2 * n + 1]))
+
+    SimHardware.trace.clear()
+    simUs   = 0
+    hostNs  = 0
+    windows = []
+    for speeds in tables:
+        beforeUs = clock.nowUs
+        beforeNs = time.perf_counter_ns()
+        update(speeds)
+        hostNs  += time.perf_counter_ns() - beforeNs
+        simUs   += clock.nowUs - beforeUs
+        windows.append((beforeUs, clock.nowUs + 1))
+        clock.advance(1000)
+    skew = skewUs(windows)
+
+    # Run the updates again to count memory blocks kept by src code
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    for speeds in tables:
+        update(speeds)
+    kept = tracemalloc.take_snapshot().compare_to(snapshot, "filename")
+    tracemalloc.stop()
+    keptBlocks = sum(stat.count_diff for stat in kept if stat.traceback[0].filename.startswith(SimRunner.SRC_DIR))
+    return simUs / updates, hostNs / updates / 1000, skew, keptBlocks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    print("motors  method               update sim us  per motor us  update host us  skew us  kept blocks")
+    for bridgeCount in (1, 2, 3, 4):
+        for label, useGroup in (("changeSpeed each", False), ("group setSpeeds", True)):
+            simUs, hostUs, skew, kept = run(bridgeCount, args.updates, useGroup)
+            print("%6d  %-17s  %13.1f  %12.1f  %14.2f  %7d  %11d" %
+                  (2 * bridgeCount, label, simUs, simUs / (2 * bridgeCount), hostUs, skew, kept))
+
+
+if __name__ == "__main__":
+    main()
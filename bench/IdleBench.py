@@ -0,0 +1,170 @@
+# Benchmark: power saved by the low power idle, and how long it takes to wake up.
+#
+# Runs TTMotorTestBed.py against the simulated Pico for a few minutes of use
+# where the motors are mostly stopped: motor A is run for a few seconds now
+# and then with its button, and knob B is turned now and then while motor B
+# stays stopped.  Each run reports:
+#
+#   - the share of the time the Pico was in lightsleep and the H-Bridge in standby
+#   - the wakeups per second, which is what keeps the Pico from sleeping
+#   - the time from a button press to the H-Bridge being back on, and from a
+#     knob starting to turn to the H-Bridge being back on
+#   - a rough average current, from the figures in CURRENT_MA
+#
+# The first run has the idle manager off.  The others try different knob
+# polling periods, which trade the time to notice a knob for wakeups.
+#
+#   python3 bench/IdleBench.py --seconds 300
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+
+GPIO_BUTTON_A = 17
+GPIO_POT_A    = 27
+GPIO_POT_B    = 26
+GPIO_STANDBY  = 15
+
+# Rough currents in mA, from the datasheets and from measuring a Pico on a USB
+# power meter.  Measure your own board for anything better than a comparison.
+CURRENT_MA = {
+    "picoAwake":   20.0,    # Running MicroPython, mostly in machine.idle()
+    "picoSleep":   1.5,     # In lightsleep
+    "bridgeOn":    1.1,     # TB6612FNG logic supply, motors stopped
+    "bridgeOff":   0.001,   # TB6612FNG in standby
+}
+
+
+# Returns the ADC source for knob B: held at 20000, turned to 45000 over half a
+# second at each time in turns, and back again at the next one
+def knobB(turns, seed: int):
+    rng = random.Random(seed)
+
+    def source(nowUs):
+        value = 20000
+        for n, turnUs in enumerate(turns):
+            if ( nowUs < turnUs ):
+                break
+            target = 45000 if n % 2 == 0 else 20000
+            moved  = min(1.0, (nowUs - turnUs) / 500000)
+            value  = int(value + (target - value) * moved)
+        return value + rng.randint(-300, 300)
+
+    return source
+
+
+# Returns the time of the first STANDBY pin write to 1 at or after timeUs, or None
+def standbyOnAfter(timeUs: int):
+    for rec in SimHardware.traceOf(SimHardware.TRACE_PIN, GPIO_STANDBY):
+        if ( rec[0] >= timeUs and rec[3] == 1 ):
+            return rec[0]
+    return None
+
+
+# Returns the microseconds the STANDBY pin was low during the run
+def standbyUs(endUs: int):
+    offUs   = 0
+    offFrom = None
+    for rec in SimHardware.traceOf(SimHardware.TRACE_PIN, GPIO_STANDBY):
+        if ( rec[3] == 0 and offFrom == None ):
+            offFrom = rec[0]
+        elif ( rec[3] == 1 and offFrom != None ):
+            offUs  += rec[0] - offFrom
+            offFrom = None
+    if ( offFrom != None ):
+        offUs += endUs - offFrom
+    return offUs
+
+
+def runIdle(seconds: float, idleMs: int, pollMs: int, seed: int):
+    presses = []
+    turns   = []
+    rng     = random.Random(seed)
+
+    def setup():
+        SimHardware.costs.update(SimHardware.PICO_COSTS)
+        SimHardware.setAdc(GPIO_POT_A, SimHardware.noisyPot(40000, 300, seed=seed))
+        # Motor A: forward for 4 seconds, then stopped, about every 30 seconds.
+        # The times are jittered so they fall anywhere in the knob polling period.
+        start = 2.0
+        while ( start + 5 < seconds ):
+            for pressSeconds in (start, start + 4):
+                SimHardware.pressButton(GPIO_BUTTON_A, pressSeconds, holdMs=150, bounces=3, seed=rng.random())
+                presses.append(int(pressSeconds * 1000000))
+            start += 30 + rng.uniform(0, 1)
+        # Knob B: turned about every 30 seconds, between the runs of motor A
+        turnSeconds = 17.0
+        while ( turnSeconds < seconds ):
+            turns.append(int(turnSeconds * 1000000))
+            turnSeconds += 30 + rng.uniform(0, 1)
+        SimHardware.setAdc(GPIO_POT_B, knobB(turns, seed + 1))
+
+    stats  = SimRunner.runScript(SCRIPT, seconds, setup=setup,
+                                 constants={ "idleMs": idleMs, "idlePollMs": pollMs })
+    endUs  = int(stats["simSeconds"] * 1000000)
+
+    # Only the presses that start motor A can find the H-Bridge off
+    pressWake = []
+    for pressUs in presses[::2]:
+        onUs = standbyOnAfter(pressUs)
+        if ( onUs != None and onUs - pressUs < 1000000 ):
+            pressWake.append(onUs - pressUs)
+    knobWake = []
+    for turnUs in turns:
+        onUs = standbyOnAfter(turnUs)
+        if ( onUs != None and onUs - turnUs < 2000000 ):
+            knobWake.append(onUs - turnUs)
+
+    sleepShare   = SimHardware.sleepUs / endUs
+    standbyShare = standbyUs(endUs) / endUs
+    amps = (CURRENT_MA["picoAwake"] * (1 - sleepShare) + CURRENT_MA["picoSleep"] * sleepShare +
+            CURRENT_MA["bridgeOn"] * (1 - standbyShare) + CURRENT_MA["bridgeOff"] * standbyShare)
+    return {
+        "sleep":     sleepShare,
+        "standby":   standbyShare,
+        "wakeups":   stats["wakeups"] / stats["simSeconds"],
+        "pressWake": pressWake,
+        "knobWake":  knobWake,
+        "mA":        amps,
+        "wall":      stats["wallSeconds"],
+    }
+
+
+def describe(values):
+    if ( not values ):
+        return "-"
+    return "%.1f / %.1f" % (sum(values) / len(values) / 1000, max(values) / 1000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=300.0)
+    parser.add_argument("--idle-ms", type=int, default=5000, help="idle time before sleeping")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    print("Idle after %d ms, %.0f simulated seconds per run, motors stopped most of the time" %
+          (args.idle_ms, args.seconds))
+    print()
+    print("%-18s %7s %8s %9s %16s %16s %8s" %
+          ("", "asleep", "standby", "wakeup/s", "button ms avg/max", "knob ms avg/max", "avg mA"))
+    runs = [("idle off", 0, 200)] + [("poll %d ms" % pollMs, args.idle_ms, pollMs) for pollMs in (50, 200, 1000)]
+    for label, idleMs, pollMs in runs:
+        result = runIdle(args.seconds, idleMs, pollMs, args.seed)
+        print("%-18s %6.1f%% %7.1f%% %9.1f %16s %16s %8.2f" %
+              (label, 100 * result["sleep"], 100 * result["standby"], result["wakeups"],
+               describe(result["pressWake"]), describe(result["knobWake"]), result["mA"]))
+    print()
+    print("Button and knob times are to the H-Bridge being back on, which only happens after a sleep.")
+
+
+if __name__ == "__main__":
+    main()
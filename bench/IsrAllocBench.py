@@ -0,0 +1,132 @@
+# Benchmark: heap allocation on the button interrupt and direction toggle path.
+#
+# Drives button presses through the simulated Pico and checks that the code in
+# the src directory does not allocate while handling them: the edge interrupt
+# handler, the debounce lockout timer handler and MotorControl.toggleDirection().
+#
+# On the Pico this would be a gc.mem_alloc() delta.  CPython has no
+# gc.mem_alloc(), so two measurements stand in for it:
+#   - Memory blocks still held by src code after the presses, from tracemalloc
+#     filtered to the src files so the simulator's own allocations are not
+#     counted.  Growth here means the path allocates and keeps objects.  One
+#     block is expected: the last edge timestamp, which is a heap object in
+#     CPython but a small int on the Pico.
+#   - Calls from src code into built-in functions, which is where temporary
+#     strings and lists come from (str(), split(), format()).  Calls into the
+#     simulated machine module are not counted.
+#
+# The old str(pin) based pin lookup is measured the same way for comparison.
+#
+#   python3 bench/IsrAllocBench.py --presses 1000
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "sim"))
+
+import SimHardware
+import SimRunner
+
+from SimClock import clock
+from machine import Pin
+
+from ButtonInfo   import ButtonInfo
+from MotorControl import MotorControl
+from TTMotor      import TTMotor
+
+
+# Number of memory blocks currently allocated from files matching pattern
+def allocatedBlocks(pattern: str):
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, pattern)])
+    return sum(stat.count for stat in snapshot.statistics("filename"))
+
+
+# Run func() and count the built-in functions called directly from files matching prefix
+def builtinCalls(prefix: str, func):
+    calls = Counter()
+
+    def profile(frame, event, arg):
+        if ( event == "c_call" and frame.f_code.co_filename.startswith(prefix) and
+             arg.__name__ != "setprofile" ):
+            calls[arg.__name__] += 1
+
+    sys.setprofile(profile)
+    try:
+        func()
+    finally:
+        sys.setprofile(None)
+    return calls
+
+
+# The pin lookup the ISR used before pins were bound at setup time
+def getPinID( pin ):
+    pinString = str(pin)
+    pinData   = pinString[4:-1].split(",")
+    return int(pinData[0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--presses", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    SimHardware.reset()
+    gpioButton = 17
+    motor      = TTMotor(4, 5, 6)
+    control    = MotorControl(15, motor)
+    control.bindPin(gpioButton, 4)
+
+    toggles = []
+
+    def action(pinID):
+        toggles.append(control.toggleDirection(pinID))
+
+    pin    = Pin(gpioButton, mode=Pin.IN, pull=Pin.PULL_DOWN)
+    button = ButtonInfo(gpioButton)
+    button.attach(pin, action, debounceMs=50)
+
+    def press():
+        SimHardware.setInput(gpioButton, 1)
+        clock.advance(60000)
+        SimHardware.setInput(gpioButton, 0)
+        clock.advance(60000)
+
+    def presses():
+        for n in range(args.presses):
+            press()
+
+    def oldLookups():
+        for n in range(args.presses):
+            getPinID(pin)
+
+    # Warm up so one-time allocations (caches, the timer event) are not counted
+    for n in range(10):
+        press()
+    del toggles[:]
+
+    tracemalloc.start()
+    srcPattern = os.path.join(SimRunner.SRC_DIR, "*")
+    before = allocatedBlocks(srcPattern)
+    presses()
+    after  = allocatedBlocks(srcPattern)
+    tracemalloc.stop()
+    toggleCount = len(toggles)
+
+    newCalls = builtinCalls(SimRunner.SRC_DIR, presses)
+    oldCalls = builtinCalls(os.path.abspath(__file__), oldLookups)
+
+    print("Presses: %d, direction toggles: %d" % (args.presses, toggleCount))
+    print("Blocks still held by src after the presses: %d" % (after - before))
+    print("Built-in calls from src per press: %.2f %s" %
+          (sum(newCalls.values()) / args.presses, dict(newCalls)))
+    print("Built-in calls per old str(pin) lookup: %.2f %s" %
+          (sum(oldCalls.values()) / args.presses, dict(oldCalls)))
+
+
+if __name__ == "__main__":
+    main()
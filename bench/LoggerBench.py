@@ -0,0 +1,151 @@
+# Benchmark: what logging costs the code that logs, with print() and with the Logger.
+#
+# First, on the host, the time of one call:
+#   - print() of a button message to an in memory stream, as the test bed did
+#   - Logger.log() of the same message into the ring
+#   - Logger.log() in direct mode, which formats and prints straight away
+# and the memory Logger.log() keeps, which should be none.
+#
+# Then TTMotorTestBed.py runs against the simulated Pico with the status
+# message logged every statusMs and bouncing button presses, with printing
+# charged usbByte microseconds a byte.  A slow or stalled USB host is a large
+# usbByte.  For direct printing and for the Logger it reports the time from a
+# press to the first write to the motor, and the messages the Logger dropped.
+#
+#   python3 bench/LoggerBench.py --seconds 120
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+from Logger import Logger
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+
+# Button GPIO pin --> the motor's (IN1, IN2, PWM) GPIO pins
+BUTTON_PINS = { 17: (5, 6, 4), 16: (9, 10, 8) }
+
+
+def percentile(values, fraction: float):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Returns the host nanoseconds of one call of function, the best of a few tries
+def callNs(function, loops=20000):
+    best = None
+    for attempt in range(5):
+        start = time.perf_counter_ns()
+        for n in range(loops):
+            function()
+        ns = (time.perf_counter_ns() - start) / loops
+        if ( best == None or ns < best ):
+            best = ns
+    return best
+
+
+def hostCosts():
+    sink = io.StringIO()
+
+    logger = Logger(slots=64)
+    button = logger.message("Button Pushed: Pin: %d, Direction = %d")
+    direct = Logger(slots=64, direct=True)
+    direct.message("Button Pushed: Pin: %d, Direction = %d")
+
+    def printCall():
+        print("Button Pushed: Pin: ", 17, ", Direction = ", 1)
+
+    def logCall():
+        logger.log(Logger.INFO, button, 17, 1)
+        # Keep the ring from filling; the drain is not part of the cost
+        logger.tail = logger.head
+
+    def directCall():
+        direct.log(Logger.INFO, button, 17, 1)
+
+    with contextlib.redirect_stdout(sink):
+        printNs  = callNs(printCall)
+        logNs    = callNs(logCall)
+        directNs = callNs(directCall)
+
+    tracemalloc.start()
+    for n in range(1000):
+        logCall()
+    before = tracemalloc.take_snapshot()
+    for n in range(10000):
+        logCall()
+    after  = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # Leave out tracemalloc's own memory
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    kept   = sum(stat.size_diff for stat in
+                 after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "filename"))
+
+    print("Host time of one call:")
+    print("  print()                  %6.0f ns" % printNs)
+    print("  Logger.log() direct      %6.0f ns" % directNs)
+    print("  Logger.log() to the ring %6.0f ns, %.0f%% of print(), %d bytes kept after 10000 calls" %
+          (logNs, 100 * logNs / printNs, kept))
+
+
+def run(seconds: float, direct: bool, usbByteUs: int, statusMs: int, seed: int):
+    rng     = random.Random(seed)
+    presses = []
+
+    def setup():
+        SimHardware.costs.update(SimHardware.PICO_COSTS)
+        SimHardware.costs["usbByte"] = usbByteUs
+        SimHardware.setAdc(27, SimHardware.noisyPot(30000, 300, seed=seed))
+        SimHardware.setAdc(26, SimHardware.noisyPot(20000, 300, seed=seed + 1))
+        for n in range(int(seconds / 2) - 1):
+            gpio    = rng.choice(list(BUTTON_PINS))
+            pressSeconds = 1 + 2 * n + rng.uniform(0, 1)
+            SimHardware.pressButton(gpio, pressSeconds, holdMs=150, bounces=3, seed=rng.random())
+            presses.append((int(pressSeconds * 1000000), gpio))
+
+    stats = SimRunner.runScript(SCRIPT, seconds, setup=setup,
+                                constants={ "logDirect": direct, "statusMs": statusMs })
+
+    latencies = []
+    for pressUs, gpio in presses:
+        writes = [rec[0] for rec in SimHardware.trace
+                  if rec[1] in (SimHardware.TRACE_PIN, SimHardware.TRACE_DUTY) and
+                     rec[2] in BUTTON_PINS[gpio] and rec[0] >= pressUs]
+        if ( writes ):
+            latencies.append(writes[0] - pressUs)
+    logger = stats["globals"]["logger"]
+    return latencies, logger.logged(), logger.dropped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=120.0)
+    parser.add_argument("--status-ms", type=int, default=100, help="status message period")
+    parser.add_argument("--usb", type=int, nargs="+", default=[0, 20, 200], help="usbByte costs in us to try")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    hostCosts()
+    print()
+    print("Simulated %.0f s, status every %d ms, button to motor latency in us" % (args.seconds, args.status_ms))
+    print("%8s %-8s %8s %8s %8s %8s %8s" % ("usbByte", "logging", "median", "p99", "max", "logged", "dropped"))
+    for usbByteUs in args.usb:
+        for label, direct in (("print", True), ("Logger", False)):
+            latencies, logged, dropped = run(args.seconds, direct, usbByteUs, args.status_ms, args.seed)
+            print("%8d %-8s %8d %8d %8d %8s %8s" %
+                  (usbByteUs, label, percentile(latencies, 0.5), percentile(latencies, 0.99), max(latencies),
+                   "-" if direct else logged, "-" if direct else dropped))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Benchmark: open loop versus closed loop motor speed with battery sag and a load step.
+#
+# Runs TTMotorTestBed.py against the simulated Pico with a simulated motor on
+# channel A.  The battery sags from 8.4V to 6.0V over the run and the load
+# steps up half way through.  Motor A runs FORWARD with its potentiometer at a
+# fixed position.  The error is the difference between the motor RPM and the
+# RPM the filtered potentiometer asks for (pot * maxRpm / 65535), after a
+# settling time.
+#
+# The closed loop run sets gpioEncA so the motor has an encoder.  The cost of
+# one control update is also reported, in simulated Pico time and host time.
+#
+#   python3 bench/PidBench.py --seconds 60
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+from SimClock import clock
+from SimMotor import SimMotor
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+
+GPIO_ENCODER = 2
+MAX_RPM      = 200
+
+
+def run(seconds: float, pot: int, closedLoop: bool, load: float):
+    motors = []
+
+    def setup():
+        SimHardware.setAdc(27, SimHardware.noisyPot(pot, 300, seed=1))
+        SimHardware.pressButton(17, 0.5)
+        endUs = seconds * 1000000
+        motor = SimMotor(4, 5, 6, gpioEncoder=GPIO_ENCODER, gpioStandby=15,
+                         batteryVolts=lambda nowUs: 8.4 - 2.4 * nowUs / endUs,
+                         load=lambda nowUs: load if nowUs > endUs / 2 else 0.0)
+        motor.record(10000)
+        motors.append(motor)
+
+    constants = { "maxRpm": MAX_RPM }
+    if ( closedLoop ):
+        constants["gpioEncA"] = GPIO_ENCODER
+    stats = SimRunner.runScript(SCRIPT, seconds, setup=setup, constants=constants)
+
+    # The RPM asked for by the filtered potentiometer value the program used
+    target = stats["globals"]["potFilterA"].value() * MAX_RPM / 65535
+    errors = [abs(rpm - target) for us, rpm, amps in motors[0].history if us > 3000000]
+    worst  = max(errors)
+    return sum(errors) / len(errors), worst, stats["globals"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--pot", type=int, default=40000)
+    parser.add_argument("--load", type=float, default=0.3, help="load step as a fraction of speed lost")
+    args = parser.parse_args(argv)
+
+    print("Target %.1f RPM, battery 8.4V -> 6.0V, load step %.0f%% at %.0f s" %
+          (args.pot * MAX_RPM / 65535, args.load * 100, args.seconds / 2))
+    for label, closedLoop in (("open loop", False), ("closed loop", True)):
+        mean, worst, program = run(args.seconds, args.pot, closedLoop, args.load)
+        print("%-12s mean error %6.1f RPM, worst %6.1f RPM" % (label, mean, worst))
+
+    # Cost of one control update for motor A, using the objects from the closed loop run
+    control = program["motorControl"]
+    clock.reset()
+    SimHardware.costs.update(SimHardware.PICO_COSTS)
+    startUs = clock.nowUs
+    startNs = time.perf_counter_ns()
+    for n in range(1000):
+        control.controlTick()
+    print("controlTick(): %.1f sim us, %.1f host us" %
+          ((clock.nowUs - startUs) / 1000, (time.perf_counter_ns() - startNs) / 1000000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Benchmark: GPIO and PWM writes made by the motor code, and the skew between
+# the two motors changing direction.
+#
+# The first part runs TTMotorTestBed.py against the simulated Pico with button
+# presses and noisy potentiometers and counts the pin and duty writes, along
+# with how many of them did not change anything.
+#
+# The second part toggles both motors at once through MotorControl, with and
+# without batched direction pin writes, and reports the simulated time between
+# the first and the last direction pin changing.
+#
+#   python3 bench/PinWriteBench.py --seconds 120
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+from MotorControl import MotorControl
+from TTMotor      import TTMotor
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+
+DIRECTION_PINS = (5, 6, 9, 10)
+
+
+# Count the writes of one kind and how many of them wrote the value already there
+def countWrites(kind: int):
+    last      = {}
+    writes    = 0
+    unchanged = 0
+    for rec in SimHardware.traceOf(kind):
+        writes += 1
+        if ( last.get(rec[2]) == rec[3] ):
+            unchanged += 1
+        last[rec[2]] = rec[3]
+    return writes, unchanged
+
+
+def skew(batched: bool, toggles: int):
+    SimHardware.reset()
+    SimHardware.costs.update(SimHardware.PICO_COSTS)
+    front   = TTMotor(4, 5, 6)
+    back    = TTMotor(8, 9, 10)
+    control = MotorControl(15, front, back)
+    if ( batched and hasattr(control, "setBatched") ):
+        control.setBatched(True)
+
+    worst = 0
+    for n in range(toggles):
+        SimHardware.trace.clear()
+        front.toggleDirection()
+        back.toggleDirection()
+        control.changeSpeed(30000)
+        times = [rec[0] for rec in SimHardware.traceOf(SimHardware.TRACE_PIN) if rec[2] in DIRECTION_PINS]
+        if ( times ):
+            worst = max(worst, max(times) - min(times))
+    return worst
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    def setup():
+        SimHardware.setAdc(27, SimHardware.noisyPot(30000, 600, seed=args.seed, spikeChance=0.01))
+        SimHardware.setAdc(26, SimHardware.turnPot(5000, 60000, 10, 30, noise=600, seed=args.seed))
+        for n in range(int(args.seconds // 3)):
+            SimHardware.pressButton(17 if n % 2 else 16, 1 + n * 3, bounces=3, seed=n)
+
+    SimRunner.runScript(SCRIPT, args.seconds, setup=setup)
+    pinWrites, pinUnchanged   = countWrites(SimHardware.TRACE_PIN)
+    dutyWrites, dutyUnchanged = countWrites(SimHardware.TRACE_DUTY)
+    print("Test bed, %.0f s: %d pin writes (%d unchanged), %d duty writes (%d unchanged)" %
+          (args.seconds, pinWrites, pinUnchanged, dutyWrites, dutyUnchanged))
+
+    print("Direction change skew between motors: sequential %d us, batched %d us" %
+          (skew(False, 20), skew(True, 20)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Benchmark: PWM writes caused by potentiometer noise, and how well a turned
+# potentiometer is followed.
+#
+# Runs TTMotorTestBed.py against the simulated Pico with motor A running
+# forward.  In the first run the potentiometer is held still with noise and
+# occasional spikes; every duty write after start up is spurious.  In the
+# second run the potentiometer is turned across its range and then held; the
+# error is the difference between the final duty and the potentiometer.
+#
+#   python3 bench/PotFilterBench.py --seconds 600
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+
+GPIO_BUTTON_A = 17
+GPIO_POT_A    = 27
+GPIO_PWM_A    = 4
+
+
+def dutyWrites(afterSeconds: float):
+    return [rec for rec in SimHardware.traceOf(SimHardware.TRACE_DUTY, GPIO_PWM_A)
+            if rec[0] > afterSeconds * 1000000]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=600.0)
+    parser.add_argument("--noise", type=int, default=600)
+    parser.add_argument("--spikes", type=float, default=0.01, help="fraction of readings that spike")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    def still():
+        SimHardware.setAdc(GPIO_POT_A, SimHardware.noisyPot(30000, args.noise, seed=args.seed,
+                                                            spikeChance=args.spikes))
+        SimHardware.pressButton(GPIO_BUTTON_A, 0.5)
+
+    SimRunner.runScript(SCRIPT, args.seconds, setup=still)
+    writes = dutyWrites(2)
+    print("Held still for %.0f s: %d spurious duty writes" % (args.seconds, len(writes)))
+
+    target = 50000
+
+    def turned():
+        SimHardware.setAdc(GPIO_POT_A, SimHardware.turnPot(2000, target, 1, 5, noise=args.noise, seed=args.seed))
+        SimHardware.pressButton(GPIO_BUTTON_A, 0.5)
+
+    SimRunner.runScript(SCRIPT, 20, setup=turned)
+    writes = dutyWrites(1)
+    final  = writes[-1][3]
+    print("Turned from 2000 to %d: %d duty writes, final duty %d, error %d" %
+          (target, len(writes), final, final - target))
+
+
+if __name__ == "__main__":
+    main()
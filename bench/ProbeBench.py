@@ -0,0 +1,154 @@
+# Benchmark: latency probes in the test bed, and what an enabled probe costs.
+#
+# First TTMotorTestBed.py is run with the probes compiled in, in the program
+# and in every module, while both potentiometers are turned and button A is
+# pressed every half second, with the Pico costs of each pin, PWM and ADC
+# operation.  The histograms of every probe are printed: the button interrupt
+# handler, changeSpeed(), the ADC reads of one sample, the time from a button
+# press to the first write to a motor, and the period of the potentiometer
+# samples.  These are simulated times from the cost model, which only charges
+# for pin, PWM and ADC operations, so the button interrupt handler and
+# changeSpeed() probes, which do none with batching and ramping on, read 0us.
+#
+# Then the host time of a start() and stop() pair is compared with the host
+# time of changeSpeed() and of the button interrupt handler, with and without
+# their probes.  Both are interpreted Python, so the share a probe adds is a
+# fair guide to what it adds on the Pico.  It also checks that probes do not
+# allocate.
+#
+#   python3 bench/ProbeBench.py --seconds 10
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+import ButtonInfo
+import LatencyProbe
+import MotorControl
+import PotFilter
+import TTMotor
+
+from machine import Pin
+
+SCRIPT   = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+MODULES  = [ButtonInfo, MotorControl, PotFilter, TTMotor]
+BUTTON_A = 17
+REPEATS  = 5
+
+
+# Compile the probes in, or out, of every module
+def setProbes(flag: int):
+    for module in MODULES:
+        module.PROBES = flag
+
+
+def runTestBed(seconds: float):
+    def setup():
+        SimHardware.costs.update(SimHardware.PICO_COSTS)
+        SimHardware.setAdc(27, SimHardware.turnPot(5000, 60000, 1, seconds - 2, noise=300, seed=1))
+        SimHardware.setAdc(26, SimHardware.noisyPot(30000, 300, seed=2))
+        at = 0.5
+        while ( at < seconds - 0.5 ):
+            SimHardware.pressButton(BUTTON_A, at, holdMs=100, bounces=3, seed=int(at * 100))
+            at += 0.5
+
+    LatencyProbe.probes.clear()
+    setProbes(1)
+    try:
+        SimRunner.runScript(SCRIPT, seconds, setup=setup, constants={ "PROBES": 1 })
+    finally:
+        setProbes(0)
+
+
+# Best host time of calling func count times, in ns per call
+def hostNs(func, count: int):
+    best = None
+    for repeat in range(REPEATS):
+        start = time.perf_counter_ns()
+        for n in range(count):
+            func()
+        elapsed = (time.perf_counter_ns() - start) / count
+        if ( best == None or elapsed < best ):
+            best = elapsed
+    return best
+
+
+# Host time of changeSpeed() and of the button edge handler, with the probes
+# compiled in or out
+def hotPaths(flag: int, count: int):
+    SimHardware.reset()
+    setProbes(flag)
+    try:
+        motorA  = TTMotor.TTMotor(4, 5, 6)
+        motorB  = TTMotor.TTMotor(8, 9, 10)
+        control = MotorControl.MotorControl(15, motorA, motorB)
+        speeds  = [0]
+
+        def changeSpeed():
+            speeds[0] = (speeds[0] + 1000) & 0xFFFF
+            control.changeSpeed(frontSpeed=speeds[0], backSpeed=speeds[0])
+
+        button = ButtonInfo.ButtonInfo(BUTTON_A)
+        button.attach(Pin(BUTTON_A, mode=Pin.IN), None, 50)
+        pin = button.pin
+
+        def edge():
+            # Locked after the first edge, like the bounce edges that follow it
+            button.buttonEdge(pin)
+
+        return hostNs(changeSpeed, count), hostNs(edge, count)
+    finally:
+        setProbes(0)
+
+
+def probeCost(count: int):
+    probe = LatencyProbe.LatencyProbe("bench")
+
+    def pair():
+        probe.start()
+        probe.stop()
+
+    pairNs = hostNs(pair, count)
+    markNs = hostNs(probe.mark, count)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(count):
+        probe.start()
+        probe.stop()
+        probe.mark()
+    kept = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return pairNs, markNs, kept
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10.0, help="simulated run time of the test bed")
+    parser.add_argument("--count", type=int, default=20000, help="calls timed for the host costs")
+    args = parser.parse_args(argv)
+
+    runTestBed(args.seconds)
+    LatencyProbe.dumpProbes()
+
+    pairNs, markNs, kept = probeCost(args.count)
+    print("Probe start() and stop(): %.0f ns, mark(): %.0f ns (host), %d bytes kept after %d calls" %
+          (pairNs, markNs, kept, args.count))
+
+    speedOut, edgeOut = hotPaths(0, args.count)
+    speedIn,  edgeIn  = hotPaths(1, args.count)
+    print("changeSpeed(): %.0f ns without probes, %.0f ns with (+%.0f%%)" %
+          (speedOut, speedIn, (speedIn - speedOut) * 100 / speedOut))
+    print("Button edge handler: %.0f ns without probes, %.0f ns with (+%.0f%%)" %
+          (edgeOut, edgeIn, (edgeIn - edgeOut) * 100 / edgeOut))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Benchmark: test profile playback cost and repeatability.
+#
+# Plays a two motor profile through ProfilePlayer.tick() and reports the cost
+# of one tick, in simulated Pico time and in host time.  For comparison it also
+# reports the cost of working the same sine wave out on every tick instead of
+# looking it up in the table.  On the Pico every float operation in that
+# allocates memory, which the table lookup never does.  Memory blocks kept by src code while playing are
+# counted.  A few are expected: the last speed held in each motor's fields,
+# which is a heap object in CPython but a small int on the Pico.
+#
+# It then runs TTMotorTestBed.py with profileHz set, twice, with different
+# potentiometer noise, and checks that both runs write exactly the same duties
+# at exactly the same times.
+#
+#   python3 bench/ProfileBench.py --hz 100 1000
+
+import argparse
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+from SimClock import clock
+
+from MotorControl  import MotorControl
+from MotorProfile  import MotorProfile
+from ProfilePlayer import ProfilePlayer
+from TTMotor       import TTMotor
+
+SCRIPT  = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+REPEATS = 5
+
+
+def sineProfile(hz: int, sign: int):
+    profile = MotorProfile(hz)
+    profile.sine(sign * 40000, 20000, 2000, 10000)
+    return profile.build()
+
+
+def tickCost(hz: int):
+    SimHardware.reset()
+    SimHardware.costs.update(SimHardware.PICO_COSTS)
+    front   = TTMotor(4, 5, 6)
+    back    = TTMotor(8, 9, 10)
+    control = MotorControl(15, front, back)
+    control.setBatched(True)
+
+    tables = (sineProfile(hz, 1), sineProfile(hz, -1))
+    player = ProfilePlayer(control, hz)
+    player.load(4, tables[0])
+    player.load(8, tables[1])
+    player.start(timer=False)
+
+    ticks    = len(tables[0])
+    beforeUs = clock.nowUs
+    while ( player.tick() ):
+        pass
+    simUs = clock.nowUs - beforeUs
+
+    # Host times are the best of several plays, to keep out noise from the host
+    hostNs = None
+    for repeat in range(REPEATS):
+        player.start(timer=False)
+        beforeNs = time.perf_counter_ns()
+        while ( player.tick() ):
+            pass
+        elapsed = time.perf_counter_ns() - beforeNs
+        hostNs  = elapsed if hostNs == None else min(hostNs, elapsed)
+
+    # Play it again to count memory blocks kept by src code
+    player.start(timer=False)
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    while ( player.tick() ):
+        pass
+    kept = tracemalloc.take_snapshot().compare_to(snapshot, "filename")
+    tracemalloc.stop()
+    keptBlocks = sum(stat.count_diff for stat in kept if stat.traceback[0].filename.startswith(SimRunner.SRC_DIR))
+
+    # The same wave worked out on every tick
+    period     = hz * 2
+    computedNs = None
+    for repeat in range(REPEATS):
+        beforeNs = time.perf_counter_ns()
+        for n in range(ticks):
+            wave = int(20000 * math.sin(2 * math.pi * n / period))
+            front.setSpeed(40000 + wave)
+            back.setSpeed(-40000 - wave)
+            control.writePins()
+        elapsed    = time.perf_counter_ns() - beforeNs
+        computedNs = elapsed if computedNs == None else min(computedNs, elapsed)
+
+    tableBytes = sum(len(table) * table.itemsize for table in tables)
+    return simUs / ticks, hostNs / ticks / 1000, computedNs / ticks / 1000, keptBlocks, tableBytes
+
+
+def dutyTrace(hz: int, seconds: float, seed: int):
+    def setup():
+        SimHardware.setAdc(27, SimHardware.noisyPot(30000, 300, seed=seed))
+        SimHardware.setAdc(26, SimHardware.noisyPot(30000, 300, seed=seed + 1))
+
+    SimRunner.runScript(SCRIPT, seconds, setup=setup, constants={ "profileHz": hz })
+    return [(rec[0], rec[2], rec[3]) for rec in SimHardware.traceOf(SimHardware.TRACE_DUTY)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hz", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--seconds", type=float, default=40.0)
+    args = parser.parse_args(argv)
+
+    print("rate Hz  tick sim us  tick host us  computed host us  CPU at rate  kept blocks  table bytes")
+    for hz in args.hz:
+        simUs, hostUs, computedUs, kept, tableBytes = tickCost(hz)
+        print("%7d  %11.1f  %12.2f  %16.2f  %10.1f%%  %11d  %11d" %
+              (hz, simUs, hostUs, computedUs, simUs * hz / 10000, kept, tableBytes))
+
+    for hz in args.hz:
+        first  = dutyTrace(hz, args.seconds, 1)
+        second = dutyTrace(hz, args.seconds, 7)
+        print("Test bed at %dHz for %.0f s: %d duty writes, runs identical: %s" %
+              (hz, args.seconds, len(first), "yes" if first == second else "NO"))
+
+
+if __name__ == "__main__":
+    main()
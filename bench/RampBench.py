@@ -0,0 +1,105 @@
+# Benchmark: motor ramping on a full speed reversal of both motors at once.
+#
+# Both motors run FORWARD at full speed and are then switched to BACKWARD at
+# full speed together.  For each ramp setting this reports the largest change
+# in duty, counting BACKWARD as negative and adding both motors, within one
+# millisecond.  That is a stand-in for the current spike on the battery.  It
+# also reports how long the reversal takes.  It also
+# reports the cost of one rampTick() for both motors, in simulated Pico time
+# and in host time, and any memory blocks src code kept while ramping.  Two
+# kept blocks are expected: the last duty of each motor, which is a heap
+# object in CPython but a small int on the Pico.
+#
+#   python3 bench/RampBench.py
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+from SimClock import clock
+
+from MotorControl import MotorControl
+from TTMotor      import TTMotor
+
+# (label, rampRate, rampJerk)
+SETTINGS = ( ("no ramp", 0, 0), ("linear 256", 256, 0), ("linear 64", 64, 0), ("s-curve 256/8", 256, 8) )
+
+FULL = 65535
+
+
+def reversal(rate: int, jerk: int):
+    SimHardware.reset()
+    SimHardware.costs.update(SimHardware.PICO_COSTS)
+    front   = TTMotor(4, 5, 6)
+    back    = TTMotor(8, 9, 10)
+    control = MotorControl(15, front, back)
+    control.setRamp(rate, jerk)
+
+    front.toggleDirection()
+    back.toggleDirection()
+    control.changeSpeed(FULL)
+    while ( control.rampTick() ):
+        clock.advance(1000)
+
+    # FORWARD -> STOPPED -> BACKWARD
+    for motor in (front, back):
+        motor.toggleDirection()
+        motor.toggleDirection()
+
+    SimHardware.trace.clear()
+    startUs = clock.nowUs
+    control.changeSpeed(FULL)
+    ticks    = 0
+    tickUs   = 0
+    hostNs   = 0
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    while ( True ):
+        beforeUs = clock.nowUs
+        beforeNs = time.perf_counter_ns()
+        ramping  = control.rampTick()
+        hostNs  += time.perf_counter_ns() - beforeNs
+        tickUs  += clock.nowUs - beforeUs
+        ticks   += 1
+        if ( not ramping ):
+            break
+        clock.advance(1000 - (clock.nowUs - beforeUs))
+    kept = tracemalloc.take_snapshot().compare_to(snapshot, "filename")
+    tracemalloc.stop()
+    keptBlocks = sum(stat.count_diff for stat in kept if stat.traceback[0].filename.startswith(SimRunner.SRC_DIR))
+
+    # Signed duty of each motor after every write, then the largest total change
+    # of the signed duties of both motors within one millisecond
+    levels = { 5: 0, 9: 0 }
+    duty   = { 4: FULL, 8: FULL }
+    signed = { 4: FULL, 8: FULL }
+    steps  = {}
+    for rec in SimHardware.trace:
+        if ( rec[1] == SimHardware.TRACE_DUTY ):
+            duty[rec[2]] = rec[3]
+        elif ( rec[1] == SimHardware.TRACE_PIN and rec[2] in levels ):
+            levels[rec[2]] = rec[3]
+        for pwm, in1 in ((4, 5), (8, 9)):
+            value = -duty[pwm] if levels[in1] else duty[pwm]
+            ms    = rec[0] // 1000
+            steps[ms] = steps.get(ms, 0) + abs(value - signed[pwm])
+            signed[pwm] = value
+    worst = max(steps.values())
+    return worst, (clock.nowUs - startUs) / 1000, tickUs / ticks, hostNs / ticks / 1000, keptBlocks
+
+
+def main():
+    print("setting         worst duty change/ms  reversal ms  tick sim us  tick host us  kept blocks")
+    for label, rate, jerk in SETTINGS:
+        worst, ms, tickUs, hostUs, kept = reversal(rate, jerk)
+        print("%-14s  %20d  %11.0f  %11.1f  %12.2f  %11d" % (label, worst, ms, tickUs, hostUs, kept))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# Benchmark: the test bed's start up, with the modules as .py files, as .mpy
+# files and frozen into the firmware.
+#
+# First, the size of every library module as source and compiled with
+# mpy-cross (see host/BuildFirmware.py).  A Pico loading a .py file has to
+# hold and compile the source; a .mpy file is only the bytecode.
+#
+# Then TTMotorTestBed.py runs against the simulated Pico.  It reports the
+# time from the start of the program until the motors are given their first
+# speeds, and the number of attributes each motor, motor control and button
+# object holds.  MicroPython keeps an object's attributes in a table of its
+# own, which grows with every attribute.  The simulator does not charge for
+# importing, so this is the start up of the program itself, and it has no
+# MicroPython heap to report, see sim/SimGc.py.
+#
+# With --port, the test bed is also run on a Pico with mpremote, with the
+# modules copied to it as .py files and as .mpy files, and with --frozen as
+# frozen modules, which needs a firmware image built from the manifest of
+# host/BuildFirmware.py.  It reports the program's start up line: the time
+# until the motors are given their first speeds, and gc.mem_free() once the
+# start up is done.  The Pico's file system is left with the .mpy files.
+#
+#   python3 bench/StartupBench.py
+#   python3 bench/StartupBench.py --port /dev/ttyACM0 --runs 5
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR  = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "host"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "sim"))
+
+import BuildFirmware
+import SimHardware
+import SimRunner
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+
+STARTUP_LINE = re.compile(r"Start up:\s+(\d+)\s+us to the first motor speeds,\s+(\d+)\s+bytes free")
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def moduleSizes():
+    modules = BuildFirmware.libraryModules()
+    try:
+        mpyCross = BuildFirmware.findMpyCross()
+    except RuntimeError as error:
+        print(error)
+        mpyCross = None
+
+    sizes = {}
+    with tempfile.TemporaryDirectory() as outDir:
+        if ( mpyCross != None ):
+            print(BuildFirmware.mpyCrossVersion(mpyCross))
+            BuildFirmware.compileModules(modules, outDir, mpyCross)
+        for name in modules:
+            source   = os.path.getsize(os.path.join(SimRunner.SRC_DIR, name + ".py"))
+            compiled = os.path.join(outDir, name + ".mpy")
+            sizes[name] = (source, os.path.getsize(compiled) if os.path.exists(compiled) else None)
+
+    print("%-18s %8s %8s" % ("module", ".py", ".mpy"))
+    for name in ("TTMotor", "MotorControl", "ButtonInfo"):
+        source, compiled = sizes[name]
+        print("%-18s %8d %8s" % (name, source, compiled if compiled != None else "-"))
+    totalSource   = sum(source for source, compiled in sizes.values())
+    totalCompiled = sum(compiled or 0 for source, compiled in sizes.values())
+    print("%-18s %8d %8s" % ("all %d modules" % len(sizes), totalSource, totalCompiled if mpyCross != None else "-"))
+
+
+def simulated():
+    def setup():
+        SimHardware.costs.update(SimHardware.PICO_COSTS)
+        SimHardware.setAdc(27, SimHardware.noisyPot(30000, 300, seed=1))
+        SimHardware.setAdc(26, SimHardware.noisyPot(20000, 300, seed=2))
+
+    stats = SimRunner.runScript(SCRIPT, 1.0, setup=setup)
+    names = stats["globals"]
+    print("Simulated start up, without the imports:")
+    print("  motors given their first speeds after %d us" % names["startupUs"])
+    for label, instance in (("TTMotor", names["motorA"]), ("MotorControl", names["motorControl"]),
+                            ("ButtonInfo", list(names["buttons"].values())[0])):
+        print("  %-13s %3d attributes per instance" % (label, len(vars(instance))))
+
+
+# Run the test bed on the Pico until it prints its start up line.
+#
+# Returns (us to the first motor speeds, bytes free), or None if the line did not come.
+def deviceRun(port: str, timeout: float):
+    process = subprocess.Popen(["mpremote", "connect", port, "run", SCRIPT],
+                               stdout=subprocess.PIPE, universal_newlines=True)
+    try:
+        found = None
+        for line in process.stdout:
+            found = STARTUP_LINE.search(line)
+            if ( found ):
+                break
+        return (int(found.group(1)), int(found.group(2))) if found else None
+    finally:
+        process.kill()
+        process.wait(timeout)
+
+
+# Put the library modules on the Pico as .py or .mpy files, or remove them to
+# use the frozen ones
+def deviceLayout(port: str, layout: str, mpyFiles):
+    present = BuildFirmware.deviceFiles(port)
+    for name in BuildFirmware.libraryModules():
+        for suffix in (".py", ".mpy"):
+            if ( name + suffix in present ):
+                BuildFirmware.mpremote(port, "fs", "rm", ":" + name + suffix)
+    if ( layout == ".py" ):
+        for name in BuildFirmware.libraryModules():
+            BuildFirmware.mpremote(port, "fs", "cp", os.path.join(SimRunner.SRC_DIR, name + ".py"), ":" + name + ".py")
+    elif ( layout == ".mpy" ):
+        BuildFirmware.deploy(port, mpyFiles)
+
+
+def device(port: str, runs: int, frozen: bool, timeout: float):
+    mpyCross = BuildFirmware.findMpyCross()
+    layouts  = [".py", ".mpy"] + (["frozen"] if frozen else [])
+    print()
+    print("Pico on %s, median of %d runs:" % (port, runs))
+    print("%-8s %14s %12s" % ("modules", "start up us", "bytes free"))
+    with tempfile.TemporaryDirectory() as outDir:
+        mpyFiles = BuildFirmware.compileModules(BuildFirmware.libraryModules(), outDir, mpyCross)
+        for layout in layouts:
+            deviceLayout(port, layout, mpyFiles)
+            results = [deviceRun(port, timeout) for n in range(runs)]
+            results = [result for result in results if result != None]
+            if ( not results ):
+                print("%-8s %14s %12s" % (layout, "-", "-"))
+                continue
+            print("%-8s %14d %12d" % (layout, median([us for us, free in results]),
+                                      median([free for us, free in results])))
+        # Leave the .mpy files on the Pico
+        if ( layouts[-1] != ".mpy" ):
+            deviceLayout(port, ".mpy", mpyFiles)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", help="serial port of a Pico to run the test bed on, e.g. /dev/ttyACM0")
+    parser.add_argument("--runs", type=int, default=3, help="runs of each layout on the Pico")
+    parser.add_argument("--frozen", action="store_true", help="the Pico's firmware has the modules frozen into it")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    moduleSizes()
+    print()
+    simulated()
+    if ( args.port ):
+        device(args.port, args.runs, args.frozen, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
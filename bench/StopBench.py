@@ -0,0 +1,104 @@
+# Benchmark: how long motor A takes to stop in each stop mode.
+#
+# Motor A is run forward at full speed on a simulated TB6612FNG with a fully
+# charged battery, then set to STOPPED the way a button press does, through
+# MotorControl.changeSpeed().  For each stop mode it reports the time until
+# the motor is down to 10% of its speed and until it has stopped, and the
+# largest current while stopping.  A short brake drives the back EMF through
+# the shorted windings, so the current is checked against the TB6612FNG's
+# 3.2A peak rating.  The last rows have the test bed's 1kHz ramp on, which
+# slows the motor down itself before the stop mode applies.
+#
+# A reversal with the buttons goes through STOPPED, so it takes the stop time
+# plus the time to spin up again.
+#
+#   python3 bench/StopBench.py
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimHardware
+import SimRunner
+
+from SimClock import clock
+from SimMotor import SimMotor
+
+from machine      import Timer
+from MotorControl import MotorControl
+from TTMotor      import TTMotor
+
+VOLTS      = 8.4        # Two fully charged 18650 cells
+PEAK_AMPS  = 3.2        # TB6612FNG peak output current per channel
+STOP_US    = 1500000    # When the motor is stopped
+
+# (label, stop mode, brake ms, ramp rate)
+MODES = [
+    ("coast",              TTMotor.STOP_COAST,       0,   0),
+    ("brake",              TTMotor.STOP_BRAKE,       0,   0),
+    ("brake 20ms, coast",  TTMotor.STOP_BRAKE_COAST, 20,  0),
+    ("brake 50ms, coast",  TTMotor.STOP_BRAKE_COAST, 50,  0),
+    ("brake 100ms, coast", TTMotor.STOP_BRAKE_COAST, 100, 0),
+    ("standby",            TTMotor.STOP_STANDBY,     0,   0),
+    ("ramp, coast",        TTMotor.STOP_COAST,       0,   256),
+    ("ramp, brake",        TTMotor.STOP_BRAKE,       0,   256),
+]
+
+
+# Returns (ms to 10% speed, ms to stopped, peak amps while stopping, standby pin at the end)
+def stopTime(mode: int, brakeMs: int, rampRate: int, seconds: float):
+    SimHardware.reset(seconds)
+    SimHardware.costs.update(SimHardware.PICO_COSTS)
+    motorA  = TTMotor(4, 5, 6)
+    motorB  = TTMotor(8, 9, 10)
+    control = MotorControl(15, motorA, motorB)
+    control.setStopMode(mode, brakeMs)
+    control.setRamp(rampRate)
+    model   = SimMotor(4, 5, 6, gpioStandby=15, batteryVolts=VOLTS)
+    model.record(1000)
+    if ( rampRate > 0 ):
+        rampTimer = Timer(mode=Timer.PERIODIC, freq=1000, callback=lambda timer: control.rampTick())
+
+    motorA.toggleDirection()
+    control.changeSpeed(frontSpeed=65535, backSpeed=0)
+    clock.advanceTo(STOP_US)
+    fullRpm = model.rpm
+
+    motorA.toggleDirection()
+    control.changeSpeed(frontSpeed=65535, backSpeed=0)
+    clock.advanceTo(int(seconds * 1000000) - 1)
+
+    slowUs = stoppedUs = None
+    peak   = 0.0
+    for us, rpm, amps in model.history:
+        if ( us < STOP_US ):
+            continue
+        if ( slowUs == None and abs(rpm) <= fullRpm * 0.1 ):
+            slowUs = us
+        if ( stoppedUs == None and rpm == 0.0 ):
+            stoppedUs = us
+        if ( stoppedUs == None ):
+            peak = max(peak, abs(amps))
+
+    def ms(us):
+        return (us - STOP_US) / 1000 if us != None else float("nan")
+
+    return ms(slowUs), ms(stoppedUs), peak, SimHardware.pins[15].level
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=4.0, help="simulated time of each run")
+    args = parser.parse_args(argv)
+
+    print("stop mode            to 10%  stopped  peak amps  standby pin")
+    for label, mode, brakeMs, rampRate in MODES:
+        slowMs, stoppedMs, peak, standby = stopTime(mode, brakeMs, rampRate, args.seconds)
+        print("%-19s  %5.0fms  %5.0fms  %8.2fA%s  %11d" %
+              (label, slowMs, stoppedMs, peak, "!" if peak > PEAK_AMPS else " ", standby))
+
+
+if __name__ == "__main__":
+    main()
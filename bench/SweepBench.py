@@ -0,0 +1,71 @@
+# Benchmark: how sim/SimSweep.py scales with worker processes.
+#
+# Runs the same sweep, myDelta x debounceMs x potentiometer noise x button
+# bounce, with 1, 2, 4, ... worker processes up to the number of cores, and
+# reports the runs per second and the speedup over one worker.  The runs do
+# not share anything, so the speedup should be close to the number of
+# workers until the cores run out; the start up of the worker processes is
+# the only serial part.  The results of every worker count must be the same.
+#
+#   python3 bench/SweepBench.py --seconds 60
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+
+import SimSweep
+
+GRID = {
+    "myDelta":    [250, 1000, 2000],
+    "debounceMs": [2, 10, 50],
+    "noise":      [300, 1500],
+    "bounceMs":   [5, 20],
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=60.0, help="simulated time of each run")
+    parser.add_argument("--presses", type=int, default=40)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    points = SimSweep.gridPoints(GRID)
+    counts = []
+    workers = 1
+    while ( workers < args.max_workers ):
+        counts.append(workers)
+        workers *= 2
+    counts.append(args.max_workers)
+
+    print("%d runs of %.0f simulated seconds, %d cores" % (len(points), args.seconds, os.cpu_count() or 1))
+    print("%8s %9s %9s %9s %11s" % ("workers", "seconds", "runs/s", "speedup", "efficiency"))
+    first    = None
+    baseline = None
+    for workers in counts:
+        start   = time.perf_counter()
+        results = SimSweep.sweep(points, [1], args.seconds, args.presses, workers)
+        wall    = time.perf_counter() - start
+        metrics = [(point, seed, { name: value for name, value in metrics.items() if name != "wall" })
+                   for point, seed, metrics in results]
+        if ( first == None ):
+            first    = metrics
+            baseline = wall
+        elif ( metrics != first ):
+            print("Results differ with %d workers" % workers)
+        speedup = baseline / wall
+        print("%8d %9.2f %9.1f %9.2f %10.0f%%" % (workers, wall, len(points) / wall, speedup, 100 * speedup / workers))
+
+    print()
+    print("Fewest spurious writes with no missed presses or extra direction changes:")
+    best = sorted((metrics["spurious"], metrics["latencyMax"], str(point))
+                  for point, seed, metrics in first if metrics["extra"] == 0 and metrics["missed"] == 0)
+    for spurious, latency, point in best[:3]:
+        print("  %s: %d spurious, %dus worst latency" % (point, spurious, latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Benchmark: telemetry recording rate, dropped records and cost per record.
+#
+# Runs TTMotorTestBed.py against the simulated Pico with telemetry on, decodes
+# the captured output with host/TelemetryDecoder.py, and checks the record
+# rate against the configured rate.  Also reports the cost of one record() in
+# host time and the memory blocks src code kept while recording.  A couple of
+# kept blocks are expected: counters above 256, which are heap objects in
+# CPython but small ints on the Pico.
+#
+#   python3 bench/TelemetryBench.py --hz 500 --seconds 60
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "host"))
+sys.path.insert(0, os.path.join(ROOT, "sim"))
+
+import SimHardware
+import SimRunner
+import TelemetryDecoder
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hz", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    def setup():
+        SimHardware.costs.update(SimHardware.PICO_COSTS)
+        SimHardware.setAdc(27, SimHardware.turnPot(2000, 60000, 2, 20, noise=600, seed=args.seed))
+        SimHardware.setAdc(26, SimHardware.noisyPot(30000, 600, seed=args.seed))
+        for n in range(int(args.seconds // 2) - 1):
+            SimHardware.pressButton(17 if n % 2 else 16, 1 + n * 2, bounces=3, seed=n)
+
+    stats   = SimRunner.runScript(SCRIPT, args.seconds, setup=setup, constants={"telemetryHz": args.hz})
+    columns = TelemetryDecoder.decode(stats["outputBytes"])
+    count   = len(columns["time_us"])
+    span    = (columns["time_us"][-1] - columns["time_us"][0]) / 1000000 if count > 1 else 0.0
+    print("Decoded %d records in %d frames, %.1f records/s over %.1f s (configured %d Hz)" %
+          (count, columns["frames"], (count - 1) / span if span else 0.0, span, args.hz))
+    print("Frames lost: %d, records dropped on the Pico: %d, bytes sent: %d" %
+          (columns["lostFrames"], columns["dropped"], len(stats["outputBytes"])))
+
+    # Cost of a single record, using the Telemetry object from the run
+    telemetry = stats["globals"]["telemetry"]
+    telemetry.head = telemetry.tail = 0
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    start    = time.perf_counter_ns()
+    for n in range(10000):
+        telemetry.record()
+        if ( telemetry.pending() > telemetry.records // 2 ):
+            telemetry.tail = telemetry.head
+    hostNs = (time.perf_counter_ns() - start) / 10000
+    kept = tracemalloc.take_snapshot().compare_to(snapshot, "filename")
+    tracemalloc.stop()
+    keptBlocks = sum(stat.count_diff for stat in kept if stat.traceback[0].filename.startswith(SimRunner.SRC_DIR))
+    print("record(): %.2f host us per record, %d memory blocks kept by src" % (hostNs / 1000, keptBlocks))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# Build the test bed's modules for the Pico: .mpy files, or a manifest to
+# freeze them into a MicroPython firmware image.
+#
+# Loose .py files are compiled by the Pico every time the program starts.
+# That takes time, and the compiler needs a lot of heap for a moment, which
+# leaves the heap in pieces.  A .mpy file is already compiled, so the Pico
+# only loads its bytecode.  A frozen module is compiled into the firmware
+# image and runs straight out of flash, so it needs no file on the Pico and
+# almost no heap.
+#
+# The library modules are every file in src except the main program,
+# TTMotorTestBed.py, which is left as a .py so its settings can be changed.
+#
+#   python3 host/BuildFirmware.py mpy
+#       compiles the modules with mpy-cross into build/mpy
+#
+#   python3 host/BuildFirmware.py deploy --port /dev/ttyACM0
+#       compiles the modules, copies the .mpy files and TTMotorTestBed.py to
+#       the Pico with mpremote and removes any .py copies of the modules
+#
+#   python3 host/BuildFirmware.py manifest
+#       writes build/manifest.py, for building a firmware image with the
+#       modules frozen into it:
+#         make -C micropython/ports/rp2 BOARD=RPI_PICO FROZEN_MANIFEST=$PWD/build/manifest.py
+#
+# mpy-cross must come from the same MicroPython release as the firmware, as
+# the .mpy format changes between releases.  "pip install mpy-cross==1.22.2"
+# installs the one for MicroPython 1.22.2.  mpremote is "pip install mpremote".
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT_DIR  = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR   = os.path.join(ROOT_DIR, "src")
+BUILD_DIR = os.path.join(ROOT_DIR, "build")
+
+MAIN_PROGRAM = "TTMotorTestBed.py"
+
+# The RP2040's Cortex-M0+ core, for the native and viper code emitters
+ARCH = "armv6m"
+
+
+# Returns the names of the library modules in the src directory, without ".py"
+def libraryModules(srcDir=SRC_DIR):
+    return sorted(name[:-3] for name in os.listdir(srcDir)
+                  if name.endswith(".py") and name != MAIN_PROGRAM)
+
+
+# Returns the command that runs mpy-cross: the one given, the one on the PATH,
+# or the one in the mpy_cross Python package.  Raises RuntimeError if there is none.
+def findMpyCross(path=None):
+    if ( path ):
+        return [path]
+    found = shutil.which("mpy-cross")
+    if ( found ):
+        return [found]
+    try:
+        import mpy_cross
+        return [mpy_cross.mpy_cross]
+    except (ImportError, AttributeError):
+        pass
+    raise RuntimeError("mpy-cross not found: pip install mpy-cross, or give its path with --mpy-cross")
+
+
+# Returns the version line of mpy-cross, e.g. "MicroPython v1.22.2 ... mpy v6.2"
+def mpyCrossVersion(mpyCross):
+    return subprocess.run(mpyCross + ["--version"], stdout=subprocess.PIPE, check=True,
+                          universal_newlines=True).stdout.strip()
+
+
+# Compile modules to .mpy files.
+#
+# @param modules   Names of the modules in srcDir, without ".py"
+# @param outDir    Directory for the .mpy files, made if needed
+# @param mpyCross  Command that runs mpy-cross, see findMpyCross()
+#
+# Returns the paths of the .mpy files.  Raises CalledProcessError, with the
+# compiler's message on stderr, if a module does not compile.
+def compileModules(modules, outDir, mpyCross, srcDir=SRC_DIR, arch=ARCH):
+    os.makedirs(outDir, exist_ok=True)
+    paths = []
+    for name in modules:
+        path = os.path.join(outDir, name + ".mpy")
+        subprocess.run(mpyCross + ["-march=" + arch, "-o", path, os.path.join(srcDir, name + ".py")], check=True)
+        paths.append(path)
+    return paths
+
+
+# Write a manifest that freezes modules into a firmware image.
+#
+# @param modules      Names of the modules in srcDir, without ".py"
+# @param path         Path of the manifest file
+# @param mainProgram  If True, TTMotorTestBed is frozen as well, and a one line
+#                     main.py that imports it is written next to the manifest,
+#                     to copy to the Pico.  Its settings can then only be
+#                     changed by building the image again.
+def writeManifest(modules, path, srcDir=SRC_DIR, mainProgram=False):
+    lines = [
+        "# Freezes the TTMotorTestBed modules.  Made by host/BuildFirmware.py.",
+        "#",
+        "# Any copy of these modules in the Pico's file system is imported ahead of",
+        "# the frozen one, so remove them once the image is flashed.",
+        "",
+        "include(\"$(PORT_DIR)/boards/manifest.py\")",
+        "",
+    ]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    for name in modules:
+        lines.append("module(%r, base_path=%r)" % (name + ".py", srcDir))
+    if ( mainProgram ):
+        lines.append("module(%r, base_path=%r)" % (MAIN_PROGRAM, srcDir))
+        with open(os.path.join(os.path.dirname(path), "main.py"), "w") as main:
+            main.write("import " + MAIN_PROGRAM[:-3] + "\n")
+    with open(path, "w") as manifest:
+        manifest.write("\n".join(lines) + "\n")
+
+
+# Run mpremote on the Pico on port, returning its output
+def mpremote(port: str, *args, check=True):
+    command = ["mpremote", "connect", port] + list(args)
+    return subprocess.run(command, stdout=subprocess.PIPE, check=check, universal_newlines=True).stdout
+
+
+# Returns the names of the files in the root of the Pico's file system
+def deviceFiles(port: str):
+    return [line.split()[-1] for line in mpremote(port, "fs", "ls", ":").splitlines()[1:] if line.strip()]
+
+
+# Copy compiled modules and the main program to the Pico, and remove any .py
+# copies of the modules, which would be imported ahead of the .mpy files.
+#
+# @param files    Paths of the .mpy files
+# @param program  Path of the main program, or None to leave it as it is
+def deploy(port: str, files, program=None):
+    present = deviceFiles(port)
+    for path in files:
+        name = os.path.basename(path)
+        stale = name[:-4] + ".py"
+        if ( stale in present ):
+            mpremote(port, "fs", "rm", ":" + stale)
+        mpremote(port, "fs", "cp", path, ":" + name)
+    if ( program != None ):
+        mpremote(port, "fs", "cp", program, ":" + os.path.basename(program))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the test bed modules as .mpy files or frozen modules")
+    parser.add_argument("command", choices=("mpy", "deploy", "manifest"))
+    parser.add_argument("--modules", nargs="+", help="modules to build, default every module in src but the main program")
+    parser.add_argument("--mpy-cross", help="path of mpy-cross")
+    parser.add_argument("--out", default=BUILD_DIR, help="build directory")
+    parser.add_argument("--port", help="serial port of the Pico, for deploy")
+    parser.add_argument("--main", action="store_true",
+                        help="manifest: freeze the main program too, and write a main.py that runs it")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or libraryModules()
+    if ( args.command == "manifest" ):
+        path = os.path.join(args.out, "manifest.py")
+        writeManifest(modules, path, mainProgram=args.main)
+        print("Wrote", path, "freezing", ", ".join(modules + ([MAIN_PROGRAM[:-3]] if args.main else [])))
+        if ( args.main ):
+            print("Copy", os.path.join(args.out, "main.py"), "to the Pico to run it at power on")
+        return
+
+    try:
+        mpyCross = findMpyCross(args.mpy_cross)
+    except RuntimeError as error:
+        sys.exit(str(error))
+    print(mpyCrossVersion(mpyCross))
+    files = compileModules(modules, os.path.join(args.out, "mpy"), mpyCross)
+    for path in files:
+        name = os.path.basename(path)
+        print("  %-22s %6d bytes, %6d of source" %
+              (name, os.path.getsize(path), os.path.getsize(os.path.join(SRC_DIR, name[:-4] + ".py"))))
+
+    if ( args.command == "deploy" ):
+        if ( not args.port ):
+            parser.error("deploy needs --port")
+        deploy(args.port, files, os.path.join(SRC_DIR, MAIN_PROGRAM))
+        print("Copied", len(files), "modules and", MAIN_PROGRAM, "to", args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# Asyncio client for the binary command protocol of src/CommandProtocol.py.
+#
+# Commands are built with the functions below and sent in frames.  A frame can
+# hold many commands, and up to window frames can be waiting for a reply at a
+# time, so commands do not have to wait for the round trip of the ones before.
+# A frame that gets no reply within the timeout, e.g. because a byte was lost
+# and its CRC was bad, is sent again.
+#
+#   python3 host/CommandClient.py /dev/ttyACM0 --speed 0:30000 --speed 1:-20000 --query
+#
+# The port is opened in raw mode with termios, so only the standard library is
+# needed.  Anything else the Pico prints, text or telemetry frames, is skipped.
+
+import argparse
+import asyncio
+import os
+import struct
+import termios
+import tty
+
+SYNC1         = 0xA5
+SYNC_COMMAND  = 0xC3
+SYNC_REPLY    = 0xC4
+MAX_PAYLOAD   = 255
+
+CMD_SPEED     = 0x01
+CMD_DIRECTION = 0x02
+CMD_SPEEDS    = 0x03
+CMD_STOP      = 0x04
+CMD_PROFILE   = 0x05
+CMD_QUERY     = 0x06
+CMD_PING      = 0x07
+
+STATUS_NAMES  = ["ok", "unknown command", "bad motor or direction", "truncated command", "no profile"]
+
+MOTOR_STATE   = struct.Struct("<BHHh")
+
+
+# Returns the CRC-8, polynomial 0x07, lookup table
+def crc8Table():
+    table = bytearray(256)
+    for n in range(256):
+        crc = n
+        for bit in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[n] = crc
+    return bytes(table)
+
+CRC8_TABLE = crc8Table()
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+# Signed speed as 3 little endian bytes
+def int24(value: int):
+    if ( value < -0x800000 or value > 0x7FFFFF ):
+        raise ValueError("speed out of range: %d" % value)
+    return (value & 0xFFFFFF).to_bytes(3, "little")
+
+
+# Command builders.  Each returns the bytes of one command.
+def speed(motor: int, value: int):
+    return bytes((CMD_SPEED, motor)) + int24(value)
+
+def direction(motor: int, value: int):
+    return bytes((CMD_DIRECTION, motor, value))
+
+def speeds(values):
+    return bytes((CMD_SPEEDS, len(values))) + b"".join(int24(value) for value in values)
+
+def stop():
+    return bytes((CMD_STOP,))
+
+def profile(action: int):
+    return bytes((CMD_PROFILE, action))
+
+def query():
+    return bytes((CMD_QUERY,))
+
+def ping():
+    return bytes((CMD_PING,))
+
+
+# Returns a command frame holding the commands in payload
+def encodeFrame(sequence: int, payload: bytes):
+    if ( len(payload) > MAX_PAYLOAD ):
+        raise ValueError("frame payload too long: %d bytes" % len(payload))
+    body = bytes((len(payload), sequence)) + payload
+    return bytes((SYNC1, SYNC_COMMAND)) + body + bytes((crc8(body),))
+
+
+# Split a reply payload into a dictionary with "status", "done", and "motors",
+# a list of (direction, duty, speed, rpm) if the frame had a query in it.
+def decodeReply(payload: bytes):
+    motors = [MOTOR_STATE.unpack_from(payload, offset) for offset in range(2, len(payload) - 6, MOTOR_STATE.size)]
+    return { "status": payload[0], "done": payload[1], "motors": motors }
+
+
+class CommandError(Exception):
+    """A frame was refused by the Pico, or never answered."""
+
+
+class CommandClient:
+    """Pipelined asyncio client for the test bed command protocol."""
+
+    # @param window   Most frames waiting for a reply at a time, at most 128
+    # @param timeout  Seconds to wait for a reply before sending a frame again
+    # @param retries  Times a frame is sent again before giving up
+    def __init__(self, window=8, timeout=0.5, retries=2):
+        self.window   = asyncio.Semaphore(window)
+        self.timeout  = timeout
+        self.retries  = retries
+        self.fd       = -1
+        self.loop     = None
+        self.received = bytearray()
+        self.unsent   = bytearray()
+        self.waiting  = {}      # sequence -> Future of the reply
+        self.sequence = 0
+        self.resent   = 0
+
+    # Open a serial port, or a pseudo terminal, in raw mode
+    async def open(self, path: str):
+        self.openFd(os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK))
+
+    # Use a file descriptor that is already open
+    def openFd(self, fd: int):
+        self.fd   = fd
+        self.loop = asyncio.get_running_loop()
+        if ( os.isatty(fd) ):
+            tty.setraw(fd, termios.TCSANOW)
+        os.set_blocking(fd, False)
+        self.loop.add_reader(fd, self.readable)
+
+    def close(self):
+        if ( self.fd >= 0 ):
+            self.loop.remove_reader(self.fd)
+            self.loop.remove_writer(self.fd)
+            os.close(self.fd)
+            self.fd = -1
+        for future in self.waiting.values():
+            if ( not future.done() ):
+                future.set_exception(CommandError("connection closed"))
+
+    # Send one frame holding the commands, and wait for its reply.
+    #
+    # Returns the reply from decodeReply().  Raises CommandError if the Pico
+    # refused one of the commands or never replied.
+    async def request(self, *commands):
+        payload = b"".join(commands)
+        async with self.window:
+            sequence = self.sequence
+            while ( sequence in self.waiting ):
+                sequence = (sequence + 1) & 0xFF
+            self.sequence = (sequence + 1) & 0xFF
+            frame  = encodeFrame(sequence, payload)
+            future = self.loop.create_future()
+            self.waiting[sequence] = future
+            try:
+                for attempt in range(self.retries + 1):
+                    if ( attempt > 0 ):
+                        self.resent += 1
+                    self.write(frame)
+                    try:
+                        reply = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+                        break
+                    except asyncio.TimeoutError:
+                        continue
+                else:
+                    raise CommandError("no reply to frame %d" % sequence)
+            finally:
+                del self.waiting[sequence]
+
+        if ( reply["status"] != 0 ):
+            raise CommandError("command %d refused: %s" % (reply["done"] + 1, STATUS_NAMES[reply["status"]]))
+        return reply
+
+    async def setSpeed(self, motor: int, value: int):
+        return await self.request(speed(motor, value))
+
+    async def setSpeeds(self, values):
+        return await self.request(speeds(values))
+
+    async def stop(self):
+        return await self.request(stop())
+
+    async def query(self):
+        return (await self.request(query()))["motors"]
+
+    async def ping(self):
+        return await self.request(ping())
+
+    def write(self, data: bytes):
+        if ( self.unsent ):
+            self.unsent += data
+            return
+        try:
+            written = os.write(self.fd, data)
+        except BlockingIOError:
+            written = 0
+        if ( written < len(data) ):
+            self.unsent += data[written:]
+            self.loop.add_writer(self.fd, self.writable)
+
+    def writable(self):
+        try:
+            written = os.write(self.fd, self.unsent)
+        except BlockingIOError:
+            return
+        del self.unsent[:written]
+        if ( not self.unsent ):
+            self.loop.remove_writer(self.fd)
+
+    def readable(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            # The other end of a pseudo terminal was closed
+            data = b""
+        if ( not data ):
+            self.loop.remove_reader(self.fd)
+            return
+        self.received += data
+        self.parse()
+
+    # Find the reply frames in the bytes received so far
+    def parse(self):
+        received = self.received
+        while ( True ):
+            offset = received.find(bytes((SYNC1, SYNC_REPLY)))
+            if ( offset < 0 ):
+                # Keep a last 0xA5, it may be the start of a frame
+                del received[:max(0, len(received) - 1)]
+                return
+            if ( offset + 4 > len(received) ):
+                del received[:offset]
+                return
+            length = received[offset + 2]
+            end    = offset + 4 + length
+            if ( end + 1 > len(received) ):
+                del received[:offset]
+                return
+            if ( crc8(received[offset + 2:end]) != received[end] ):
+                # Not a real frame, e.g. telemetry bytes that look like one
+                del received[:offset + 1]
+                continue
+
+            sequence = received[offset + 3]
+            future   = self.waiting.get(sequence)
+            if ( future != None and not future.done() ):
+                future.set_result(decodeReply(bytes(received[offset + 4:end])))
+            del received[:end + 1]
+
+    # End of CommandClient class
+
+
+# Split a "MOTOR:VALUE" command line argument
+def _pair(text: str):
+    motor, value = text.split(":")
+    return int(motor), int(value)
+
+
+async def run(args):
+    client = CommandClient(timeout=args.timeout)
+    await client.open(args.port)
+    try:
+        commands = [speed(motor, value) for motor, value in map(_pair, args.speed)]
+        commands += [direction(motor, value) for motor, value in map(_pair, args.direction)]
+        if ( args.stop ):
+            commands.append(stop())
+        if ( args.profile != None ):
+            commands.append(profile(args.profile))
+        if ( args.query ):
+            commands.append(query())
+        reply = await client.request(*(commands or [ping()]))
+        print("%d commands done" % reply["done"])
+        for n, (dir, duty, value, rpm) in enumerate(reply["motors"]):
+            print("Motor %d: direction %d, speed %d, duty %d, rpm %d" % (n, dir, value, duty, rpm))
+    finally:
+        client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send commands to the test bed over its USB serial port")
+    parser.add_argument("port", help="serial port, e.g. /dev/ttyACM0")
+    parser.add_argument("--speed", action="append", default=[], metavar="MOTOR:SPEED",
+                        help="set a signed speed, negative is BACKWARD")
+    parser.add_argument("--direction", action="append", default=[], metavar="MOTOR:DIRECTION",
+                        help="set a direction, 0 STOPPED, 1 FORWARD, 2 BACKWARD")
+    parser.add_argument("--stop", action="store_true", help="stop every motor")
+    parser.add_argument("--profile", type=int, choices=(0, 1, 2), help="0 stop, 1 start, 2 loop the test profile")
+    parser.add_argument("--query", action="store_true", help="print the state of every motor")
+    parser.add_argument("--timeout", type=float, default=0.5, help="seconds to wait for each reply")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
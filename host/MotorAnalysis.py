@@ -0,0 +1,409 @@
+# Motor characterization from recorded test bed runs.
+#
+# A run is a recording of what each motor was commanded, duty, direction and
+# IN1/IN2 over time, along with the speed the motor turned at.  Runs are kept
+# in a compact binary file of fixed size records, one record per motor per
+# sample, so hundreds of runs can be analysed in one go:
+#
+#   python3 host/MotorAnalysis.py convert runs.ttm capture1.csv capture2.csv ...
+#   python3 host/MotorAnalysis.py analyze runs.ttm
+#
+# The CSV files are the ones written by host/TelemetryDecoder.py, with the
+# measured speed of each motor added as columns rpm0, rpm1, ...  They can come
+# from an encoder, a tachometer or the simulator's SimMotor.
+#
+# The analysis never loads a whole file.  The records are read through a
+# memory mapped window of chunkRecords at a time and reduced to one row per
+# segment, where a segment is a stretch of one run and motor with the same
+# command.  Everything else is worked out from the segment table with whole
+# array operations:
+#
+#   - the duty to speed transfer curve of each motor and direction
+#   - the dead band edges: the lowest duty that starts a motor from rest, and
+#     the lowest duty at which a running motor keeps turning
+#   - the step response: 10% to 90% rise time and 5% settling time
+#   - the mismatch between the motors of each run at the same duty
+#
+# Needs numpy (pip install numpy).
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+MAGIC       = b"TTMR"
+VERSION     = 1
+HEADER_SIZE = 16
+
+# One record.  direction is 0 STOPPED, 1 FORWARD, 2 BACKWARD as in the
+# telemetry, and pins is IN1 | IN2 << 1.  Packed, 21 bytes.
+RECORD = np.dtype([
+    ("run",       "<u4"),
+    ("time_us",   "<i8"),
+    ("rpm",       "<f4"),
+    ("duty",      "<u2"),
+    ("motor",     "u1"),
+    ("direction", "u1"),
+    ("pins",      "u1"),
+])
+
+# One segment: a stretch of one run and motor with the same command
+SEGMENT = np.dtype([
+    ("run",       "<u4"),
+    ("motor",     "u1"),
+    ("direction", "u1"),
+    ("pins",      "u1"),
+    ("duty",      "<u2"),
+    ("samples",   "<u4"),
+    ("start_us",  "<i8"),
+    ("startRpm",  "<f4"),
+    ("finalRpm",  "<f4"),   # Mean speed over the last steadyFraction of the segment
+    ("t10_us",    "<f4"),   # From the start until 10% of the way to finalRpm, NaN if never
+    ("t90_us",    "<f4"),
+    ("settle_us", "<f4"),   # Until the speed stays within band of finalRpm, NaN if it does not
+])
+
+FORWARD  = 1
+BACKWARD = 2
+
+
+# Returns the header written at the start of a run file
+def header():
+    return MAGIC + np.array([VERSION, RECORD.itemsize], "<u2").tobytes() + bytes(HEADER_SIZE - 8)
+
+
+# Returns the number of records in a run file, checking its header
+def recordCount(path: str):
+    with open(path, "rb") as stream:
+        head = stream.read(HEADER_SIZE)
+    if ( len(head) < HEADER_SIZE or head[:4] != MAGIC ):
+        raise ValueError("%s: not a run file" % path)
+    version, size = np.frombuffer(head[4:8], "<u2")
+    if ( version != VERSION or size != RECORD.itemsize ):
+        raise ValueError("%s: run file version %d with %d byte records is not supported" % (path, version, size))
+    return (os.path.getsize(path) - HEADER_SIZE) // RECORD.itemsize
+
+
+# Append the records of some runs to a run file, creating it if needed.  The
+# records of each run and motor must be together and in time order.
+def appendRuns(path: str, records):
+    records = np.asarray(records, RECORD)
+    exists  = os.path.exists(path) and os.path.getsize(path) > 0
+    if ( exists ):
+        recordCount(path)
+    with open(path, "ab") as stream:
+        if ( not exists ):
+            stream.write(header())
+        stream.write(records.tobytes())
+
+
+# Returns the next free run number of a run file, 0 for a new file
+def nextRun(path: str):
+    if ( not os.path.exists(path) or os.path.getsize(path) == 0 ):
+        return 0
+    runs = -1
+    for chunk in iterChunks(path):
+        runs = max(runs, int(chunk["run"].max()))
+    return runs + 1
+
+
+# Convert a decoded telemetry CSV file, with rpm columns added, to records
+# with the given run number.  Motor 0's records come first, then motor 1's.
+def loadCsv(path: str, run: int):
+    table = np.genfromtxt(path, delimiter=",", names=True, dtype=None, encoding="utf-8")
+    names = table.dtype.names
+    motor = 0
+    parts = []
+    while ( "duty%d" % motor in names ):
+        if ( "rpm%d" % motor not in names ):
+            raise ValueError("%s: no rpm%d column; add the measured speed of each motor" % (path, motor))
+        part = np.empty(len(table), RECORD)
+        part["run"]       = run
+        part["time_us"]   = table["time_us"]
+        part["rpm"]       = table["rpm%d" % motor]
+        part["duty"]      = table["duty%d" % motor]
+        part["motor"]     = motor
+        part["direction"] = table["direction%d" % motor]
+        part["pins"]      = table["in1_%d" % motor] | (table["in2_%d" % motor] << 1)
+        parts.append(part)
+        motor += 1
+    if ( not parts ):
+        raise ValueError("%s: no duty0 column; is it a telemetry CSV?" % path)
+    return np.concatenate(parts)
+
+
+# Yield the records of a run file chunkRecords at a time.  Each chunk is its
+# own memory mapped window, which is let go before the next one is mapped, so
+# only one window of the file is ever in memory.  chunkRecords of 0 reads the
+# whole file into memory instead, to compare against.
+def iterChunks(path: str, chunkRecords=1 << 20):
+    count = recordCount(path)
+    if ( chunkRecords <= 0 ):
+        yield np.fromfile(path, RECORD, count=count, offset=HEADER_SIZE)
+        return
+    for first in range(0, count, chunkRecords):
+        size = min(chunkRecords, count - first)
+        yield np.memmap(path, RECORD, mode="r", offset=HEADER_SIZE + first * RECORD.itemsize, shape=(size,))
+
+
+# Returns the index of the first record of each segment of a block of records
+def segmentStarts(block):
+    change = np.zeros(len(block), bool)
+    if ( len(block) == 0 ):
+        return np.flatnonzero(change)
+    change[0] = True
+    for name in ("run", "motor", "duty", "direction", "pins"):
+        column = block[name]
+        change[1:] |= column[1:] != column[:-1]
+    return np.flatnonzero(change)
+
+
+# Reduce a block of whole segments to the segment table.
+#
+# @param block           Records; the first record of the block starts a segment
+# @param starts          The result of segmentStarts(block)
+# @param steadyFraction  Share of the end of each segment averaged for its final speed
+# @param band            Settling band, as a share of the step
+# @param bandRpm         Smallest settling band in rpm, so noise on small steps
+#                        does not stop them from ever settling
+# @param minStepRpm      Steps smaller than this get no step response times
+def reduceSegments(block, starts, steadyFraction=0.2, band=0.05, bandRpm=1.0, minStepRpm=5.0):
+    count   = len(block)
+    ends    = np.append(starts[1:], count)
+    lengths = ends - starts
+    rpm     = np.asarray(block["rpm"], np.float64)
+    time    = block["time_us"]
+
+    table = np.empty(len(starts), SEGMENT)
+    for name in ("run", "motor", "direction", "pins", "duty"):
+        table[name] = block[name][starts]
+    table["samples"]  = lengths
+    table["start_us"] = time[starts]
+    startRpm = rpm[starts]
+    table["startRpm"] = startRpm
+
+    # Mean of the steady part of each segment from a running sum
+    steady  = np.maximum(1, (lengths * steadyFraction).astype(np.int64))
+    total   = np.concatenate(([0.0], np.cumsum(rpm)))
+    final   = (total[ends] - total[ends - steady]) / steady
+    table["finalRpm"] = final
+
+    # How far each record is from the start of its segment towards the final speed
+    step    = final - startRpm
+    big     = np.abs(step) >= minStepRpm
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        progress = (rpm - startRpm[segment]) / step[segment]
+    index   = np.arange(count)
+
+    first10 = np.minimum.reduceat(np.where(progress >= 0.1, index, count), starts)
+    first90 = np.minimum.reduceat(np.where(progress >= 0.9, index, count), starts)
+    limit   = np.maximum(np.abs(step) * band, bandRpm)
+    outside = np.maximum.reduceat(np.where(np.abs(rpm - final[segment]) > limit[segment], index, -1), starts)
+    settled = np.where(outside < 0, starts, outside + 1)
+
+    last = count - 1
+    for name, found in (("t10_us", first10), ("t90_us", first90), ("settle_us", settled)):
+        valid = big & (found < ends)
+        table[name] = np.where(valid, time[np.minimum(found, last)] - time[starts], np.nan)
+    return table
+
+
+# Reduce a run file to its segment table, streaming it chunkRecords at a time.
+#
+# A segment that runs over the end of a chunk is carried over to the next one,
+# so every segment is reduced whole.
+def segmentTable(path: str, chunkRecords=1 << 20, **options):
+    tables = []
+    carry  = None
+    for chunk in iterChunks(path, chunkRecords):
+        block = chunk if carry is None else np.concatenate((carry, chunk))
+        starts = segmentStarts(block)
+        # The last segment may go on in the next chunk
+        last = starts[-1]
+        if ( last > 0 ):
+            tables.append(reduceSegments(block[:last], starts[:-1], **options))
+        carry = np.array(block[last:])
+        del chunk, block
+    if ( carry is not None and len(carry) ):
+        tables.append(reduceSegments(carry, segmentStarts(carry), **options))
+    if ( not tables ):
+        return np.empty(0, SEGMENT)
+    return np.concatenate(tables)
+
+
+# Returns the mean of values for each key in [0..size), NaN where there are none
+def groupMean(keys, values, size: int):
+    counts = np.bincount(keys, minlength=size)
+    sums   = np.bincount(keys, weights=values, minlength=size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return sums / counts, counts
+
+
+# Work out the motor characteristics from a segment table.
+#
+# @param segments    The result of segmentTable()
+# @param dutyBins    Number of duty bins for the transfer curve
+# @param moveRpm     A motor at or above this speed is turning
+# @param minSamples  Segments shorter than this are left out, e.g. the odd
+#                    record between two commands
+#
+# Returns a dictionary of arrays.  The axes are run, motor, direction
+# (0 FORWARD, 1 BACKWARD) and duty bin:
+#   "runs"            run numbers, in the order of the run axis
+#   "transfer"        (motor, direction, bin) mean speed over every run
+#   "transferStd"     the same, standard deviation
+#   "transferCount"   the same, number of segments
+#   "runTransfer"     (run, motor, direction, bin) mean speed of each run
+#   "startDuty"       (run, motor, direction) lowest duty that started the motor from rest
+#   "stallDuty"       (run, motor, direction) lowest duty at which the running motor kept turning
+#   "riseMs"          (run, motor, direction) mean 10% to 90% rise time of the steps
+#   "settleMs"        (run, motor, direction) mean settling time of the steps
+#   "mismatch"        (run, direction, bin) (motor 0 - motor 1) / their mean speed
+#   "runMismatch"     (run, direction) mean absolute mismatch
+def characterize(segments, dutyBins=32, moveRpm=5.0, minSamples=3):
+    used     = segments[(segments["samples"] >= minSamples) &
+                        ((segments["direction"] == FORWARD) | (segments["direction"] == BACKWARD)) &
+                        ((segments["pins"] == 1) | (segments["pins"] == 2))]
+    runs, runIndex = np.unique(used["run"], return_inverse=True)
+    motors   = int(used["motor"].max()) + 1 if len(used) else 0
+    runCount = len(runs)
+    motor    = used["motor"].astype(np.int64)
+    way      = used["direction"].astype(np.int64) - 1
+    dutyBin  = (used["duty"].astype(np.int64) * dutyBins) >> 16
+    speed    = np.abs(used["finalRpm"].astype(np.float64))
+    result   = { "runs": runs }
+
+    size = motors * 2 * dutyBins
+    key  = (motor * 2 + way) * dutyBins + dutyBin
+    mean, counts = groupMean(key, speed, size)
+    square, _    = groupMean(key, speed * speed, size)
+    shape = (motors, 2, dutyBins)
+    result["transfer"]      = mean.reshape(shape)
+    result["transferStd"]   = np.sqrt(np.maximum(0.0, square - mean * mean)).reshape(shape)
+    result["transferCount"] = counts.reshape(shape)
+
+    runKey = runIndex.astype(np.int64) * size + key
+    mean, _ = groupMean(runKey, speed, runCount * size)
+    result["runTransfer"] = mean.reshape((runCount,) + shape)
+
+    # Dead band edges: the lowest duty of each kind of segment
+    cell     = (runIndex.astype(np.int64) * motors + motor) * 2 + way
+    cells    = runCount * motors * 2
+    moving   = speed >= moveRpm
+    fromRest = np.abs(used["startRpm"]) < moveRpm
+    duty     = used["duty"].astype(np.float64)
+    for name, chosen in (("startDuty", moving & fromRest), ("stallDuty", moving & ~fromRest)):
+        lowest = np.full(cells, np.inf)
+        np.minimum.at(lowest, cell[chosen], duty[chosen])
+        lowest[np.isinf(lowest)] = np.nan
+        result[name] = lowest.reshape(runCount, motors, 2)
+
+    # Step response, the mean of the steps that have one
+    for name, column in (("riseMs", used["t90_us"] - used["t10_us"]), ("settleMs", used["settle_us"])):
+        valid = ~np.isnan(column)
+        mean, _ = groupMean(cell[valid], column[valid].astype(np.float64) / 1000.0, cells)
+        result[name] = mean.reshape(runCount, motors, 2)
+
+    # Motor to motor mismatch within each run
+    if ( motors >= 2 ):
+        runTransfer = result["runTransfer"]
+        first  = runTransfer[:, 0]
+        second = runTransfer[:, 1]
+        both   = (first >= moveRpm) & (second >= moveRpm)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mismatch = np.where(both, (first - second) / ((first + second) / 2), np.nan)
+        result["mismatch"] = mismatch
+        counted = both.sum(axis=2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result["runMismatch"] = np.where(counted > 0, np.nansum(np.abs(mismatch), axis=2) / counted, np.nan)
+    return result
+
+
+# Load a run file and characterize it
+def analyze(path: str, chunkRecords=1 << 20, dutyBins=32, moveRpm=5.0):
+    segments = segmentTable(path, chunkRecords)
+    return segments, characterize(segments, dutyBins=dutyBins, moveRpm=moveRpm)
+
+
+# Returns "median (min..max)" of the values that are not NaN
+def spread(values, scale=1.0, form="%.0f"):
+    values = values[~np.isnan(values)] * scale
+    if ( len(values) == 0 ):
+        return "-"
+    return (form + " (" + form + ".." + form + ")") % (np.median(values), values.min(), values.max())
+
+
+def printReport(segments, result, stream=sys.stdout):
+    runs = len(result["runs"])
+    print("%d runs, %d segments" % (runs, len(segments)), file=stream)
+    motors = result["transfer"].shape[0]
+    names  = ("forward", "backward")
+    print("%-18s %22s %22s %20s %20s" % ("", "start duty", "stall duty", "rise ms", "settle ms"), file=stream)
+    for motor in range(motors):
+        for way in range(2):
+            print("%-18s %22s %22s %20s %20s" %
+                  ("motor %d %s" % (motor, names[way]),
+                   spread(result["startDuty"][:, motor, way]),
+                   spread(result["stallDuty"][:, motor, way]),
+                   spread(result["riseMs"][:, motor, way], form="%.1f"),
+                   spread(result["settleMs"][:, motor, way], form="%.1f")), file=stream)
+    if ( "runMismatch" in result ):
+        for way in range(2):
+            print("Motor 0 to motor 1 mismatch %s: %s %%" %
+                  (names[way], spread(result["runMismatch"][:, way], 100.0, "%.1f")), file=stream)
+
+
+# Write the transfer curves as CSV: duty, then mean rpm and standard deviation
+# for each motor and direction
+def writeCurve(result, stream):
+    transfer = result["transfer"]
+    motors, ways, bins = transfer.shape
+    names = []
+    for motor in range(motors):
+        for way in ("forward", "backward"):
+            names += ["rpm%d_%s" % (motor, way), "std%d_%s" % (motor, way)]
+    stream.write("duty," + ",".join(names) + "\n")
+    for dutyBin in range(bins):
+        row = [str(((2 * dutyBin + 1) << 16) // (2 * bins))]
+        for motor in range(motors):
+            for way in range(ways):
+                row.append("%.2f" % transfer[motor, way, dutyBin])
+                row.append("%.2f" % result["transferStd"][motor, way, dutyBin])
+        stream.write(",".join(row) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Characterize motors from recorded test bed runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="add telemetry CSV files with rpm columns to a run file")
+    convert.add_argument("runs", help="run file to add to")
+    convert.add_argument("csv", nargs="+", help="decoded telemetry CSV files, one per run")
+
+    report = commands.add_parser("analyze", help="characterize the motors in a run file")
+    report.add_argument("runs", help="run file")
+    report.add_argument("--chunk", type=int, default=1 << 20, help="records per memory mapped chunk, 0 to load it whole")
+    report.add_argument("--bins", type=int, default=32, help="duty bins of the transfer curve")
+    report.add_argument("--move-rpm", type=float, default=5.0, help="speed at which a motor counts as turning")
+    report.add_argument("--curve", help="write the transfer curves to this CSV file")
+    args = parser.parse_args(argv)
+
+    if ( args.command == "convert" ):
+        run = nextRun(args.runs)
+        for path in args.csv:
+            appendRuns(args.runs, loadCsv(path, run))
+            print("%s: run %d" % (path, run))
+            run += 1
+        return
+
+    segments, result = analyze(args.runs, args.chunk, args.bins, args.move_rpm)
+    printReport(segments, result)
+    if ( args.curve ):
+        with open(args.curve, "w") as stream:
+            writeCurve(result, stream)
+
+
+if __name__ == "__main__":
+    main()
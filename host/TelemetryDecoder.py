@@ -0,0 +1,162 @@
+# Decoder for the binary telemetry frames written by src/Telemetry.py.
+#
+# A capture is the raw bytes read from the Pico's USB serial port.  It may also
+# hold text printed by the test bed program; anything that is not a frame is
+# skipped.  The records are returned as columns of Python arrays, one array per
+# field, ready for analysis or for writing to a CSV file.
+#
+#   python3 host/TelemetryDecoder.py capture.bin --csv capture.csv
+#
+# The capture can be taken with any serial terminal that saves raw bytes, e.g.
+#   cat /dev/ttyACM0 > capture.bin
+
+import argparse
+import struct
+import sys
+
+from array import array
+
+SYNC        = b"\xa5\x5a"
+HEADER      = struct.Struct("<BBBBHH")
+TICKS_MAX   = (1 << 30) - 1     # utime.ticks_us() wraps at 2**30
+
+
+# Returns the record size for a frame layout byte
+def recordSize(layout: int):
+    return 4 + 2 * (layout >> 4) + 3 * (layout & 0x0F)
+
+
+# Split a capture into frames.
+#
+# Yields (layout, sequence, dropped, records) for each frame, where records is
+# the bytes of the frame's records.
+def frames(data: bytes):
+    offset = 0
+    end    = len(data)
+    while ( True ):
+        offset = data.find(SYNC, offset)
+        if ( offset < 0 or offset + HEADER.size > end ):
+            return
+        sync1, sync2, layout, count, sequence, dropped = HEADER.unpack_from(data, offset)
+        size  = recordSize(layout)
+        start = offset + HEADER.size
+        stop  = start + count * size
+        if ( count == 0 or stop > end ):
+            # Not a real frame, or cut off at the end of the capture
+            offset += 1
+            continue
+        yield layout, sequence, dropped, data[start:stop]
+        offset = stop
+
+
+# Decode a capture into columns.
+#
+# Returns a dictionary with:
+#   "time_us"                     array('q') of record times, unwrapped so they keep increasing
+#   "pot0", "pot1", ...           array('H') of potentiometer values
+#   "duty0", "duty1", ...         array('H') of motor duties
+#   "direction0", ...             array('B') of motor directions (0 STOPPED, 1 FORWARD, 2 BACKWARD)
+#   "in1_0", "in2_0", ...         array('B') of the IN1 and IN2 pin values
+#   "frames", "lostFrames", "dropped"   counts for checking the capture
+def decode(data: bytes):
+    columns  = None
+    layout   = None
+    frameCount    = 0
+    lostFrames    = 0
+    lastSequence  = None
+    dropped       = 0
+    firstDropped  = None
+    lastTicks     = None
+    timeUs        = 0
+
+    for frameLayout, sequence, droppedCount, records in frames(data):
+        if ( layout == None ):
+            layout  = frameLayout
+            pots    = layout >> 4
+            motors  = layout & 0x0F
+            columns = { "time_us": array("q") }
+            for n in range(pots):
+                columns["pot%d" % n] = array("H")
+            for n in range(motors):
+                columns["duty%d" % n]      = array("H")
+                columns["direction%d" % n] = array("B")
+                columns["in1_%d" % n]      = array("B")
+                columns["in2_%d" % n]      = array("B")
+            record = struct.Struct("<I" + "H" * pots + "HB" * motors)
+        elif ( frameLayout != layout ):
+            # Frames from a different program run; the capture is not consistent
+            continue
+
+        frameCount += 1
+        if ( lastSequence != None ):
+            lostFrames += (sequence - lastSequence - 1) & 0xFFFF
+        lastSequence = sequence
+        if ( firstDropped == None ):
+            firstDropped = droppedCount
+        dropped = (droppedCount - firstDropped) & 0xFFFF
+
+        for values in record.iter_unpack(records):
+            ticks = values[0]
+            if ( lastTicks != None ):
+                timeUs += (ticks - lastTicks) & TICKS_MAX
+            lastTicks = ticks
+            columns["time_us"].append(timeUs)
+            for n in range(pots):
+                columns["pot%d" % n].append(values[1 + n])
+            for n in range(motors):
+                duty  = values[1 + pots + 2 * n]
+                flags = values[2 + pots + 2 * n]
+                columns["duty%d" % n].append(duty)
+                columns["direction%d" % n].append(flags & 3)
+                columns["in1_%d" % n].append((flags >> 2) & 1)
+                columns["in2_%d" % n].append((flags >> 3) & 1)
+
+    if ( columns == None ):
+        columns = { "time_us": array("q") }
+    columns["frames"]     = frameCount
+    columns["lostFrames"] = lostFrames
+    columns["dropped"]    = dropped
+    return columns
+
+
+# Returns the names of the array columns of a decoded capture, in record order
+def columnNames(columns):
+    return [name for name, value in columns.items() if isinstance(value, array)]
+
+
+# Write a decoded capture as a CSV file with one row per record
+def writeCsv(columns, stream):
+    names = columnNames(columns)
+    stream.write(",".join(names) + "\n")
+    for row in zip(*(columns[name] for name in names)):
+        stream.write(",".join(str(value) for value in row) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode a test bed telemetry capture")
+    parser.add_argument("capture", help="raw capture file, or - for standard input")
+    parser.add_argument("--csv", help="write the records to this CSV file, or - for standard output")
+    args = parser.parse_args(argv)
+
+    if ( args.capture == "-" ):
+        data = sys.stdin.buffer.read()
+    else:
+        with open(args.capture, "rb") as capture:
+            data = capture.read()
+
+    columns = decode(data)
+    count   = len(columns["time_us"])
+    if ( args.csv == "-" ):
+        writeCsv(columns, sys.stdout)
+    elif ( args.csv ):
+        with open(args.csv, "w") as stream:
+            writeCsv(columns, stream)
+
+    seconds = columns["time_us"][-1] / 1000000 if count else 0.0
+    print("%d records in %d frames over %.3f s, %d frames lost, %d records dropped on the Pico" %
+          (count, columns["frames"], seconds, columns["lostFrames"], columns["dropped"]),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Simulated AdcDmaBackend, ahead of the one in src on the import path.
+#
+# The real backend has the ADC and DMA fill the buffers without the CPU.  This
+# one fills each buffer when its block time is up, from readAdcAt() at the time
+# each sample would have been converted, then charges one interrupt entry and
+# calls blockDone() the way the DMA interrupt does.  Only the interrupt costs
+# the code under test any time, as on the Pico.
+
+from SimClock import clock
+
+import SimHardware
+
+
+class AdcDmaBackend:
+    """Simulated free running ADC and DMA backend for AdcCapture."""
+
+    ADC_CLOCK = 48000000
+    MIN_DIV   = 96
+
+    def __init__(self):
+        self.capture = None
+        self.event   = None
+        self.blocks  = 0
+
+    def start(self, capture, hz: int):
+        self.capture = capture
+        clocks = self.ADC_CLOCK // (hz * capture.count)
+        if ( clocks < self.MIN_DIV ):
+            raise ValueError("AdcDmaBackend: The ADC can not sample that fast")
+        self.channels  = [SimHardware.adcChannel(channel) for channel in capture.channels]
+        # Time between conversions in ns, from the ADC divider as on the Pico
+        self.sampleNs  = clocks * 1000000000 // self.ADC_CLOCK
+        self.startNs   = clock.nowUs * 1000
+        self.converted = 0
+        self.blocks    = 0
+        self.event     = clock.at(self._blockEndUs(), self._blockDone)
+
+    def stop(self):
+        clock.cancel(self.event)
+        self.event = None
+
+    def _blockEndUs(self):
+        return (self.startNs + (self.converted + self.capture.blockSize) * self.sampleNs) // 1000
+
+    def _blockDone(self, arg):
+        capture  = self.capture
+        buffer   = capture.fillBuffer()
+        channels = self.channels
+        count    = len(channels)
+        for n in range(capture.blockSize):
+            timeUs = (self.startNs + (self.converted + n) * self.sampleNs) // 1000
+            buffer[n] = SimHardware.readAdcAt(channels[n % count], timeUs) >> 4
+        self.converted += capture.blockSize
+        self.blocks    += 1
+        self.event = clock.at(self._blockEndUs(), self._blockDone)
+
+        SimHardware.charge("irqEntry")
+        capture.blockDone()
+
+    # End of AdcDmaBackend class
@@ -0,0 +1,284 @@
+# Virtual clock used by the host-side simulation of the Pico.
+#
+# All of the simulated modules (machine, utime, micropython) share one clock
+# object.  Time only moves when the code under test sleeps, idles, or is charged
+# for the time an operation would have taken on the Pico.  Because nothing
+# really waits, hours of test bed time can be run in a few seconds.
+#
+# Events (Pin level changes, Timer callbacks, ADC source changes) are kept in a
+# heap ordered by their due time.  When the clock advances past an event's due
+# time, the event's callback is run with the clock set to that due time.
+#
+# Callbacks queued with micropython.schedule() are held in a pending queue and
+# are run when the code under test is not already inside a callback, which is
+# how MicroPython runs soft interrupt handlers.
+#
+# Code started on the second core with _thread.start_new_thread() runs in a
+# host thread, but only one core runs at a time.  Each core has its own time.
+# When a core sleeps or is charged for time, the core that is furthest behind
+# runs next, so the cores see each other's writes in time order.  Interrupts,
+# timers and scheduled callbacks all run on core 0, as they do on the Pico.
+# Code on the second core must sleep or be charged for time now and then, as a
+# loop that never does would stop the simulation.
+
+import heapq
+import threading
+
+
+# Raised when the simulation end time is reached.
+#
+# This is derived from BaseException, not Exception, so that a "try/except Exception"
+# in the code under test does not swallow the end of the simulation.
+class SimulationEnd(BaseException):
+    pass
+
+
+class SimCore:
+    """A second Pico core running a function in a host thread."""
+
+    def __init__(self, clock, func, args):
+        self.clock    = clock
+        self.func     = func
+        self.args     = args
+        self.wakeUs   = clock.nowUs     # Time the core next runs from
+        self.finished = False
+        self.error    = None
+        self.turn     = threading.Semaphore(0)
+        self.thread   = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        self.turn.acquire()
+        try:
+            if ( not self.clock.stopping ):
+                self.func(*self.args)
+        except (SimulationEnd, SystemExit):
+            pass
+        except BaseException as error:
+            self.error = error
+        finally:
+            self.finished = True
+            self.clock.mainTurn.release()
+
+    # End of SimCore class
+
+
+class SimClock:
+    """Virtual microsecond clock and event queue for the simulated Pico."""
+
+    # MicroPython limits the number of callbacks pending in micropython.schedule()
+    SCHEDULE_DEPTH = 8
+
+    # Longest time core 0 idles in one go while another core is running, so it
+    # notices what the other core has done, as it would on a FIFO interrupt
+    CORE_IDLE_US   = 1000
+
+    def __init__(self):
+        self.cores    = []
+        self.current  = None    # The SimCore running now, None for core 0
+        self.stopping = False
+        self.mainTurn = threading.Semaphore(0)
+        self.reset()
+
+    # Start func(*args) on another core.  It first runs at the current time.
+    def startCore(self, func, args=()):
+        core = SimCore(self, func, args)
+        self.cores.append(core)
+        core.thread.start()
+        return core
+
+    # Returns True if a core started with startCore() is still running
+    def coreRunning(self):
+        return any(not core.finished for core in self.cores)
+
+    # End the functions running on the other cores.  They see SimulationEnd
+    # the next time they sleep or are charged for time.
+    def stopCores(self):
+        self.stopping = True
+        for core in self.cores:
+            if ( not core.finished ):
+                core.turn.release()
+                self.mainTurn.acquire()
+            core.thread.join()
+        self.cores    = []
+        self.current  = None
+        self.stopping = False
+
+    # Run another core from its wake time until it sleeps, is charged for time
+    # or returns.  Called on core 0.
+    def runCore(self, core):
+        savedUs      = self.nowUs
+        startUs      = core.wakeUs if core.wakeUs > savedUs else savedUs
+        self.current = core
+        self.nowUs   = startUs
+        core.turn.release()
+        self.mainTurn.acquire()
+        self.current = None
+        self.nowUs   = startUs
+        if ( core.error != None ):
+            error, core.error = core.error, None
+            raise error
+
+    # Returns the other core due to run first at or before limitUs, or None
+    def nextCore(self, limitUs: int):
+        found = None
+        for core in self.cores:
+            if ( not core.finished and core.wakeUs <= limitUs and
+                 (found == None or core.wakeUs < found.wakeUs) ):
+                found = core
+        return found
+
+    # Called on another core: wait until core 0 lets this core run again at wakeUs
+    def yieldCore(self, wakeUs: int):
+        core        = self.current
+        core.wakeUs = wakeUs
+        self.mainTurn.release()
+        core.turn.acquire()
+        if ( self.stopping ):
+            raise SimulationEnd()
+
+    # Return the clock to time zero and discard all pending events.
+    #
+    # @param endUs   Simulated time, in microseconds, at which SimulationEnd is raised.
+    #                None means the simulation runs until no events are left and the
+    #                code under test idles.
+    def reset(self, endUs=None):
+        self.nowUs     = 0
+        self.endUs     = endUs
+        self.events    = []
+        self.sequence  = 0
+        self.pending   = []
+        self.depth     = 0
+        self.stopCores()
+
+        # Statistics about how the code under test used the clock
+        self.wakeups     = 0    # Number of times sleep/idle returned to the caller
+        self.dispatched  = 0    # Number of events run
+        self.scheduled   = 0    # Number of micropython.schedule() callbacks run
+        self.dropped     = 0    # Number of micropython.schedule() calls refused
+
+    # Add an event that runs callback(arg) at the absolute time timeUs.
+    #
+    # Returns a handle that can be passed to cancel().
+    def at(self, timeUs: int, callback, arg=None):
+        if ( timeUs < self.nowUs ):
+            timeUs = self.nowUs
+        self.sequence += 1
+        event = [timeUs, self.sequence, callback, arg]
+        heapq.heappush(self.events, event)
+        return event
+
+    # Add an event that runs callback(arg) delayUs microseconds from now.
+    def after(self, delayUs: int, callback, arg=None):
+        return self.at(self.nowUs + delayUs, callback, arg)
+
+    # Cancel an event returned by at() or after().  Cancelled events stay in the
+    # heap but are skipped when they come due.
+    def cancel(self, event):
+        if ( event != None ):
+            event[2] = None
+
+    # Queue a soft callback, the simulated equivalent of micropython.schedule().
+    def schedule(self, func, arg):
+        if ( len(self.pending) >= self.SCHEDULE_DEPTH ):
+            self.dropped += 1
+            raise RuntimeError("schedule queue full")
+        self.pending.append((func, arg))
+
+    # Run the queued soft callbacks unless already inside a callback.
+    def runPending(self):
+        if ( self.depth > 0 or self.current != None ):
+            return
+        while ( self.pending ):
+            func, arg = self.pending.pop(0)
+            self.scheduled += 1
+            self.depth += 1
+            try:
+                func(arg)
+            finally:
+                self.depth -= 1
+
+    # Return the due time of the next live event, or None if there is none.
+    def nextEventUs(self):
+        while ( self.events and self.events[0][2] == None ):
+            heapq.heappop(self.events)
+        if ( self.events ):
+            return self.events[0][0]
+        return None
+
+    # Move the clock forward to targetUs, running every event that comes due
+    # on the way.  Raises SimulationEnd if the end time is passed.
+    def advanceTo(self, targetUs: int):
+        if ( self.current != None ):
+            # On another core: only its own time moves, and core 0 runs the events
+            self.yieldCore(targetUs)
+            return
+
+        limit = targetUs
+        if ( self.endUs != None and limit > self.endUs ):
+            limit = self.endUs
+
+        while ( True ):
+            self.runPending()
+            due  = self.nextEventUs()
+            core = self.nextCore(limit if due == None or due > limit else due - 1)
+            if ( core != None ):
+                self.runCore(core)
+                continue
+            if ( due == None or due > limit ):
+                break
+            event = heapq.heappop(self.events)
+            if ( event[0] > self.nowUs ):
+                self.nowUs = event[0]
+            callback = event[2]
+            self.dispatched += 1
+            self.depth += 1
+            try:
+                callback(event[3])
+            finally:
+                self.depth -= 1
+
+        if ( limit > self.nowUs ):
+            self.nowUs = limit
+
+        if ( self.endUs != None and targetUs > self.endUs ):
+            raise SimulationEnd()
+
+    # Move the clock forward by delayUs microseconds.
+    def advance(self, delayUs: int):
+        self.advanceTo(self.nowUs + delayUs)
+        self.wakeups += 1
+
+    # Charge the clock for CPU time used by the code under test.  Unlike advance()
+    # this is not counted as a wakeup.
+    def charge(self, costUs: int):
+        if ( costUs > 0 ):
+            self.advanceTo(self.nowUs + costUs)
+
+    # Sleep until the next event, the equivalent of machine.idle() or of a
+    # lightsleep that is woken by an interrupt.
+    #
+    # @param maxUs  Longest time to idle.  None means until the next event.
+    def idle(self, maxUs=None):
+        self.runPending()
+        due = self.nextEventUs()
+        if ( self.cores and self.coreRunning() and self.current == None ):
+            # Core 0 can be woken by the other core, so idle a little at a time
+            wake = self.nowUs + self.CORE_IDLE_US
+            if ( due == None or due > wake ):
+                due = wake
+        if ( maxUs != None ):
+            limit = self.nowUs + maxUs
+            if ( due == None or due > limit ):
+                due = limit
+        if ( due == None ):
+            if ( self.endUs == None ):
+                # Nothing can ever wake the code under test.
+                raise SimulationEnd()
+            due = self.endUs + 1
+        self.advance(due - self.nowUs)
+
+    # End of SimClock class
+
+
+# The one clock shared by all of the simulated modules
+clock = SimClock()
@@ -0,0 +1,52 @@
+# Simulated MicroPython gc module.
+#
+# gc is built into CPython, so like SimThread this cannot be found on the
+# import path.  SimRunner puts it in sys.modules as gc while the program runs.
+#
+# The Pico's MicroPython heap is one fixed block of about HEAP_BYTES.  CPython
+# has no such block, so mem_alloc() is the memory traced by tracemalloc since
+# it was started, or 0 if it is not running, and mem_free() is what is left of
+# HEAP_BYTES.  CPython objects are several times the size of MicroPython ones,
+# so these only compare one run on the host with another; they are not what a
+# Pico would report.
+
+import gc as hostGc
+import tracemalloc
+
+HEAP_BYTES = 192 * 1024
+
+enabled = True
+
+
+def collect():
+    hostGc.collect()
+    return 0
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def isenabled():
+    return enabled
+
+
+def mem_alloc():
+    if ( not tracemalloc.is_tracing() ):
+        return 0
+    return tracemalloc.get_traced_memory()[0]
+
+
+def mem_free():
+    return max(0, HEAP_BYTES - mem_alloc())
+
+
+def threshold(amount=None):
+    if ( amount == None ):
+        return -1
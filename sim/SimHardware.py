@@ -0,0 +1,300 @@
+# Simulated RP2040 hardware state shared by the simulated machine module.
+#
+# The state of every GPIO pin and ADC channel is kept here rather than in the
+# machine.Pin and machine.ADC objects because MicroPython allows more than one
+# Pin object to refer to the same GPIO pin.
+#
+# This module also provides the scripting side of the simulation:
+#   - Driving input pins, including button presses with contact bounce.
+#   - Attaching value sources to ADC channels, including noisy potentiometers.
+#   - Recording every write to an output pin or PWM slice in a trace.
+#   - Charging the virtual clock for the time an operation takes on the Pico.
+
+import random
+import time
+
+from SimClock import clock
+
+
+# Trace record kinds
+TRACE_PIN   = 0     # Output pin written: value is 0 or 1
+TRACE_DUTY  = 1     # PWM duty_u16 written: value is the duty
+TRACE_FREQ  = 2     # PWM frequency written: value is the frequency in Hz
+TRACE_IRQ   = 3     # Pin IRQ raised: value is the pin level
+
+
+# The state of a single GPIO pin
+class PinState:
+    """Level, mode and interrupt configuration of one simulated GPIO pin."""
+
+    def __init__(self, gpio: int):
+        self.gpio     = gpio
+        self.mode     = -1
+        self.pull     = -1
+        self.level    = 0       # Level seen when reading the pin
+        self.handler  = None
+        self.trigger  = 0
+        self.hard     = False
+        self.pinObj   = None    # Pin object passed to the IRQ handler
+        self.irqCount = 0
+        self.writes   = 0
+
+
+# All of the simulated state.  reset() returns everything to power-on values.
+pins       = {}
+adcSources = {}
+pwmDuty    = {}     # GPIO Pin Number --> PWM duty_u16 last written
+pwmFreq    = {}     # GPIO Pin Number --> PWM frequency last written
+trace      = []
+traceOn    = True
+
+# Simulated cost, in microseconds, of operations on the Pico.  These are zero by
+# default so a simulation runs as fast as possible.  A benchmark can set them to
+# measured Pico values so busy loops and long handlers take simulated time.
+costs = {
+    "pinRead":  0,
+    "pinWrite": 0,
+    "pwmWrite": 0,
+    "adcRead":  0,
+    "irqEntry": 0,
+    "usbByte":  0,      # Each byte printed or written to the USB serial port
+}
+
+# Rough cost, in microseconds, of each operation in MicroPython on a 125MHz Pico.
+# Benchmarks copy these into costs.
+PICO_COSTS = {
+    "pinRead":  3,
+    "pinWrite": 4,
+    "pwmWrite": 6,
+    "adcRead":  8,
+    "irqEntry": 20,
+}
+
+# When timeIsr is True, every run of a Pin IRQ handler adds a record of
+# (simulated microseconds, host nanoseconds) to isrTimes.
+timeIsr  = False
+isrTimes = []
+
+# Time spent in machine.lightsleep(), and the number of calls
+sleepUs  = 0
+sleeps   = 0
+
+
+# Return the simulation to its power-on state.
+#
+# @param endSeconds   Simulated time at which the simulation ends, or None.
+def reset(endSeconds=None):
+    global traceOn, sleepUs, sleeps
+
+    if ( endSeconds == None ):
+        clock.reset()
+    else:
+        clock.reset(int(endSeconds * 1000000))
+    pins.clear()
+    adcSources.clear()
+    pwmDuty.clear()
+    pwmFreq.clear()
+    del trace[:]
+    del isrTimes[:]
+    traceOn = True
+    sleepUs = 0
+    sleeps  = 0
+    for name in costs:
+        costs[name] = 0
+
+
+# Charge the virtual clock for count operations of the named type
+def charge(name: str, count=1):
+    cost = costs[name]
+    if ( cost > 0 ):
+        clock.charge(cost * count)
+
+
+# Return the state for a GPIO pin, creating it the first time it is used
+def pinState(gpio: int):
+    state = pins.get(gpio)
+    if ( state == None ):
+        state = PinState(gpio)
+        pins[gpio] = state
+    return state
+
+
+# Add a record to the trace
+def record(kind: int, gpio: int, value: int):
+    if ( traceOn ):
+        trace.append((clock.nowUs, kind, gpio, value))
+
+
+# Return the trace records of a single kind, optionally for a single pin
+def traceOf(kind: int, gpio=None):
+    return [rec for rec in trace if rec[1] == kind and (gpio == None or rec[2] == gpio)]
+
+
+# Set the level of an input pin from outside the Pico, as a button or a signal
+# generator would.  The pin's IRQ handler runs if the change matches its trigger.
+def setInput(gpio: int, level: int):
+    # Import here to avoid a circular import with the machine module
+    from machine import Pin
+
+    state = pinState(gpio)
+    level = 1 if level else 0
+    if ( level == state.level ):
+        return
+    state.level = level
+
+    if ( state.handler == None ):
+        return
+    if ( level ):
+        edge = Pin.IRQ_RISING
+    else:
+        edge = Pin.IRQ_FALLING
+    if ( state.trigger & edge ):
+        state.irqCount += 1
+        record(TRACE_IRQ, gpio, level)
+        if ( costs["irqEntry"] > 0 ):
+            clock.after(costs["irqEntry"], _runHandler, state)
+        else:
+            _runHandler(state)
+
+
+# Run, or for soft interrupts schedule, the IRQ handler of a pin
+def _runHandler(state: PinState):
+    if ( state.handler == None ):
+        return
+    if ( state.hard ):
+        _callHandler(state)
+    else:
+        try:
+            clock.schedule(_callHandler, state)
+        except RuntimeError:
+            # Same as MicroPython: the interrupt is lost if the queue is full
+            pass
+
+
+# Call the IRQ handler of a pin, timing it if timeIsr is set
+def _callHandler(state: PinState):
+    if ( not timeIsr ):
+        state.handler(state.pinObj)
+        return
+    startUs = clock.nowUs
+    startNs = time.perf_counter_ns()
+    state.handler(state.pinObj)
+    isrTimes.append((clock.nowUs - startUs, time.perf_counter_ns() - startNs))
+
+
+# Set the level of an input pin at an absolute simulated time in seconds
+def inputAt(gpio: int, seconds: float, level: int):
+    clock.at(int(seconds * 1000000), lambda arg: setInput(gpio, level))
+
+
+# Press and release a push button wired to pull the pin HIGH when pressed.
+#
+# @param gpio       The GPIO Pin Number of the button
+# @param seconds    Simulated time of the first contact
+# @param holdMs     How long the button is held down
+# @param bounces    Number of extra make/break transitions on both press and release
+# @param bounceMs   Time window in which the bounce transitions occur
+# @param seed       Seed for the bounce timing so a run can be repeated exactly
+def pressButton(gpio: int, seconds: float, holdMs=200, bounces=0, bounceMs=5, seed=None):
+    rng     = random.Random(seed)
+    startUs = int(seconds * 1000000)
+    holdUs  = int(holdMs * 1000)
+    edges   = []
+
+    for baseUs, level in ((startUs, 1), (startUs + holdUs, 0)):
+        times = sorted(rng.randrange(0, int(bounceMs * 1000) + 1) for i in range(2 * bounces))
+        value = level
+        edges.append((baseUs, value))
+        for offsetUs in times:
+            value = 1 - value
+            edges.append((baseUs + offsetUs + 1, value))
+        # Bounce always ends at the final level
+        if ( value != level ):
+            edges.append((baseUs + int(bounceMs * 1000) + 1, level))
+
+    for timeUs, level in edges:
+        clock.at(timeUs, _setInputEvent, (gpio, level))
+    return edges
+
+
+def _setInputEvent(arg):
+    setInput(arg[0], arg[1])
+
+
+# Returns the RP2040 PWM slice of a GPIO pin
+def pwmSlice(gpio: int):
+    return (gpio >> 1) & 7
+
+
+# Convert a GPIO pin number or ADC channel to an ADC channel number
+def adcChannel(id: int):
+    if ( id >= 26 ):
+        return id - 26
+    return id
+
+
+# Attach a value source to an ADC channel.
+#
+# @param id       The GPIO pin number (26..29) or ADC channel number (0..4)
+# @param source   Either a constant value or a function of the simulated time
+#                 in microseconds that returns the value in [0..65535]
+def setAdc(id: int, source):
+    adcSources[adcChannel(id)] = source
+
+
+# Read an ADC channel the way the RP2040 does: a 12 bit conversion scaled to 16 bits
+def readAdc(channel: int):
+    return readAdcAt(channel, clock.nowUs)
+
+
+# Returns what an ADC channel read at a given time, for conversions that happen
+# away from the code, e.g. the free running ADC behind the simulated DMA.
+def readAdcAt(channel: int, timeUs: int):
+    source = adcSources.get(channel, 0)
+    if ( callable(source) ):
+        value = int(source(timeUs))
+    else:
+        value = int(source)
+    if ( value < 0 ):
+        value = 0
+    elif ( value > 0xFFFF ):
+        value = 0xFFFF
+    value = value >> 4
+    return (value << 4) | (value >> 8)
+
+
+# ADC source for a potentiometer that is not being turned but whose reading
+# wanders by up to +/- noise counts, as the test bed potentiometers do.  With
+# spikeChance above zero, that fraction of readings are off by up to
+# +/- spikeSize counts.
+def noisyPot(value: int, noise=300, seed=None, spikeChance=0.0, spikeSize=4000):
+    rng = random.Random(seed)
+
+    def source(nowUs):
+        reading = value + rng.randint(-noise, noise)
+        if ( spikeChance > 0 and rng.random() < spikeChance ):
+            reading += rng.randint(-spikeSize, spikeSize)
+        return reading
+
+    return source
+
+
+# ADC source for a potentiometer that is turned from one value to another
+# at a constant rate over a period of time
+def turnPot(fromValue: int, toValue: int, startSeconds: float, seconds: float, noise=0, seed=None):
+    rng     = random.Random(seed)
+    startUs = int(startSeconds * 1000000)
+    spanUs  = int(seconds * 1000000)
+
+    def source(nowUs):
+        if ( nowUs <= startUs ):
+            value = fromValue
+        elif ( nowUs >= startUs + spanUs ):
+            value = toValue
+        else:
+            value = fromValue + (toValue - fromValue) * (nowUs - startUs) // spanUs
+        if ( noise ):
+            value += rng.randint(-noise, noise)
+        return value
+
+    return source
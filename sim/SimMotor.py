@@ -0,0 +1,183 @@
+# Simulated TT gear motor driven by one channel of a simulated TB6612FNG.
+#
+# The motor reads the PWM duty and the IN1, IN2 and STANDBY pin levels the code
+# under test writes, and integrates a first order model of the motor speed on
+# the virtual clock:
+#
+#   - The drive is the duty cycle times the battery voltage over the rated
+#     voltage.  The steady state speed is the no-load speed scaled by the drive,
+#     less friction and load.
+#   - The speed moves towards the steady state speed with time constant tauMs.
+#   - A stopped motor does not start until the drive is above startDrive.
+#   - IN1 = IN2 = LOW (or STANDBY LOW) lets the motor coast, which slows it
+#     down with a longer time constant.  IN1 = IN2 = HIGH is a short brake,
+#     which slows it down with a shorter one.
+#
+# The battery voltage and the load can be functions of the simulated time so
+# battery sag and load steps can be scripted.  If an encoder pin is given, one
+# rising edge is generated on it for every 1/ppr of a revolution.
+#
+# The PWM frequency only matters if inductanceUs, switchNs or switchCoulombs
+# are given, which by default they are not:
+#
+#   - inductanceUs is the windings' L/R time constant.  The current ripples
+#     more at a low frequency.  The peaks help a stopped motor start, down to
+#     half of startDrive, but the ripple wastes power in the windings, drawn
+#     as extra battery current.
+#   - switchNs is the time the H-Bridge takes to switch each way, which is
+#     lost from every pulse, so a high frequency lowers the drive.
+#   - switchCoulombs is the charge lost from the battery at every switching
+#     cycle, so a high frequency draws more battery current.
+#
+# batteryAmps is the current drawn from the battery, for a simulated current
+# sensor on the battery line; see batteryCurrent().
+
+from SimClock import clock
+
+import SimHardware
+
+
+class SimMotor:
+    """First order model of a DC gear motor on a TB6612FNG channel."""
+
+    def __init__(self, gpioPWM: int, gpioIN1: int, gpioIN2: int, gpioEncoder=-1, gpioStandby=-1,
+                 noLoadRpm=200.0, ratedVolts=6.0, batteryVolts=7.4, load=0.0,
+                 tauMs=60.0, coastTauMs=250.0, brakeTauMs=15.0,
+                 friction=0.12, startDrive=0.22, ppr=20, stepUs=1000, resistance=4.0,
+                 inductanceUs=0.0, switchNs=0.0, switchCoulombs=0.0):
+        self.gpioPWM      = gpioPWM
+        self.gpioIN1      = gpioIN1
+        self.gpioIN2      = gpioIN2
+        self.gpioEncoder  = gpioEncoder
+        self.gpioStandby  = gpioStandby
+        self.noLoadRpm    = noLoadRpm
+        self.ratedVolts   = ratedVolts
+        self.batteryVolts = batteryVolts
+        self.load         = load
+        self.tauMs        = tauMs
+        self.coastTauMs   = coastTauMs
+        self.brakeTauMs   = brakeTauMs
+        self.friction     = friction
+        self.startDrive   = startDrive
+        self.ppr          = ppr
+        self.stepUs       = stepUs
+        self.resistance   = resistance
+        self.inductanceUs   = inductanceUs
+        self.switchNs       = switchNs
+        self.switchCoulombs = switchCoulombs
+
+        self.rpm       = 0.0    # Signed motor speed: positive is FORWARD
+        self.position  = 0.0    # Encoder pulses, fractional
+        self.pulses    = 0
+        self.amps      = 0.0
+        self.batteryAmps = 0.0
+        self.history   = []     # (time us, rpm, amps) when recording
+        self.recordUs  = 0
+        self.nextRecordUs = 0
+
+        self.event = clock.after(stepUs, self._step)
+
+    # Record (time us, rpm, amps) in history every everyUs microseconds, 0 to stop
+    def record(self, everyUs: int):
+        self.recordUs     = everyUs
+        self.nextRecordUs = clock.nowUs
+
+    def stop(self):
+        clock.cancel(self.event)
+
+    # Returns a value that may be a function of the simulated time
+    def _value(self, value):
+        if ( callable(value) ):
+            return value(clock.nowUs)
+        return value
+
+    def _level(self, gpio: int):
+        state = SimHardware.pins.get(gpio)
+        if ( state == None ):
+            return 0
+        return state.level
+
+    def _step(self, arg):
+        self.event = clock.after(self.stepUs, self._step)
+        dt    = self.stepUs / 1000.0
+        volts = self._value(self.batteryVolts)
+        in1   = self._level(self.gpioIN1)
+        in2   = self._level(self.gpioIN2)
+        if ( self.gpioStandby >= 0 and not self._level(self.gpioStandby) ):
+            in1 = in2 = 0
+
+        duty  = SimHardware.pwmDuty.get(self.gpioPWM, 0) / 65535.0
+        if ( in1 and in2 ):
+            mode = "brake"
+        elif ( in2 ):
+            mode = "forward"
+        elif ( in1 ):
+            mode = "backward"
+        else:
+            mode = "coast"
+
+        freq   = SimHardware.pwmFreq.get(self.gpioPWM, 0)
+        ripple = 0.0
+        if ( freq > 0 and duty > 0 ):
+            if ( self.inductanceUs > 0 ):
+                ripple = min(1.0, 1000000.0 / (4.0 * freq * self.inductanceUs))
+            duty = max(0.0, duty - 2.0 * freq * self.switchNs / 1e9)
+
+        if ( mode in ("forward", "backward") and duty > 0 ):
+            drive = duty * volts / self.ratedVolts
+            sign  = 1.0 if mode == "forward" else -1.0
+            if ( abs(self.rpm) < 1.0 and drive < self.startDrive * (1.0 - 0.5 * ripple) ):
+                target = 0.0
+            else:
+                useful = max(0.0, (drive - self.friction) / (1.0 - self.friction))
+                target = sign * self.noLoadRpm * useful * (1.0 - self._value(self.load))
+            tau = self.tauMs
+            applied = sign * duty * volts
+        else:
+            target  = 0.0
+            tau     = self.brakeTauMs if mode == "brake" else self.coastTauMs
+            applied = 0.0
+
+        self.rpm += (target - self.rpm) * min(1.0, dt / tau)
+        if ( target == 0.0 and abs(self.rpm) < 0.5 ):
+            self.rpm = 0.0
+
+        # Current: applied voltage less the back EMF, over the winding resistance.
+        # In a short brake the back EMF drives the current through the shorted
+        # windings; coasting, no current flows.
+        backEmf   = self.rpm / self.noLoadRpm * self.ratedVolts
+        if ( applied != 0.0 ):
+            self.amps = (applied - backEmf) / self.resistance
+            self.batteryAmps = (duty * abs(self.amps) * (1.0 + ripple * ripple / 3.0) +
+                                freq * self.switchCoulombs)
+        elif ( mode == "brake" ):
+            self.amps = -backEmf / self.resistance
+            self.batteryAmps = 0.0
+        else:
+            self.amps = 0.0
+            self.batteryAmps = 0.0
+
+        if ( self.gpioEncoder >= 0 ):
+            self.position += abs(self.rpm) / 60000.0 * self.ppr * dt
+            while ( self.position >= 1.0 ):
+                self.position -= 1.0
+                self.pulses   += 1
+                SimHardware.setInput(self.gpioEncoder, 1)
+                SimHardware.setInput(self.gpioEncoder, 0)
+
+        if ( self.recordUs > 0 and clock.nowUs >= self.nextRecordUs ):
+            self.history.append((clock.nowUs, self.rpm, self.amps))
+            self.nextRecordUs += self.recordUs
+
+    # End of SimMotor class
+
+
+# Returns an ADC source for SimHardware.setAdc() that reads the battery current
+# of some motors, the way a current sense amplifier on the battery line would.
+#
+# @param countsPerAmp  ADC counts, out of 65535, for one amp
+def batteryCurrent(motors, countsPerAmp: float):
+    def source(nowUs):
+        return int(sum(motor.batteryAmps for motor in motors) * countsPerAmp)
+
+    return source
@@ -0,0 +1,174 @@
+# Run the test bed program on a PC against the simulated machine module.
+#
+# The simulated modules in this directory are put ahead of everything else on
+# the import path, followed by the src directory, so the test bed program
+# imports them exactly as it imports the real modules on the Pico.
+#
+# Example, one hour of test bed time with button A pressed after 2 seconds
+# and potentiometer A set to 30000:
+#
+#   python3 sim/SimRunner.py src/TTMotorTestBed.py --seconds 3600 --press 17:2 --pot 27:30000
+
+import argparse
+import ast
+import contextlib
+import io
+import os
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(SIM_DIR), "src")
+
+# The simulated modules must come first, even if a benchmark already added the
+# sim directory, so the ones that stand in for src modules are found first
+for path in (SRC_DIR, SIM_DIR):
+    if ( path in sys.path ):
+        sys.path.remove(path)
+    sys.path.insert(0, path)
+
+import SimGc
+import SimHardware
+import SimThread
+
+from SimClock import clock, SimulationEnd
+
+
+# Output stream that charges the virtual clock for every byte written, the way
+# printing to the Pico's USB serial port takes time.  See the "usbByte" cost.
+class ChargedStream:
+    """Wrapper for stdout, or stdout.buffer, that charges for each byte written."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data):
+        SimHardware.charge("usbByte", len(data))
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    @property
+    def buffer(self):
+        return ChargedStream(self.stream.buffer)
+
+    # End of ChargedStream class
+
+
+# Read a program and replace the values of some of its top level constants.
+#
+# Only simple "name = value" assignments at the top level of the program are
+# changed, so the program itself runs unmodified apart from those values.  A
+# value may be a number, string, or a list or tuple of them.
+def loadProgram(path: str, constants=None):
+    with open(path) as source:
+        tree = ast.parse(source.read(), path)
+
+    if ( constants ):
+        found = set()
+        for node in tree.body:
+            if ( isinstance(node, ast.Assign) and len(node.targets) == 1 and
+                 isinstance(node.targets[0], ast.Name) and node.targets[0].id in constants ):
+                value = ast.parse(repr(constants[node.targets[0].id]), mode="eval").body
+                node.value = ast.copy_location(value, node.value)
+                found.add(node.targets[0].id)
+        missing = set(constants) - found
+        if ( missing ):
+            raise ValueError("Constants not found in %s: %s" % (path, ", ".join(sorted(missing))))
+
+    return compile(tree, path, "exec")
+
+
+# Run a MicroPython program until the simulated end time is reached.
+#
+# @param path       Path of the program to run
+# @param seconds    Simulated run time in seconds
+# @param setup      Optional function called after the simulation is reset and
+#                   before the program starts, used to script inputs
+# @param quiet      If True, output printed by the program is captured rather than shown
+# @param constants  Optional dictionary of top level constants to change, e.g. {"myDelta": 500}
+#
+# Returns a dictionary of run statistics.  The captured output is returned both
+# as text and as bytes, since the program may write binary telemetry frames.
+def runScript(path: str, seconds: float, setup=None, quiet=True, constants=None):
+    code = loadProgram(path, constants)
+    SimHardware.reset(seconds)
+    if ( setup != None ):
+        setup()
+
+    raw     = io.BytesIO()
+    output  = io.TextIOWrapper(raw, write_through=True)
+    namespace = { "__name__": "__main__", "__file__": path }
+    start   = time.perf_counter()
+    # _thread and gc are built into CPython, so the simulated ones are swapped in for the run
+    hostThread = sys.modules.get("_thread")
+    hostGc     = sys.modules.get("gc")
+    sys.modules["_thread"] = SimThread
+    sys.modules["gc"]      = SimGc
+    try:
+        with contextlib.redirect_stdout(ChargedStream(output if quiet else sys.stdout)):
+            exec(code, namespace)
+    except SimulationEnd:
+        pass
+    finally:
+        sys.modules["_thread"] = hostThread
+        sys.modules["gc"]      = hostGc
+        # End anything still running on the second core
+        clock.stopCores()
+    wall = time.perf_counter() - start
+
+    simSeconds = clock.nowUs / 1000000
+    return {
+        "simSeconds":  simSeconds,
+        "wallSeconds": wall,
+        "speedup":     simSeconds / wall if wall > 0 else 0.0,
+        "wakeups":     clock.wakeups,
+        "events":      clock.dispatched,
+        "callbacks":   clock.scheduled,
+        "traceLength": len(SimHardware.trace),
+        "output":      raw.getvalue().decode("utf-8", "replace"),
+        "outputBytes": raw.getvalue(),
+        "globals":     namespace,
+    }
+
+
+# Split a "GPIO:VALUE" command line argument
+def _pair(text: str):
+    gpio, value = text.split(":")
+    return int(gpio), float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a test bed program against the simulated Pico")
+    parser.add_argument("script", help="MicroPython program to run, e.g. src/TTMotorTestBed.py")
+    parser.add_argument("--seconds", type=float, default=60.0, help="simulated run time")
+    parser.add_argument("--press", action="append", default=[], metavar="GPIO:SECONDS",
+                        help="press and release the button on GPIO at the given time")
+    parser.add_argument("--bounces", type=int, default=3, help="contact bounces per button edge")
+    parser.add_argument("--pot", action="append", default=[], metavar="GPIO:VALUE",
+                        help="hold the potentiometer on GPIO at VALUE")
+    parser.add_argument("--noise", type=int, default=300, help="potentiometer noise in counts")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for bounce and noise")
+    parser.add_argument("--verbose", action="store_true", help="show the program's output")
+    args = parser.parse_args(argv)
+
+    def setup():
+        for gpio, seconds in map(_pair, args.press):
+            SimHardware.pressButton(gpio, seconds, bounces=args.bounces, seed=args.seed)
+        for gpio, value in map(_pair, args.pot):
+            SimHardware.setAdc(gpio, SimHardware.noisyPot(int(value), args.noise, seed=args.seed))
+
+    stats = runScript(args.script, args.seconds, setup=setup, quiet=not args.verbose)
+
+    print("Simulated %.1f s in %.3f s (%.0fx real time)" %
+          (stats["simSeconds"], stats["wallSeconds"], stats["speedup"]))
+    print("Wakeups: %d, events: %d, callbacks: %d" %
+          (stats["wakeups"], stats["events"], stats["callbacks"]))
+    print("Pin writes: %d, PWM duty writes: %d" %
+          (len(SimHardware.traceOf(SimHardware.TRACE_PIN)),
+           len(SimHardware.traceOf(SimHardware.TRACE_DUTY))))
+
+
+if __name__ == "__main__":
+    main()
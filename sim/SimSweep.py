@@ -0,0 +1,331 @@
+# Run the test bed program against the simulated Pico over many settings at once.
+#
+# Each point of a sweep is one set of values for the program's top level
+# constants, such as myDelta, debounceMs and potSampleMs, and for the
+# scripted inputs: the potentiometer noise and the button bounce.  The
+# program itself runs unmodified; only the constants are changed, as with
+# SimRunner.runScript().  The points are run in worker processes, one
+# simulation per process at a time, so a sweep uses every core.
+#
+# Every run gets the same scripted button presses and reports:
+#
+#   latency   time from a press to the first write to its motor's pins, in us
+#   missed    presses with no write to their motor within a second
+#   extra     direction changes beyond one per press, e.g. from a bounce that
+#             got through the debounce
+#   spurious  writes to the motor pins away from any press, which with the
+#             knobs held still are all caused by potentiometer noise
+#
+# Example, a grid of 3 x 2 x 3 points, each run with 2 seeds:
+#
+#   python3 sim/SimSweep.py --grid myDelta=500,1000,2000 --grid debounceMs=20,50 \
+#       --grid noise=100,300,1000 --seeds 2 --csv sweep.csv
+#
+# or 40 random points from ranges:
+#
+#   python3 sim/SimSweep.py --range myDelta=200:3000 --range bounces=0:8 --samples 40
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if ( SIM_DIR not in sys.path ):
+    sys.path.insert(0, SIM_DIR)
+
+import SimHardware
+import SimRunner
+
+SCRIPT = os.path.join(SimRunner.SRC_DIR, "TTMotorTestBed.py")
+
+# The scripted inputs and their defaults.  Any other name in a sweep is a top
+# level constant of the program.
+INPUTS = {
+    "noise":       300,     # Potentiometer noise, +/- counts
+    "spikeChance": 0.0,     # Share of potentiometer readings that are far off
+    "bounces":     3,       # Contact bounces on each button edge
+    "bounceMs":    5,       # Time the contacts bounce for
+    "holdMs":      150,     # Time each button is held down
+}
+
+# Button GPIO pin --> the motor's (IN1, IN2, PWM) GPIO pins
+BUTTON_PINS = { 17: (5, 6, 4), 16: (9, 10, 8) }
+POT_VALUES  = { 27: 30000, 26: 20000 }
+
+# Writes within this time of a press are caused by the press
+PRESS_WINDOW_US = 1000000
+
+METRICS = ("latencyMedian", "latencyP99", "latencyMax", "missed", "extra", "spurious", "wakeups", "wall")
+
+
+def percentile(values, fraction: float):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Returns the button presses of a run: (time us, GPIO) at random times at
+# least a second apart, the same for every point with the same seed
+def pressTimes(seconds: float, presses: int, seed: int):
+    rng  = random.Random(seed)
+    slot = (seconds - 2) / presses
+    return [(int((1 + n * slot + rng.uniform(0, slot / 2)) * 1000000), rng.choice(list(BUTTON_PINS)))
+            for n in range(presses)]
+
+
+# Returns the number of times the motors changed direction from fromUs on,
+# worked out from the writes to their IN1 and IN2 pins in the trace: IN2 high
+# alone is FORWARD, IN1 high alone is BACKWARD and anything else is STOPPED,
+# so a short brake is not a change.  This does not depend on the program's
+# output, which goes through a Logger that may drop or still hold messages.
+def directionChanges(fromUs: int):
+    levels     = {}
+    directions = {}
+    changes    = 0
+    for gpio, (in1, in2, pwm) in BUTTON_PINS.items():
+        levels[in1] = 0
+        levels[in2] = 0
+        directions[gpio] = 0
+    pinButtons = {}
+    for gpio, (in1, in2, pwm) in BUTTON_PINS.items():
+        pinButtons[in1] = gpio
+        pinButtons[in2] = gpio
+
+    for rec in SimHardware.trace:
+        if ( rec[1] != SimHardware.TRACE_PIN or rec[2] not in pinButtons ):
+            continue
+        levels[rec[2]] = rec[3]
+        gpio     = pinButtons[rec[2]]
+        in1, in2 = BUTTON_PINS[gpio][:2]
+        if ( levels[in2] and not levels[in1] ):
+            direction = 1
+        elif ( levels[in1] and not levels[in2] ):
+            direction = 2
+        else:
+            direction = 0
+        if ( direction != directions[gpio] ):
+            directions[gpio] = direction
+            if ( rec[0] >= fromUs ):
+                changes += 1
+    return changes
+
+
+# Run one point of a sweep.  This runs in a worker process.
+#
+# @param job  (index, point, seed, seconds, presses) where point is a
+#             dictionary of constant and input values
+#
+# Returns (index, point, seed, metrics)
+def runJob(job):
+    index, point, seed, seconds, presses = job
+    inputs    = dict(INPUTS)
+    constants = {}
+    for name, value in point.items():
+        if ( name in INPUTS ):
+            inputs[name] = value
+        else:
+            constants[name] = value
+    schedule = pressTimes(seconds, presses, seed)
+
+    def setup():
+        SimHardware.costs.update(SimHardware.PICO_COSTS)
+        for n, (gpio, value) in enumerate(POT_VALUES.items()):
+            SimHardware.setAdc(gpio, SimHardware.noisyPot(value, inputs["noise"], seed=seed + n,
+                                                          spikeChance=inputs["spikeChance"]))
+        rng = random.Random(seed)
+        for pressUs, gpio in schedule:
+            SimHardware.pressButton(gpio, pressUs / 1000000, holdMs=inputs["holdMs"], bounces=inputs["bounces"],
+                                    bounceMs=inputs["bounceMs"], seed=rng.random())
+
+    stats = SimRunner.runScript(SCRIPT, seconds, setup=setup, constants=constants)
+
+    # Writes to each motor's pins, skipping the start up ones before the first press
+    motorPins = {}
+    for gpio, pins in BUTTON_PINS.items():
+        for pin in pins:
+            motorPins[pin] = gpio
+    firstUs = schedule[0][0] if schedule else 0
+    writes  = [(rec[0], motorPins[rec[2]]) for rec in SimHardware.trace
+               if rec[1] in (SimHardware.TRACE_PIN, SimHardware.TRACE_DUTY) and rec[2] in motorPins and rec[0] >= firstUs]
+
+    latencies = []
+    missed    = 0
+    for pressUs, gpio in schedule:
+        after = [timeUs for timeUs, button in writes if button == gpio and timeUs >= pressUs]
+        if ( after and after[0] - pressUs < PRESS_WINDOW_US ):
+            latencies.append(after[0] - pressUs)
+        else:
+            missed += 1
+
+    toggles  = directionChanges(firstUs)
+
+    spurious = 0
+    for timeUs, button in writes:
+        caused = False
+        for pressUs, gpio in schedule:
+            if ( gpio == button and pressUs <= timeUs < pressUs + PRESS_WINDOW_US ):
+                caused = True
+                break
+        if ( not caused ):
+            spurious += 1
+
+    metrics = {
+        "latencyMedian": percentile(latencies, 0.5) if latencies else None,
+        "latencyP99":    percentile(latencies, 0.99) if latencies else None,
+        "latencyMax":    max(latencies) if latencies else None,
+        "missed":        missed,
+        "extra":         max(0, toggles - (len(schedule) - missed)),
+        "spurious":      spurious,
+        "wakeups":       stats["wakeups"] / stats["simSeconds"],
+        "wall":          stats["wallSeconds"],
+    }
+    return index, point, seed, metrics
+
+
+# Returns every point of a grid: one dictionary for each combination of values
+def gridPoints(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+# Returns count random points.  Ranges are (low, high) pairs, drawn as ints if
+# both ends are ints; grid entries are lists to choose from.
+def randomPoints(grid, ranges, count: int, seed: int):
+    rng    = random.Random(seed)
+    points = []
+    for n in range(count):
+        point = {}
+        for name, (low, high) in ranges.items():
+            if ( isinstance(low, int) and isinstance(high, int) ):
+                point[name] = rng.randint(low, high)
+            else:
+                point[name] = rng.uniform(low, high)
+        for name, values in grid.items():
+            point[name] = rng.choice(values)
+        points.append(point)
+    return points
+
+
+# Run every point with every seed in a pool of worker processes.
+#
+# @param points    List of dictionaries of constant and input values
+# @param seeds     List of seeds; each point runs once with each seed
+# @param workers   Number of worker processes, 0 for one per core
+# @param progress  Optional function called with (done, total) as runs finish
+#
+# Returns a list of (point, seed, metrics) in the order of the points and seeds
+def sweep(points, seeds, seconds=60.0, presses=40, workers=0, progress=None):
+    jobs = []
+    for point in points:
+        for seed in seeds:
+            jobs.append((len(jobs), point, seed, seconds, presses))
+    if ( workers <= 0 ):
+        workers = os.cpu_count() or 1
+
+    results = [None] * len(jobs)
+    if ( workers == 1 ):
+        finished = map(runJob, jobs)
+        pool     = None
+    else:
+        # Fresh processes, so each one imports the simulated modules itself
+        pool     = multiprocessing.get_context("spawn").Pool(workers)
+        finished = pool.imap_unordered(runJob, jobs)
+    try:
+        for done, (index, point, seed, metrics) in enumerate(finished, 1):
+            results[index] = (point, seed, metrics)
+            if ( progress != None ):
+                progress(done, len(jobs))
+    finally:
+        if ( pool != None ):
+            pool.close()
+            pool.join()
+    return results
+
+
+# Returns the text of a value for the results table
+def formatValue(value):
+    if ( value == None ):
+        return "-"
+    if ( isinstance(value, float) ):
+        return "%.3g" % value
+    return str(value)
+
+
+# Write the results as a table, or as CSV.  Each row is one run.
+def writeResults(results, stream, csv=False):
+    names = []
+    for point, seed, metrics in results:
+        for name in point:
+            if ( name not in names ):
+                names.append(name)
+    header = names + ["seed"] + list(METRICS)
+    rows   = [[formatValue(point.get(name)) for name in names] + [str(seed)] +
+              [formatValue(metrics[name]) for name in METRICS] for point, seed, metrics in results]
+    if ( csv ):
+        stream.write(",".join(header) + "\n")
+        for row in rows:
+            stream.write(",".join(row) + "\n")
+        return
+    widths = [max([len(header[n])] + [len(row[n]) for row in rows]) for n in range(len(header))]
+    stream.write("  ".join(text.rjust(width) for text, width in zip(header, widths)) + "\n")
+    for row in rows:
+        stream.write("  ".join(text.rjust(width) for text, width in zip(row, widths)) + "\n")
+
+
+# Returns a number from the command line, an int if it looks like one
+def _number(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep test bed constants and inputs in simulation")
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="values of a constant, e.g. myDelta, or of an input: " + ", ".join(INPUTS))
+    parser.add_argument("--range", action="append", default=[], metavar="NAME=LOW:HIGH",
+                        help="range to draw random values from, needs --samples")
+    parser.add_argument("--samples", type=int, default=0, help="number of random points instead of the whole grid")
+    parser.add_argument("--seeds", type=int, default=1, help="runs of each point, each with its own inputs")
+    parser.add_argument("--seconds", type=float, default=60.0, help="simulated time of each run")
+    parser.add_argument("--presses", type=int, default=40, help="button presses in each run")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes, 0 for one per core")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--csv", help="write the results to this CSV file")
+    args = parser.parse_args(argv)
+
+    grid = {}
+    for text in args.grid:
+        name, values = text.split("=")
+        grid[name] = [_number(value) for value in values.split(",")]
+    ranges = {}
+    for text in args.range:
+        name, span = text.split("=")
+        low, high = span.split(":")
+        ranges[name] = (_number(low), _number(high))
+    if ( ranges and args.samples <= 0 ):
+        parser.error("--range needs --samples")
+
+    if ( args.samples > 0 ):
+        points = randomPoints(grid, ranges, args.samples, args.seed)
+    else:
+        points = gridPoints(grid)
+    seeds = [args.seed + n for n in range(args.seeds)]
+
+    start   = time.perf_counter()
+    results = sweep(points, seeds, args.seconds, args.presses, args.workers)
+    wall    = time.perf_counter() - start
+
+    writeResults(results, sys.stdout)
+    if ( args.csv ):
+        with open(args.csv, "w") as stream:
+            writeResults(results, stream, csv=True)
+    print("%d runs of %.0f simulated seconds in %.1f s" % (len(results), args.seconds, wall))
+
+
+if __name__ == "__main__":
+    main()
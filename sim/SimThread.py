@@ -0,0 +1,82 @@
+# Simulated MicroPython _thread module for the rp2 port.
+#
+# _thread is built into CPython, so this cannot be found on the import path
+# like the other simulated modules.  SimRunner puts it in sys.modules as
+# _thread while the program runs.
+#
+# On the Pico, start_new_thread() runs the function on the second core, and
+# only one thread can be started.  Here it runs on a simulated second core on
+# the shared virtual clock.  See SimClock.
+#
+# Locks do not really block: a thread waiting for a lock is charged one
+# microsecond at a time until the lock is free, which lets the other core run.
+
+from SimClock import clock
+
+
+class LockType:
+    """Simulated _thread lock."""
+
+    def __init__(self):
+        self.held = False
+
+    def acquire(self, waitflag=1, timeout=-1):
+        if ( not self.held ):
+            self.held = True
+            return True
+        if ( not waitflag ):
+            return False
+
+        waitedUs = 0
+        while ( self.held ):
+            if ( timeout >= 0 and waitedUs >= timeout * 1000000 ):
+                return False
+            clock.charge(1)
+            waitedUs += 1
+        self.held = True
+        return True
+
+    def release(self):
+        if ( not self.held ):
+            raise RuntimeError("release unlocked lock")
+        self.held = False
+
+    def locked(self):
+        return self.held
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    # End of LockType class
+
+
+def allocate_lock():
+    return LockType()
+
+
+def start_new_thread(function, args, kwargs=None):
+    if ( clock.coreRunning() ):
+        raise OSError(16, "core1 in use")
+    if ( kwargs ):
+        clock.startCore(lambda *a: function(*a, **kwargs), tuple(args))
+    else:
+        clock.startCore(function, tuple(args))
+    return 1
+
+
+def get_ident():
+    if ( clock.current == None ):
+        return 0
+    return 1
+
+
+def stack_size(size=None):
+    return 4096
+
+
+def exit():
+    raise SystemExit()
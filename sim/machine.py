@@ -0,0 +1,292 @@
+# Simulated MicroPython machine module for running the test bed code on a PC.
+#
+# Only the parts of the rp2 port's machine module used by this project are
+# provided: Pin, PWM, ADC, Timer and the idle and sleep functions.  The state
+# of the pins lives in SimHardware and time is taken from the shared SimClock.
+
+import SimHardware
+
+from SimClock import clock
+
+
+class Pin:
+    """Simulated machine.Pin for the RP2040."""
+
+    IN         = 0
+    OUT        = 1
+    OPEN_DRAIN = 2
+    ALT        = 3
+
+    PULL_UP    = 1
+    PULL_DOWN  = 2
+
+    IRQ_FALLING = 4
+    IRQ_RISING  = 8
+
+    def __init__(self, id: int, mode=-1, pull=-1, value=None):
+        self.id    = id
+        self.state = SimHardware.pinState(id)
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        state = self.state
+        if ( mode != -1 ):
+            state.mode = mode
+        if ( pull != -1 ):
+            state.pull = pull
+            if ( state.mode == self.IN ):
+                state.level = 1 if pull == self.PULL_UP else 0
+        if ( value != None ):
+            self.value(value)
+
+    # Same format as the rp2 port before GPIO names were added, which is
+    # what the getPinID() hacks in the test bed code expect.
+    def __str__(self):
+        modes = ("IN", "OUT", "OPEN_DRAIN", "ALT")
+        if ( self.state.mode >= 0 ):
+            return "Pin(%d, mode=%s)" % (self.id, modes[self.state.mode])
+        return "Pin(%d)" % self.id
+
+    __repr__ = __str__
+
+    def value(self, x=None):
+        if ( x == None ):
+            SimHardware.charge("pinRead")
+            return self.state.level
+        x = 1 if x else 0
+        state = self.state
+        state.writes += 1
+        if ( state.mode == self.IN ):
+            return None
+        state.level = x
+        SimHardware.record(SimHardware.TRACE_PIN, self.id, x)
+        SimHardware.charge("pinWrite")
+        return None
+
+    def __call__(self, x=None):
+        return self.value(x)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def high(self):
+        self.value(1)
+
+    def low(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(1 - self.state.level)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        state = self.state
+        state.handler = handler
+        state.trigger = trigger
+        state.hard    = hard
+        state.pinObj  = self
+        return None
+
+    # End of Pin class
+
+
+class PWM:
+    """Simulated machine.PWM for the RP2040."""
+
+    def __init__(self, dest, freq=None, duty_u16=None):
+        if ( isinstance(dest, Pin) ):
+            self.gpio = dest.id
+        else:
+            self.gpio = dest
+        self.frequency = 0
+        self.duty      = 0
+        if ( freq != None ):
+            self.freq(freq)
+        if ( duty_u16 != None ):
+            self.duty_u16(duty_u16)
+
+    def __str__(self):
+        return "<PWM slice=%d channel=%d>" % (SimHardware.pwmSlice(self.gpio), self.gpio & 1)
+
+    def freq(self, value=None):
+        if ( value == None ):
+            return self.frequency
+        if ( value < 8 or value > 62500000 ):
+            raise ValueError("freq too small")
+        self.frequency = int(value)
+        # Both channels of a PWM slice run at one frequency, so the other pin
+        # of the slice changes too
+        for gpio in list(SimHardware.pwmFreq):
+            if ( gpio != self.gpio and SimHardware.pwmSlice(gpio) == SimHardware.pwmSlice(self.gpio) ):
+                SimHardware.pwmFreq[gpio] = self.frequency
+                SimHardware.record(SimHardware.TRACE_FREQ, gpio, self.frequency)
+        SimHardware.pwmFreq[self.gpio] = self.frequency
+        SimHardware.record(SimHardware.TRACE_FREQ, self.gpio, self.frequency)
+        SimHardware.charge("pwmWrite")
+
+    def duty_u16(self, value=None):
+        if ( value == None ):
+            return self.duty
+        self.duty = int(value) & 0xFFFF
+        SimHardware.pwmDuty[self.gpio] = self.duty
+        SimHardware.record(SimHardware.TRACE_DUTY, self.gpio, self.duty)
+        SimHardware.charge("pwmWrite")
+
+    def deinit(self):
+        self.duty_u16(0)
+
+    # End of PWM class
+
+
+class ADC:
+    """Simulated machine.ADC for the RP2040."""
+
+    CORE_TEMP = 4
+
+    def __init__(self, id):
+        if ( isinstance(id, Pin) ):
+            id = id.id
+        self.channel = SimHardware.adcChannel(id)
+
+    def read_u16(self):
+        SimHardware.charge("adcRead")
+        return SimHardware.readAdc(self.channel)
+
+    # End of ADC class
+
+
+class Timer:
+    """Simulated machine.Timer.  Callbacks run from the virtual clock."""
+
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.event = None
+        if ( callback != None ):
+            self.init(mode=mode, period=period, freq=freq, callback=callback)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.deinit()
+        if ( freq > 0 ):
+            self.periodUs = int(1000000 / freq)
+        elif ( period > 0 ):
+            self.periodUs = int(period * 1000)
+        else:
+            self.periodUs = 1000000
+        if ( self.periodUs < 1 ):
+            self.periodUs = 1
+        self.mode     = mode
+        self.callback = callback
+        self.dueUs    = clock.nowUs + self.periodUs
+        self.event    = clock.at(self.dueUs, self._fire)
+
+    def deinit(self):
+        clock.cancel(self.event)
+        self.event = None
+
+    def _fire(self, arg):
+        if ( self.mode == self.PERIODIC ):
+            # Keep to the original schedule rather than drifting by callback time
+            self.dueUs += self.periodUs
+            self.event = clock.at(self.dueUs, self._fire)
+        else:
+            self.event = None
+        self.callback(self)
+
+    # End of Timer class
+
+
+class _Mem32:
+    """Simulated machine.mem32.  Only the RP2040 SIO GPIO registers are provided."""
+
+    SIO_GPIO_IN      = 0xd0000004
+    SIO_GPIO_OUT     = 0xd0000010
+    SIO_GPIO_OUT_SET = 0xd0000014
+    SIO_GPIO_OUT_CLR = 0xd0000018
+    SIO_GPIO_OUT_XOR = 0xd000001c
+
+    def __getitem__(self, address: int):
+        value = 0
+        for gpio, state in SimHardware.pins.items():
+            if ( state.level and (address == self.SIO_GPIO_IN or state.mode == Pin.OUT) ):
+                value |= 1 << gpio
+        if ( address in (self.SIO_GPIO_IN, self.SIO_GPIO_OUT) ):
+            return value
+        raise ValueError("mem32 address not simulated: 0x%08x" % address)
+
+    # A register write changes all of the pins in the mask at the same time
+    def __setitem__(self, address: int, mask: int):
+        current = self[self.SIO_GPIO_OUT]
+        if ( address == self.SIO_GPIO_OUT ):
+            wanted = mask
+        elif ( address == self.SIO_GPIO_OUT_SET ):
+            wanted = current | mask
+        elif ( address == self.SIO_GPIO_OUT_CLR ):
+            wanted = current & ~mask
+        elif ( address == self.SIO_GPIO_OUT_XOR ):
+            wanted = current ^ mask
+        else:
+            raise ValueError("mem32 address not simulated: 0x%08x" % address)
+
+        for gpio, state in SimHardware.pins.items():
+            if ( state.mode != Pin.OUT ):
+                continue
+            level = (wanted >> gpio) & 1
+            if ( level != state.level ):
+                state.level = level
+                state.writes += 1
+                SimHardware.record(SimHardware.TRACE_PIN, gpio, level)
+        SimHardware.charge("pinWrite")
+
+    # End of _Mem32 class
+
+
+mem32 = _Mem32()
+
+
+# Wait for the next interrupt or timer event
+def idle():
+    clock.idle()
+
+
+# Sleep until the time runs out or an event wakes the Pico.  The time asleep is
+# added up in SimHardware so a benchmark can work out the power used.
+def lightsleep(time_ms=None):
+    startUs = clock.nowUs
+    SimHardware.sleeps += 1
+    try:
+        if ( time_ms == None ):
+            clock.idle()
+        else:
+            clock.idle(int(time_ms * 1000))
+    finally:
+        SimHardware.sleepUs += clock.nowUs - startUs
+
+
+def deepsleep(time_ms=None):
+    lightsleep(time_ms)
+
+
+def freq(hz=None):
+    if ( hz == None ):
+        return 125000000
+    return None
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    return None
+
+
+def unique_id():
+    return b"SIMPICO0"
+
+
+def reset():
+    raise SystemExit("machine.reset()")
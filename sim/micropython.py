@@ -0,0 +1,47 @@
+# Simulated MicroPython micropython module.
+#
+# const() and the code emitter decorators do nothing on the PC.  schedule()
+# queues the callback on the shared virtual clock, which runs it the next time
+# the code under test is not inside a callback.
+
+from SimClock import clock
+
+
+def const(value):
+    return value
+
+
+def alloc_emergency_exception_buf(size: int):
+    return None
+
+
+def schedule(func, arg):
+    clock.schedule(func, arg)
+
+
+def kbd_intr(chr: int):
+    return None
+
+
+def opt_level(level=None):
+    return 0
+
+
+def mem_info(verbose=False):
+    print("stack: 0 out of 0\nGC: total: 0, used: 0, free: 0")
+
+
+def heap_lock():
+    return 0
+
+
+def heap_unlock():
+    return 0
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
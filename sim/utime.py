@@ -0,0 +1,50 @@
+# Simulated MicroPython utime module driven by the shared virtual clock.
+#
+# The ticks functions wrap around the same way they do on the Pico so that
+# code which forgets to use ticks_diff() fails here too.
+
+from SimClock import clock
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX    = TICKS_PERIOD - 1
+TICKS_HALF   = TICKS_PERIOD // 2
+
+
+def ticks_us():
+    return clock.nowUs & TICKS_MAX
+
+
+def ticks_ms():
+    return (clock.nowUs // 1000) & TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks: int, delta: int):
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(ticks1: int, ticks2: int):
+    return ((ticks1 - ticks2 + TICKS_HALF) & TICKS_MAX) - TICKS_HALF
+
+
+def sleep(seconds):
+    clock.advance(int(seconds * 1000000))
+
+
+def sleep_ms(ms):
+    clock.advance(int(ms * 1000))
+
+
+def sleep_us(us):
+    clock.advance(int(us))
+
+
+def time():
+    return clock.nowUs // 1000000
+
+
+def time_ns():
+    return clock.nowUs * 1000
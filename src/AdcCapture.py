@@ -0,0 +1,114 @@
+# Class for capturing ADC samples in the background into two buffers.
+#
+# The RP2040 ADC converts the channels in turn (round robin), and a backend
+# moves the results into one of two buffers: AdcDmaBackend with DMA, without
+# the CPU, or AdcTimerBackend from a timer interrupt.  When a buffer is full
+# the backend calls blockDone() and starts on the other buffer.  The samples
+# are the 12 bit conversion results, interleaved by channel:
+#
+#   [ch0, ch1, ch0, ch1, ...]   for channels [0, 1]
+#
+# read() returns a memoryview of the newest full buffer, so a block is read
+# where it is, without copying.  The backend starts writing into that buffer
+# again once the next block is done, so the consumer has one block time to use
+# it.  valid() tells the consumer afterwards if it was fast enough.  Blocks the
+# consumer never read are counted in missed.
+#
+# All of the buffers are allocated in the constructor.  Nothing allocates
+# while capturing, so the handler can be a hard interrupt.
+#
+
+from array import array
+
+class AdcCapture:
+    """Double buffered background ADC capture with a pluggable backend."""
+
+    SHIFT = 4       # Shift a 12 bit sample left by this to get a read_u16() value
+
+    # Constructor
+    #
+    # @param channels      List of ADC channel numbers, 0..3 for GPIO 26..29, 4 for the temperature sensor
+    # @param blockSamples  Samples of each channel in one block
+    # @param backend       AdcDmaBackend or AdcTimerBackend object
+    def __init__(self, channels, blockSamples, backend):
+        if ( len(channels) < 1 or blockSamples < 1 ):
+            raise ValueError("AdcCapture Constructor: At least one channel and one sample are needed")
+
+        self.channels     = list(channels)
+        self.count        = len(self.channels)
+        self.blockSamples = blockSamples
+        self.blockSize    = blockSamples * self.count
+        self.backend      = backend
+
+        self.buffers  = (array("H", bytearray(2 * self.blockSize)), array("H", bytearray(2 * self.blockSize)))
+        self.views    = (memoryview(self.buffers[0]), memoryview(self.buffers[1]))
+        self.filling  = 0       # Buffer the backend is writing
+        self.ready    = -1      # Newest full buffer, -1 for none
+        self.sequence = 0       # Blocks done, only changed by blockDone()
+        self.readSequence = 0   # Sequence of the block last returned by read()
+        self.missed   = 0       # Blocks done that read() never returned
+
+        self.rate     = 0
+        self.handler  = None
+        self.running  = False
+
+    # Start capturing
+    #
+    # @param hz       Samples per second of each channel
+    # @param handler  Optional function called with this object when a block
+    #                 is done.  It runs in interrupt context, so it should only
+    #                 schedule the work, e.g. with micropython.schedule().
+    def start(self, hz: int, handler=None):
+        self.rate     = hz
+        self.handler  = handler
+        self.filling  = 0
+        self.ready    = -1
+        self.running  = True
+        self.backend.start(self, hz)
+
+    def stop(self):
+        self.running = False
+        self.backend.stop()
+
+    # Returns the buffer the backend should write next.  Backend only.
+    def fillBuffer(self):
+        return self.buffers[self.filling]
+
+    # Called by the backend when the buffer it was writing is full.  The backend
+    # then writes the other buffer.
+    def blockDone(self):
+        self.ready    = self.filling
+        self.filling  = 1 - self.filling
+        self.sequence += 1
+        if ( self.handler != None ):
+            self.handler(self)
+
+    # Returns a memoryview of the newest full block, or None if there is no new
+    # block since the last call.
+    def read(self):
+        sequence = self.sequence
+        if ( sequence == self.readSequence or self.ready < 0 ):
+            return None
+        self.missed      += sequence - self.readSequence - 1
+        self.readSequence = sequence
+        return self.views[self.ready]
+
+    # Returns True if the block last returned by read() has not started to be
+    # written over yet.  Check it after using the block.
+    def valid(self):
+        return self.sequence == self.readSequence
+
+    # Returns the average of one channel in a block, scaled like read_u16()
+    #
+    # @param block  Block returned by read()
+    # @param index  Position of the channel in the channels list
+    def average(self, block, index: int):
+        total = 0
+        count = self.count
+        for n in range(index, self.blockSize, count):
+            total += block[n]
+        return (total // self.blockSamples) << self.SHIFT
+
+    #
+    # End of AdcCapture class
+    #
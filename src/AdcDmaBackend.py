@@ -0,0 +1,112 @@
+# AdcCapture backend that runs the RP2040 ADC free running into DMA.
+#
+# The ADC converts the channels round robin at a fixed rate and puts each
+# result in its FIFO.  Two DMA channels, paced by the ADC, take turns moving the
+# results into the two buffers of AdcCapture, each one starting the other when
+# it is done.  The CPU only runs once per block, in the DMA interrupt, to point
+# the finished DMA channel back at the start of its buffer and tell AdcCapture.
+#
+# The ADC clock is 48MHz and a conversion takes 96 clocks, so the most the ADC
+# can do is 500000 samples per second shared between the channels.
+#
+# Needs the rp2.DMA class, MicroPython 1.21 or later.
+#
+
+import rp2
+
+from machine import ADC, mem32
+
+class AdcDmaBackend:
+    """Free running ADC and DMA backend for AdcCapture."""
+
+    ADC_BASE     = 0x4004c000
+    ADC_CS       = ADC_BASE + 0x00
+    ADC_FCS      = ADC_BASE + 0x08
+    ADC_FIFO     = ADC_BASE + 0x0c
+    ADC_DIV      = ADC_BASE + 0x10
+
+    CS_EN           = 1 << 0
+    CS_START_MANY   = 1 << 3
+    CS_AINSEL_SHIFT = 12
+    CS_RROBIN_SHIFT = 16
+
+    FCS_EN          = 1 << 0
+    FCS_DREQ_EN     = 1 << 3
+    FCS_THRESH      = 1 << 24   # DREQ when at least one result is in the FIFO
+
+    DREQ_ADC     = 36
+    ADC_CLOCK    = 48000000
+    MIN_DIV      = 96           # Clocks per conversion
+
+    def __init__(self):
+        self.capture  = None
+        self.dma      = None
+        self.irqHandler = self.dmaDone    # Bound once so the interrupt does not allocate
+
+    # Start the DMA channels, then the ADC
+    def start(self, capture, hz: int):
+        self.capture = capture
+        for channel in capture.channels:
+            ADC(channel)                  # Sets up the GPIO pin for the ADC
+
+        # Round robin goes up through the channels from the first one
+        ordered = sorted(capture.channels)
+        first   = ordered.index(capture.channels[0])
+        if ( ordered[first:] + ordered[:first] != capture.channels ):
+            raise ValueError("AdcDmaBackend: Channels must be in round robin order, e.g. [1, 2, 0]")
+
+        clocks = self.ADC_CLOCK // (hz * capture.count)
+        if ( clocks < self.MIN_DIV ):
+            raise ValueError("AdcDmaBackend: The ADC can not sample that fast")
+
+        mem32[self.ADC_CS]  = 0
+        mem32[self.ADC_FCS] = 0
+        self.drainFifo()
+
+        self.dma = (rp2.DMA(), rp2.DMA())
+        for n in range(2):
+            other = self.dma[1 - n]
+            ctrl  = self.dma[n].pack_ctrl(size=1, inc_read=False, inc_write=True,
+                                          treq_sel=self.DREQ_ADC, chain_to=other.channel)
+            self.dma[n].irq(handler=self.irqHandler, hard=True)
+            self.dma[n].config(read=self.ADC_FIFO, write=capture.buffers[n],
+                               count=capture.blockSize, ctrl=ctrl, trigger=(n == 0))
+
+        # DIV is 16.8 fixed point, and one conversion every 1 + DIV clocks
+        mem32[self.ADC_DIV] = (clocks - 1) << 8
+        mem32[self.ADC_FCS] = self.FCS_EN | self.FCS_DREQ_EN | self.FCS_THRESH
+        mask = 0
+        for channel in capture.channels:
+            mask |= 1 << channel
+        mem32[self.ADC_CS]  = (self.CS_EN | self.CS_START_MANY |
+                               (capture.channels[0] << self.CS_AINSEL_SHIFT) |
+                               (mask << self.CS_RROBIN_SHIFT))
+
+    def stop(self):
+        mem32[self.ADC_CS]  = self.CS_EN
+        mem32[self.ADC_FCS] = 0
+        if ( self.dma != None ):
+            for dma in self.dma:
+                dma.active(0)
+                dma.close()
+            self.dma = None
+        self.drainFifo()
+
+    # Empty the ADC FIFO so a new capture starts with the first channel
+    def drainFifo(self):
+        for n in range(8):
+            mem32[self.ADC_FIFO]
+
+    # DMA Interrupt Handler: one buffer is full and the other DMA channel has
+    # already started on the other buffer.
+    def dmaDone(self, dma):
+        capture = self.capture
+        n = capture.filling
+        # Rewind without starting, the other channel starts it when it is done
+        self.dma[n].write = capture.buffers[n]
+        self.dma[n].count = capture.blockSize
+        capture.blockDone()
+
+    #
+    # End of AdcDmaBackend class
+    #
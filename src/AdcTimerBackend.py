@@ -0,0 +1,48 @@
+# AdcCapture backend that reads the ADC from a timer interrupt.
+#
+# Each timer tick reads every channel once, with read_u16(), into the buffer
+# AdcCapture is filling.  It works on any MicroPython board, but the CPU does
+# every conversion, so it is limited to a few thousand samples per second.
+# See AdcDmaBackend for the RP2040 DMA backend.
+#
+
+from machine import ADC, Timer
+
+class AdcTimerBackend:
+    """Timer interrupt backend for AdcCapture."""
+
+    def __init__(self):
+        self.capture  = None
+        self.adcs     = []
+        self.index    = 0
+        self.buffer   = None
+        self.timer    = Timer()
+        self.tickHandler = self.tick    # Bound once so the timer does not allocate
+
+    def start(self, capture, hz: int):
+        self.capture = capture
+        self.adcs    = [ADC(channel) for channel in capture.channels]
+        self.index   = 0
+        self.buffer  = capture.fillBuffer()
+        self.timer.init(mode=Timer.PERIODIC, freq=hz, callback=self.tickHandler)
+
+    def stop(self):
+        self.timer.deinit()
+
+    # Timer Interrupt Handler: read every channel once
+    def tick(self, timer):
+        buffer = self.buffer
+        index  = self.index
+        for adc in self.adcs:
+            buffer[index] = adc.read_u16() >> 4
+            index += 1
+
+        if ( index >= self.capture.blockSize ):
+            index = 0
+            self.capture.blockDone()
+            self.buffer = self.capture.fillBuffer()
+        self.index = index
+
+    #
+    # End of AdcTimerBackend class
+    #
@@ -5,23 +5,63 @@
 # class contains more data fields and the objects are stored
 # in a dictionary or keyed list.
 #
+# The class also debounces its button without blocking.  The interrupt
+# handler only timestamps the edge and updates the button state, then a
+# one-shot timer locks out the bounce edges that follow.  When the timer
+# runs out, the pin is read once to confirm the button settled where the
+# first edge said it would.
 #
+
+from machine import Pin, Timer
+
+import micropython
+import utime
+
+from micropython import const
+
+# Set to 1 to compile in the latency probes.  See LatencyProbe.py.
+PROBES = const(0)
+
+# Button levels
+_PIN_LOW  = const(0)
+_PIN_HIGH = const(1)
+
 class ButtonInfo:
 
-    pinLow  = 0
-    pinHigh = 1
+    pinLow  = _PIN_LOW
+    pinHigh = _PIN_HIGH
 
     def __init__(self, pinID):
         self.id = pinID
         self.check     = False
         self.busy      = False
 
+        # Debounce state, set up by attach()
+        self.pin        = None
+        self.action     = None
+        self.debounceMs = 50
+        self.level      = _PIN_LOW
+        self.locked     = False
+        self.edgeTicks  = 0
+        self.edges      = 0
+        self.timer      = None
+
+        # Bound once here so the interrupt handlers do not allocate a bound
+        # method object every time they run.
+        self.edgeHandler    = self.buttonEdge
+        self.lockoutHandler = self.lockoutEnd
+
+        if ( PROBES ):
+            from LatencyProbe import probe
+            self.isrProbe   = probe("button isr")
+            self.pressProbe = probe("button to motor")
+
     def pinID(self):
         return self.id
 
     def isBusy(self):
         return self.busy
-    
+
     def setBusy(self, flag=True):
         self.busy = flag
 
@@ -31,4 +71,77 @@ class ButtonInfo:
     def setChange(self, newValue: bool):
         self.check = newValue
 
-    
+    # Attach this object to the button's Pin and start handling its interrupts.
+    #
+    # @param pin         The Pin object the button is connected to
+    # @param action      Function scheduled with the button ID when the button is pressed,
+    #                    or None if the Change flag is polled instead
+    # @param debounceMs  Time after an edge during which further edges are treated as bounce
+    def attach(self, pin: Pin, action=None, debounceMs=50):
+        self.pin        = pin
+        self.action     = action
+        self.debounceMs = debounceMs
+        self.level      = pin.value()
+        self.timer      = Timer()
+        pin.irq(handler=self.edgeHandler, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, hard=True)
+
+    # Interrupt Handler for both edges of the button signal.
+    #
+    # The first edge after the button has been stable is taken as the button
+    # changing state: a rising signal from LOW is a press and a falling signal
+    # from HIGH is a release.  Edges while the lockout timer is running are bounce
+    # and are only counted.
+    def buttonEdge(self, pin: Pin):
+        if ( PROBES ):
+            self.isrProbe.start()
+        self.edgeTicks = utime.ticks_us()
+        self.edges += 1
+        if ( not self.locked ):
+            self.locked = True
+            self.level  = _PIN_HIGH - self.level
+            self.levelChanged()
+            self.timer.init(mode=Timer.ONE_SHOT, period=self.debounceMs, callback=self.lockoutHandler)
+        if ( PROBES ):
+            self.isrProbe.stop()
+
+    # Timer Handler for the end of the bounce lockout.
+    #
+    # If the pin does not read the level the first edge reported, the button
+    # changed again during the lockout (a very short press or release), so that
+    # change is processed and the lockout starts over.
+    def lockoutEnd(self, timer):
+        value = self.pin.value()
+        if ( value != self.level ):
+            self.level = value
+            self.levelChanged()
+            self.timer.init(mode=Timer.ONE_SHOT, period=self.debounceMs, callback=self.lockoutHandler)
+        else:
+            self.locked = False
+
+    # Update the Busy and Change flags for a new, debounced, button level.
+    #
+    # If the button is HIGH, the button has been pressed.  If this is the first
+    # occurance for a single button push, the Change flag is set to True as well
+    # as the Busy flag, and the action is scheduled.
+    #
+    # If the button is LOW, the button has been released.  The Busy flag is cleared
+    # and the next press will be considered the first event for that button push.
+    def levelChanged(self):
+        if ( self.level > 0 ):
+            if ( not self.busy ):
+                if ( PROBES ):
+                    # Stopped by the first write to a motor
+                    self.pressProbe.startOnce()
+                self.check = True
+                self.busy  = True
+                if ( self.action != None ):
+                    try:
+                        micropython.schedule(self.action, self.id)
+                    except RuntimeError:
+                        # Queue full.  The Change flag stays set and is seen by the
+                        # next action that runs.
+                        pass
+        else:
+            self.busy = False
+
+
@@ -0,0 +1,307 @@
+# Class for controlling the motors remotely with binary command frames sent
+# over the USB serial port.
+#
+# A command frame from the host is:
+#
+#   0xA5 0xC3  length  sequence  payload...  crc
+#
+# length is the number of payload bytes, at most 255, and crc is the CRC-8
+# (polynomial 0x07) of the length, sequence and payload bytes.  The payload
+# holds one or more commands, one after the other, each an opcode byte then its
+# arguments.  Multi byte values are little endian.
+#
+#   CMD_SPEED      motor(1) speed(3)    signed speed: positive FORWARD, negative BACKWARD, 0 STOPPED
+#   CMD_DIRECTION  motor(1) direction(1) 0 STOPPED, 1 FORWARD, 2 BACKWARD, keeping the speed
+#   CMD_SPEEDS     count(1) speed(3)... signed speeds of motors 0 to count - 1
+#   CMD_STOP                            stop every motor
+#   CMD_PROFILE    action(1)            0 stop, 1 start, 2 start and loop the test profile
+#   CMD_QUERY                           add the state of every motor to the reply
+#   CMD_PING                            do nothing, for measuring the round trip
+#
+# Speeds are 3 bytes so they stay small ints on the Pico.  Every frame gets one
+# reply frame, in the same format with 0xA5 0xC4 and the same sequence:
+#
+#   status(1)  done(1)  [direction(1) duty(2) speed(2) rpm(2)] for each motor if queried
+#
+# status is STATUS_OK, or the error that stopped the frame, and done is the
+# number of commands carried out.  Frames with a bad CRC get no reply, so the
+# host times out and sends them again.  The replies have different sync bytes
+# to the telemetry frames, so both can share the serial port.
+#
+# feed() runs the parser on bytes as they arrive, a byte at a time, into a
+# preallocated buffer.  Parsing and running the commands does not allocate.
+# The host side is host/CommandClient.py.
+#
+
+# Returns the CRC-8 lookup table for polynomial 0x07
+def crc8Table():
+    table = bytearray(256)
+    for n in range(256):
+        crc = n
+        for bit in range(8):
+            if ( crc & 0x80 ):
+                crc = ((crc << 1) ^ 0x07) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+        table[n] = crc
+    return table
+
+CRC8_TABLE = crc8Table()
+
+class CommandProtocol:
+    """Parser and dispatcher for binary motor command frames."""
+
+    SYNC1         = 0xA5
+    SYNC_COMMAND  = 0xC3
+    SYNC_REPLY    = 0xC4
+    MAX_PAYLOAD   = 255
+
+    CMD_SPEED     = 0x01
+    CMD_DIRECTION = 0x02
+    CMD_SPEEDS    = 0x03
+    CMD_STOP      = 0x04
+    CMD_PROFILE   = 0x05
+    CMD_QUERY     = 0x06
+    CMD_PING      = 0x07
+
+    STATUS_OK         = 0
+    STATUS_UNKNOWN    = 1   # Unknown opcode
+    STATUS_BAD_MOTOR  = 2   # Motor number or direction out of range
+    STATUS_TRUNCATED  = 3   # Command runs past the end of the payload
+    STATUS_NO_PROFILE = 4   # No profile player
+
+    # Parser states
+    WAIT_SYNC1    = 0
+    WAIT_SYNC2    = 1
+    WAIT_LENGTH   = 2
+    WAIT_SEQUENCE = 3
+    WAIT_PAYLOAD  = 4
+    WAIT_CRC      = 5
+
+    CRC_TABLE     = CRC8_TABLE
+
+    # Constructor
+    #
+    # @param motors   List of TTMotor objects, numbered by their place in the list
+    # @param stream   Object with a write() method that takes bytes, for the replies
+    # @param player   Optional ProfilePlayer object for CMD_PROFILE
+    # @param changed  Optional function called after a frame that changed a motor,
+    #                 e.g. to start the ramp timer or write batched pins
+    def __init__(self, motors, stream, player=None, changed=None):
+        self.motors  = list(motors)
+        self.stream  = stream
+        self.player  = player
+        self.changed = changed
+
+        self.payload = bytearray(self.MAX_PAYLOAD)
+        self.reply   = bytearray(6 + 2 + 7 * len(self.motors))
+        self.replyView = memoryview(self.reply)
+
+        self.state    = self.WAIT_SYNC1
+        self.length   = 0
+        self.sequence = 0
+        self.index    = 0
+        self.crc      = 0
+
+        self.frames    = 0      # Good frames
+        self.badFrames = 0      # Frames with a bad CRC
+        self.commands  = 0      # Commands carried out
+
+        self.poller  = None
+        self.input   = None
+        self.byte    = bytearray(1)
+
+    # Read from a stream that select.poll() works on, e.g. sys.stdin.buffer.
+    #
+    # On the Pico, turn off Ctrl-C with micropython.kbd_intr(-1) first, or a
+    # 0x03 byte in a frame raises KeyboardInterrupt.
+    def open(self, stream):
+        import select
+
+        self.input  = stream
+        self.poller = select.poll()
+        self.poller.register(stream, select.POLLIN)
+
+    # Parse every byte waiting on the input stream.  Called from the main loop.
+    def service(self):
+        byte  = self.byte
+        feed  = self.feedByte
+        while ( True ):
+            ready = False
+            # ipoll() does not allocate a list like poll() does
+            for event in self.poller.ipoll(0):
+                ready = True
+            if ( not ready ):
+                return
+            self.input.readinto(byte)
+            feed(byte[0])
+
+    # Parse some received bytes
+    #
+    # @param data   bytes, bytearray or memoryview
+    # @param count  Number of bytes of data to use, -1 for all of them
+    def feed(self, data, count=-1):
+        if ( count < 0 ):
+            count = len(data)
+        feed = self.feedByte
+        for n in range(count):
+            feed(data[n])
+
+    # Parse one received byte
+    def feedByte(self, byte: int):
+        state = self.state
+        if ( state == self.WAIT_PAYLOAD ):
+            self.payload[self.index] = byte
+            self.index += 1
+            self.crc = self.CRC_TABLE[self.crc ^ byte]
+            if ( self.index >= self.length ):
+                self.state = self.WAIT_CRC
+        elif ( state == self.WAIT_SYNC1 ):
+            if ( byte == self.SYNC1 ):
+                self.state = self.WAIT_SYNC2
+        elif ( state == self.WAIT_SYNC2 ):
+            if ( byte == self.SYNC_COMMAND ):
+                self.state = self.WAIT_LENGTH
+            elif ( byte != self.SYNC1 ):
+                self.state = self.WAIT_SYNC1
+        elif ( state == self.WAIT_LENGTH ):
+            self.length = byte
+            self.crc    = self.CRC_TABLE[byte]
+            self.state  = self.WAIT_SEQUENCE
+        elif ( state == self.WAIT_SEQUENCE ):
+            self.sequence = byte
+            self.crc      = self.CRC_TABLE[self.crc ^ byte]
+            self.index    = 0
+            self.state    = self.WAIT_PAYLOAD if self.length > 0 else self.WAIT_CRC
+        else:
+            self.state = self.WAIT_SYNC1
+            if ( byte == self.crc ):
+                self.frames += 1
+                self.execute()
+            else:
+                self.badFrames += 1
+
+    # Returns the signed 3 byte value at offset in the payload
+    def int24(self, offset: int):
+        payload = self.payload
+        value = payload[offset] | (payload[offset + 1] << 8) | (payload[offset + 2] << 16)
+        if ( value & 0x800000 ):
+            value -= 0x1000000
+        return value
+
+    # Carry out the commands in the payload and send the reply
+    def execute(self):
+        payload = self.payload
+        length  = self.length
+        motors  = self.motors
+        count   = len(motors)
+        index   = 0
+        done    = 0
+        status  = self.STATUS_OK
+        changed = False
+        query   = False
+
+        while ( index < length ):
+            opcode = payload[index]
+            if ( opcode == self.CMD_SPEED ):
+                if ( index + 5 > length ):
+                    status = self.STATUS_TRUNCATED
+                    break
+                motor = payload[index + 1]
+                if ( motor >= count ):
+                    status = self.STATUS_BAD_MOTOR
+                    break
+                motors[motor].setSpeed(self.int24(index + 2))
+                changed = True
+                index  += 5
+            elif ( opcode == self.CMD_DIRECTION ):
+                if ( index + 3 > length ):
+                    status = self.STATUS_TRUNCATED
+                    break
+                motor     = payload[index + 1]
+                direction = payload[index + 2]
+                if ( motor >= count or direction > 2 ):
+                    status = self.STATUS_BAD_MOTOR
+                    break
+                motors[motor].setDirection(direction)
+                changed = True
+                index  += 3
+            elif ( opcode == self.CMD_SPEEDS ):
+                if ( index + 2 > length or index + 2 + 3 * payload[index + 1] > length ):
+                    status = self.STATUS_TRUNCATED
+                    break
+                speeds = payload[index + 1]
+                if ( speeds > count ):
+                    status = self.STATUS_BAD_MOTOR
+                    break
+                for n in range(speeds):
+                    motors[n].setSpeed(self.int24(index + 2 + 3 * n))
+                changed = True
+                index  += 2 + 3 * speeds
+            elif ( opcode == self.CMD_STOP ):
+                for motor in motors:
+                    motor.setSpeed(0)
+                changed = True
+                index  += 1
+            elif ( opcode == self.CMD_PROFILE ):
+                if ( index + 2 > length ):
+                    status = self.STATUS_TRUNCATED
+                    break
+                if ( self.player == None ):
+                    status = self.STATUS_NO_PROFILE
+                    break
+                action = payload[index + 1]
+                if ( action == 0 ):
+                    self.player.stop()
+                else:
+                    self.player.start(loop=(action == 2))
+                index += 2
+            elif ( opcode == self.CMD_QUERY ):
+                query  = True
+                index += 1
+            elif ( opcode == self.CMD_PING ):
+                index += 1
+            else:
+                status = self.STATUS_UNKNOWN
+                break
+            done += 1
+
+        self.commands += done
+        if ( changed and self.changed != None ):
+            self.changed()
+        self.sendReply(status, done, query)
+
+    # Build the reply frame in the preallocated buffer and write it
+    def sendReply(self, status: int, done: int, query: bool):
+        reply = self.reply
+        reply[0] = self.SYNC1
+        reply[1] = self.SYNC_REPLY
+        reply[3] = self.sequence
+        reply[4] = status
+        reply[5] = done
+        offset   = 6
+        if ( query ):
+            for motor in self.motors:
+                duty  = motor.dutyValue
+                speed = motor.motorSpeed
+                rpm   = motor.rpm() & 0xFFFF
+                reply[offset]     = motor.currentDirection
+                reply[offset + 1] = duty & 0xFF
+                reply[offset + 2] = duty >> 8
+                reply[offset + 3] = speed & 0xFF
+                reply[offset + 4] = speed >> 8
+                reply[offset + 5] = rpm & 0xFF
+                reply[offset + 6] = rpm >> 8
+                offset += 7
+        reply[2] = offset - 4
+
+        table = self.CRC_TABLE
+        crc   = 0
+        for n in range(2, offset):
+            crc = table[crc ^ reply[n]]
+        reply[offset] = crc
+        self.stream.write(self.replyView[:offset + 1])
+
+    #
+    # End of CommandProtocol class
+    #
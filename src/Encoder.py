@@ -0,0 +1,101 @@
+# Class for counting the pulses of a motor speed encoder and estimating the RPM.
+#
+# The encoder is a slotted disk and an optical sensor, or a hall sensor, that
+# gives pulsesPerRev rising edges per revolution of the wheel.  A hard
+# interrupt handler counts the edges and remembers the time of the last one.
+#
+# update() is called at the control rate.  The RPM is worked out from the time
+# between the first and last pulse seen since the previous update, which is
+# much finer than counting pulses per update at low speed.  If no pulse arrives,
+# the RPM can be no more than one pulse in the time since the last pulse, so the
+# estimate falls towards zero, and it is zero after timeoutMs.
+#
+
+from machine import Pin
+
+import utime
+
+class Encoder:
+    """Pulse counter and RPM estimator for one motor encoder."""
+
+    # Pulse counts wrap here so they stay small ints and never allocate
+    COUNT_MASK = 0x3FFFFFFF
+
+    # Constructor
+    #
+    # @param gpio          The GPIO Pin Number the encoder output is connected to
+    # @param pulsesPerRev  Rising edges per revolution of the wheel
+    # @param timeoutMs     With no pulses for this long the RPM is taken to be 0
+    # @param pull          Pin pull, e.g. Pin.PULL_UP for open collector sensors
+    def __init__(self, gpio: int, pulsesPerRev=20, timeoutMs=500, pull=-1):
+        self.gpio         = gpio
+        self.pulsesPerRev = pulsesPerRev
+        self.timeoutUs    = timeoutMs * 1000
+
+        # RPM = rpmFactor / (microseconds per pulse)
+        self.rpmFactor    = 60000000 // pulsesPerRev
+
+        self.count        = 0
+        self.pulseTicks   = utime.ticks_us()
+        self.lastCount    = 0
+        self.lastTicks    = self.pulseTicks
+        self.rpmValue     = 0
+        self.movedCount   = 0
+
+        self.pin          = Pin(gpio, mode=Pin.IN, pull=pull)
+        self.pulseHandler = self.pulse      # Bound once so the interrupt does not allocate
+        self.pin.irq(handler=self.pulseHandler, trigger=Pin.IRQ_RISING, hard=True)
+
+    # Interrupt Handler: count one pulse
+    def pulse(self, pin):
+        self.pulseTicks = utime.ticks_us()
+        self.count      = (self.count + 1) & self.COUNT_MASK
+
+    # Returns the total pulse count, wrapping at COUNT_MASK
+    def pulses(self):
+        return self.count
+
+    # Returns the RPM worked out by the last update()
+    def rpm(self):
+        return self.rpmValue
+
+    # Returns True if at least minPulses pulses have arrived since the last call.
+    # At very low speeds this sees the wheel turning well before update() can
+    # work out an RPM.
+    def moved(self, minPulses=1):
+        count = self.count
+        moved = ((count - self.movedCount) & self.COUNT_MASK) >= minPulses
+        self.movedCount = count
+        return moved
+
+    # Work out the RPM from the pulses since the last update.  Called at the control rate.
+    #
+    # Returns the RPM.
+    def update(self):
+        # Read the count and time together; the interrupt may change them at any time
+        count      = self.count
+        pulseTicks = self.pulseTicks
+        pulses     = (count - self.lastCount) & self.COUNT_MASK
+
+        if ( pulses > 0 ):
+            spanUs = utime.ticks_diff(pulseTicks, self.lastTicks)
+            if ( spanUs > 0 ):
+                periodUs = spanUs // pulses
+                if ( periodUs > 0 ):
+                    self.rpmValue = self.rpmFactor // periodUs
+            self.lastCount = count
+            self.lastTicks = pulseTicks
+        else:
+            sinceUs = utime.ticks_diff(utime.ticks_us(), self.lastTicks)
+            if ( sinceUs >= self.timeoutUs ):
+                self.rpmValue = 0
+            elif ( sinceUs > 0 ):
+                limit = self.rpmFactor // sinceUs
+                if ( limit < self.rpmValue ):
+                    self.rpmValue = limit
+
+        return self.rpmValue
+
+    #
+    # End of Encoder class
+    #
@@ -0,0 +1,153 @@
+# Class for finding the best PWM frequency of a motor.
+#
+# The right PWM frequency for a TT motor is a trade off.  A low frequency gives
+# the most torque at low speed, but whines and wastes power in the windings
+# on the current ripple.  A high frequency is quiet, but wastes more in the
+# H-Bridge switching and takes a little off every pulse.  Where the balance
+# lies differs from one lot of motors to the next.
+#
+# run() steps a motor through a list of frequencies.  At each frequency the
+# motor is stopped for restMs, then driven FORWARD at each of a list of duties.
+# Each duty is given settleMs to settle and then held for holdMs while the
+# sensors are read every sampleMs.  The sensors are functions that are passed
+# the motor and return a reading, so they can be anything:
+#
+#   speedSensor    RPM, e.g. from the motor's encoder
+#   currentSensor  Milliamps, e.g. from a current sense amplifier on an ADC pin
+#
+# Each frequency is scored over all of its duties: the RPM per amp with both
+# sensors, the RPM with only a speed sensor, and the least current with only a
+# current sensor.  The best frequency is the highest one scoring within
+# tolerance percent of the top score, as a higher frequency whines less.
+#
+# Like MotorCalibration, this drives the motor itself and sleeps, so it is run
+# at start up before the timers are started.
+#
+
+import utime
+
+class FrequencySweep:
+    """Steps a motor through PWM frequencies and duties and finds its best frequency."""
+
+    # Constructor
+    #
+    # @param motorControl   The MotorControl the motors belong to
+    # @param freqs          Frequencies to try, in Hz
+    # @param duties         Duties to drive the motor at, at each frequency
+    # @param speedSensor    Function of the motor that returns its RPM, or None
+    # @param currentSensor  Function of the motor that returns its current in mA, or None
+    # @param settleMs       Time given to each duty before the sensors are read
+    # @param holdMs         Time the sensors are read for at each duty
+    # @param sampleMs       Time between sensor readings
+    # @param restMs         Time the motor is stopped before each frequency, so
+    #                       the lowest duty always starts it from rest
+    # @param tolerance      Percent of the top score within which the highest
+    #                       frequency is chosen
+    def __init__(self, motorControl, freqs, duties, speedSensor=None, currentSensor=None,
+                 settleMs=300, holdMs=500, sampleMs=20, restMs=1000, tolerance=2):
+        if ( speedSensor == None and currentSensor == None ):
+            raise ValueError("FrequencySweep Constructor: A speed or current sensor is needed")
+        self.motorControl  = motorControl
+        self.freqs         = freqs
+        self.duties        = duties
+        self.speedSensor   = speedSensor
+        self.currentSensor = currentSensor
+        self.settleMs      = settleMs
+        self.holdMs        = holdMs
+        self.sampleMs      = sampleMs
+        self.restMs        = restMs
+        self.tolerance     = tolerance
+
+        # GPIO PWM Pin Number --> list of (freq, duty, rpm, mA) measured.  A
+        # reading without a sensor is 0.
+        self.results = {}
+
+    # Returns the time one run() takes, in milliseconds
+    def runMs(self):
+        perFreq = self.restMs + len(self.duties) * (self.settleMs + self.holdMs)
+        return len(self.freqs) * perFreq
+
+    # Sweep one motor and find its best frequency.
+    #
+    # The frequency is set with MotorControl.setFrequency(), so a motor sharing
+    # its PWM slice with another motor changes that one's frequency too.  The
+    # other motors should be stopped.  The frequency is put back at the end,
+    # and the motor is stopped.
+    #
+    # Returns the best frequency.  Raises ValueError if a frequency cannot be set.
+    def run(self, motor):
+        original = motor.frequency()
+        rows     = []
+        try:
+            for freq in self.freqs:
+                self.motorControl.setFrequency(freq, motor.gpioPWM, shared=True)
+                self.drive(motor, motor.STOPPED, 0)
+                utime.sleep_ms(self.restMs)
+                for duty in self.duties:
+                    self.drive(motor, motor.FORWARD, duty)
+                    utime.sleep_ms(self.settleMs)
+                    rpm, mA = self.measure(motor)
+                    rows.append((freq, duty, rpm, mA))
+        finally:
+            self.drive(motor, motor.STOPPED, 0)
+            self.motorControl.setFrequency(original, motor.gpioPWM, shared=True)
+
+        self.results[motor.gpioPWM] = rows
+        return self.best(motor.gpioPWM)
+
+    # Read the sensors every sampleMs for holdMs.
+    #
+    # Returns the mean (rpm, mA), 0 for a missing sensor.
+    def measure(self, motor):
+        rpm     = 0
+        mA      = 0
+        count   = 0
+        startTicks = utime.ticks_ms()
+        while ( utime.ticks_diff(utime.ticks_ms(), startTicks) < self.holdMs ):
+            utime.sleep_ms(self.sampleMs)
+            if ( self.speedSensor != None ):
+                rpm += self.speedSensor(motor)
+            if ( self.currentSensor != None ):
+                mA += self.currentSensor(motor)
+            count += 1
+        if ( count == 0 ):
+            return 0, 0
+        return rpm // count, mA // count
+
+    # Returns a list of (freq, score) for a motor that has been swept, higher
+    # scores being better.  See the top of this file.
+    def scores(self, gpioPWM: int):
+        totals = {}
+        for freq, duty, rpm, mA in self.results[gpioPWM]:
+            total = totals.get(freq, (0, 0))
+            totals[freq] = (total[0] + rpm, total[1] + mA)
+
+        scores = []
+        for freq in self.freqs:
+            rpm, mA = totals[freq]
+            if ( self.speedSensor != None and self.currentSensor != None ):
+                score = rpm * 1000 // mA if mA > 0 else 0
+            elif ( self.speedSensor != None ):
+                score = rpm
+            else:
+                score = -mA
+            scores.append((freq, score))
+        return scores
+
+    # Returns the best frequency for a motor that has been swept
+    def best(self, gpioPWM: int):
+        scores = self.scores(gpioPWM)
+        top    = max(score for freq, score in scores)
+        margin = abs(top) * self.tolerance // 100
+        return max(freq for freq, score in scores if score >= top - margin)
+
+    # Write a direction and duty straight to a motor, without ramping
+    def drive(self, motor, direction, duty):
+        motor.writeOutput(direction, duty)
+        if ( self.motorControl.batched ):
+            self.motorControl.writePins()
+        self.motorControl.updateStandby()
+
+    #
+    # End of FrequencySweep class
+    #
@@ -0,0 +1,152 @@
+# Class for saving power while the test bed is not being used.
+#
+# Even with both motors stopped, the timers keep sampling the potentiometers
+# and the H-Bridge module stays on.  The IdleManager notices when every motor
+# has been stopped and no button has been pressed or knob turned for idleMs.
+# It then puts the TB6612FNG in standby, stops the timers with the sleep
+# handler, and puts the Pico in lightsleep.
+#
+# Two things wake it up again:
+#
+#   - A button edge.  The button's Pin IRQ wakes the Pico straight away, and
+#     the button's action calls touch() once the press has been debounced.
+#   - A knob being turned.  The ADC does not run in lightsleep, so the Pico
+#     wakes every pollMs, reads each potentiometer once and goes back to sleep
+#     unless one has moved more than potDelta from its published value.
+#
+# So a button wakes the test bed within a debounce, and a knob within pollMs
+# plus one reading.  On the way out the H-Bridge is turned back on, unless
+# the STOP_STANDBY stop mode still wants it off, the filters are restarted so
+# they do not hold readings from before the sleep, and the wake handler
+# restarts the timers.
+#
+# The USB serial port is not serviced while the Pico sleeps, so a terminal
+# may lose its connection.  Anything else that should wake the test bed,
+# such as a remote command, must call touch().
+#
+
+from machine import lightsleep
+
+import utime
+
+class IdleManager:
+    """Standby and lightsleep for the test bed while the motors are stopped."""
+
+    # Why the last sleep ended
+    WAKE_NONE   = 0
+    WAKE_BUTTON = 1
+    WAKE_POT    = 2
+
+    # Constructor
+    #
+    # @param motorControl  The MotorControl object of the motors to watch
+    # @param potFilters    List of the PotFilter objects of the potentiometers
+    # @param idleMs        Time with every motor stopped and no input before sleeping
+    # @param pollMs        Time between potentiometer checks while asleep
+    # @param potDelta      How far, in counts, a potentiometer must move to wake
+    def __init__(self, motorControl, potFilters, idleMs=60000, pollMs=200, potDelta=2000):
+        if ( idleMs <= 0 or pollMs <= 0 ):
+            raise ValueError("IdleManager Constructor: idleMs and pollMs must be above 0")
+        self.motorControl = motorControl
+        self.potFilters   = list(potFilters)
+        self.idleMs       = idleMs
+        self.pollMs       = pollMs
+        self.potDelta     = potDelta
+
+        self.sleepHandler = None
+        self.wakeHandler  = None
+
+        # touch() counts activity, so the sleep loop can tell when a button's
+        # action ran while the Pico was asleep
+        self.activity     = 0
+        self.lastTicks    = utime.ticks_ms()
+
+        # Statistics
+        self.sleeps       = 0
+        self.sleptMs      = 0
+        self.wakeReason   = self.WAKE_NONE
+        self.resumeUs     = 0   # Time from waking up to the motors being ready, last sleep
+        self.maxResumeUs  = 0
+
+    # Set the functions called before going to sleep and after waking up.  The
+    # sleep handler stops any timers that would otherwise keep waking the Pico,
+    # and the wake handler starts them again.
+    def setHandlers(self, sleepHandler=None, wakeHandler=None):
+        self.sleepHandler = sleepHandler
+        self.wakeHandler  = wakeHandler
+
+    # Record that the test bed is in use, which starts the idle time again
+    def touch(self):
+        self.activity  += 1
+        self.lastTicks  = utime.ticks_ms()
+
+    # Returns True if every motor is stopped
+    def motorsStopped(self):
+        for motor in self.motorControl.motorList:
+            if ( not motor.isStopped() ):
+                return False
+        return True
+
+    # Returns True if every motor is stopped and nothing has happened for idleMs
+    def isIdle(self):
+        if ( utime.ticks_diff(utime.ticks_ms(), self.lastTicks) < self.idleMs ):
+            return False
+        return self.motorsStopped()
+
+    # Go to sleep if the test bed is idle.  Called from the main loop.
+    #
+    # Returns True if the Pico slept.
+    def check(self):
+        if ( not self.isIdle() ):
+            return False
+        self.sleep()
+        return True
+
+    # Returns True if any potentiometer has moved more than potDelta from its
+    # published value.  One reading each, with no filtering.
+    def potMoved(self):
+        for potFilter in self.potFilters:
+            reading = potFilter.readAverage()
+            if ( reading > potFilter.value() + self.potDelta or
+                 reading < potFilter.value() - self.potDelta ):
+                return True
+        return False
+
+    # Put the H-Bridge in standby and the Pico in lightsleep until a button is
+    # pressed or a knob is turned, then restore everything.
+    def sleep(self):
+        motorControl = self.motorControl
+        motorControl.setEnabled(False)
+        if ( self.sleepHandler != None ):
+            self.sleepHandler()
+
+        activity   = self.activity
+        startTicks = utime.ticks_ms()
+        while ( True ):
+            lightsleep(self.pollMs)
+            if ( self.activity != activity ):
+                self.wakeReason = self.WAKE_BUTTON
+                break
+            if ( self.potMoved() ):
+                self.wakeReason = self.WAKE_POT
+                break
+        wakeTicks = utime.ticks_us()
+        self.sleptMs += utime.ticks_diff(utime.ticks_ms(), startTicks)
+        self.sleeps  += 1
+
+        # A button's action may already have given its motor a speed, which
+        # takes the module out of STOP_STANDBY's standby
+        motorControl.setEnabled(not motorControl.standby)
+        for potFilter in self.potFilters:
+            potFilter.restart()
+        if ( self.wakeHandler != None ):
+            self.wakeHandler()
+
+        self.resumeUs = utime.ticks_diff(utime.ticks_us(), wakeTicks)
+        if ( self.resumeUs > self.maxResumeUs ):
+            self.maxResumeUs = self.resumeUs
+        self.touch()
+
+    #
+    # End of IdleManager class
+    #
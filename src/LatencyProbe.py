@@ -0,0 +1,137 @@
+# Class for timing the hot paths with fixed bucket histograms.
+#
+# A probe counts durations in microseconds, from utime.ticks_us(), into
+# buckets that double in size: bucket 0 counts durations of 0 and 1us, and
+# bucket n counts durations from 2**n to 2**(n+1) - 1us.  The last bucket also
+# counts everything longer.  A probe can time a stretch of code with start()
+# and stop(), the time between two events with startOnce() and stop(), or the
+# period of a loop with mark().  Nothing is allocated, so probes can be used
+# in interrupt handlers.
+#
+# Probes have names and are shared: probe() returns the same probe for the
+# same name, so one module can start a probe and another stop it.  dumpProbes()
+# prints them all.
+#
+# The modules with probes each have a PROBES constant at the top.  With it set
+# to 0, MicroPython's compiler leaves the "if ( PROBES ):" blocks out of the
+# code entirely, so the probes cost nothing and no probe is created.  Set it
+# to 1 to compile them in.
+#
+
+import utime
+
+from array import array
+
+class LatencyProbe:
+    """Fixed bucket histogram of durations in microseconds."""
+
+    BUCKETS = 21        # The last bucket starts at 2**20us, about one second
+
+    def __init__(self, name: str, buckets=BUCKETS):
+        self.name       = name
+        self.buckets    = buckets
+        self.counts     = array("I", bytearray(4 * buckets))
+        self.count      = 0
+        self.minUs      = 0
+        self.maxUs      = 0
+        self.startTicks = 0
+        self.pending    = False
+        self.lastTicks  = 0
+        self.marked     = False
+
+    # Start timing
+    def start(self):
+        self.startTicks = utime.ticks_us()
+        self.pending    = True
+
+    # Start timing unless already started, for timing from the first of
+    # several events, e.g. the first edge of a bouncing button
+    def startOnce(self):
+        if ( not self.pending ):
+            self.startTicks = utime.ticks_us()
+            self.pending    = True
+
+    # Stop timing and count the time since start().  Does nothing if not started.
+    def stop(self):
+        if ( self.pending ):
+            self.pending = False
+            self.add(utime.ticks_diff(utime.ticks_us(), self.startTicks))
+
+    # Count the time since the last call, for timing the period of a loop
+    def mark(self):
+        now = utime.ticks_us()
+        if ( self.marked ):
+            self.add(utime.ticks_diff(now, self.lastTicks))
+        self.lastTicks = now
+        self.marked    = True
+
+    # Count one duration
+    def add(self, us: int):
+        if ( us < 0 ):
+            us = 0
+        if ( self.count == 0 or us < self.minUs ):
+            self.minUs = us
+        if ( us > self.maxUs ):
+            self.maxUs = us
+        self.count += 1
+
+        bucket = 0
+        value  = us >> 1
+        last   = self.buckets - 1
+        while ( value > 0 and bucket < last ):
+            value >>= 1
+            bucket += 1
+        self.counts[bucket] += 1
+
+    def reset(self):
+        for n in range(self.buckets):
+            self.counts[n] = 0
+        self.count   = 0
+        self.minUs   = 0
+        self.maxUs   = 0
+        self.pending = False
+        self.marked  = False
+
+    # Returns the upper end of the bucket that holds the given fraction of
+    # the durations, e.g. 0.99 for the 99th percentile, or 0 if there are none
+    def percentile(self, fraction: float):
+        wanted = int(self.count * fraction + 0.5)
+        total  = 0
+        for n in range(self.buckets):
+            total += self.counts[n]
+            if ( total >= wanted and total > 0 ):
+                return min((2 << n) - 1, self.maxUs)
+        return 0
+
+    # Print one line with the counts, then the non-empty buckets
+    def dump(self):
+        print("Probe ", self.name, ": count ", self.count, ", min ", self.minUs, "us, median <=",
+              self.percentile(0.5), "us, 99% <=", self.percentile(0.99), "us, max ", self.maxUs, "us")
+        for n in range(self.buckets):
+            if ( self.counts[n] ):
+                print("    ", 0 if n == 0 else 1 << n, "us: ", self.counts[n])
+
+    #
+    # End of LatencyProbe class
+    #
+
+
+# Every probe, by name
+probes = {}
+
+# Returns the probe with the given name, creating it the first time
+def probe(name: str):
+    found = probes.get(name)
+    if ( found == None ):
+        found = LatencyProbe(name)
+        probes[name] = found
+    return found
+
+# Print every probe
+def dumpProbes():
+    for name in sorted(probes):
+        probes[name].dump()
+
+def resetProbes():
+    for name in probes:
+        probes[name].reset()
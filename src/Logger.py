@@ -0,0 +1,177 @@
+# Class for logging messages without holding up the code that logs them.
+#
+# print() formats its arguments and writes them to the USB serial port before
+# it returns.  When the host is slow to read, or not reading at all, that
+# takes milliseconds, and a print() in a button or potentiometer handler
+# holds up the motor update that comes after it.
+#
+# A Logger only stores the message's number, its level, the time and up to
+# ARGS small integers in a preallocated ring of slots.  The format strings are
+# registered once at start up with message().  drain(), called from the main
+# loop when there is nothing else to do, formats the waiting messages and
+# writes them out.  If the ring is full, log() drops the message and counts
+# it rather than waiting, and drain() reports how many were dropped.
+#
+# log() does not allocate, so it can be called from scheduled events and
+# from hard interrupt handlers.  It only stores the arguments its message has,
+# and only keeps a count of the messages it dropped; the number logged is
+# worked out when it is asked for.  When a hard interrupt handler logs too,
+# make the Logger with fromIrq True, and the slot is claimed and filled with
+# interrupts off so the handler cannot take the same slot.  Scheduled events
+# and the main loop do not interrupt one another, so they do not need it.
+#
+
+from array import array
+from machine import disable_irq, enable_irq
+
+import utime
+
+class Logger:
+    """Deferred formatting, leveled log kept in a preallocated ring."""
+
+    # Levels
+    DEBUG = 0
+    INFO  = 1
+    WARN  = 2
+    ERROR = 3
+    NAMES = ("DEBUG", "INFO", "WARN", "ERROR")
+
+    ARGS   = 6              # Integers stored with each message
+    FIELDS = ARGS + 2       # Message number and level, time, arguments
+
+    # Constructor
+    #
+    # @param slots      Number of messages the ring holds.  One slot is always
+    #                   left empty, so at most slots - 1 messages wait at once.
+    # @param level      Messages below this level are not kept
+    # @param direct     If True, log() prints straight away like print(), for
+    #                   comparing against or when the order of the output matters
+    # @param showTicks  If True, each message starts with its utime.ticks_ms() time
+    # @param fromIrq    If True, log() turns interrupts off while it fills a
+    #                   slot, for when hard interrupt handlers log
+    def __init__(self, slots=64, level=INFO, direct=False, showTicks=False, fromIrq=False):
+        if ( slots < 2 ):
+            raise ValueError("Logger Constructor: At least 2 slots are needed")
+        self.slots     = slots
+        self.level     = level
+        self.direct    = direct
+        self.showTicks = showTicks
+        self.fromIrq   = fromIrq
+        self.ring      = array("i", bytearray(4 * slots * self.FIELDS))
+        self.head      = 0
+        self.tail      = 0
+        self.dropped   = 0
+        self.reported  = 0      # dropped count at the last report
+        self.formats   = []
+        self.argCounts = []
+        self.written   = 0      # messages written out by drain()
+
+    # Register a message format string, with up to ARGS "%d" style fields.
+    # Done at start up, as it allocates.
+    #
+    # Returns the message number to pass to log()
+    def message(self, text: str):
+        count = text.count("%") - 2 * text.count("%%")
+        if ( count > self.ARGS ):
+            raise ValueError("Logger.message: More than " + str(self.ARGS) + " fields: " + text)
+        self.formats.append(text)
+        self.argCounts.append(count)
+        return len(self.formats) - 1
+
+    # Set the lowest level of the messages that are kept
+    def setLevel(self, level: int):
+        self.level = level
+
+    # Log a message.  The arguments must be small integers.
+    #
+    # Returns False if the message was below the level or was dropped.
+    def log(self, level: int, message: int, a=0, b=0, c=0, d=0, e=0, f=0):
+        if ( level < self.level ):
+            return False
+        if ( self.direct ):
+            self.write(level, message, utime.ticks_ms(), (a, b, c, d, e, f))
+            return True
+
+        fromIrq = self.fromIrq
+        if ( fromIrq ):
+            state = disable_irq()
+        head     = self.head
+        nextHead = head + 1
+        if ( nextHead >= self.slots ):
+            nextHead = 0
+        if ( nextHead == self.tail ):
+            self.dropped += 1
+            if ( fromIrq ):
+                enable_irq(state)
+            return False
+
+        ring   = self.ring
+        offset = head * self.FIELDS
+        ring[offset]     = (message << 2) | level
+        ring[offset + 1] = utime.ticks_ms()
+        # Only the arguments the message has; drain() does not read the rest
+        count = self.argCounts[message]
+        if ( count > 0 ):
+            ring[offset + 2] = a
+            if ( count > 1 ):
+                ring[offset + 3] = b
+                if ( count > 2 ):
+                    ring[offset + 4] = c
+                    ring[offset + 5] = d
+                    ring[offset + 6] = e
+                    ring[offset + 7] = f
+        self.head = nextHead
+        if ( fromIrq ):
+            enable_irq(state)
+        return True
+
+    # Returns the number of messages kept since the Logger was made: those
+    # written out and those still waiting.  Dropped messages are not counted.
+    def logged(self):
+        return self.written + self.waiting()
+
+    # Returns the number of messages waiting to be written
+    def waiting(self):
+        count = self.head - self.tail
+        if ( count < 0 ):
+            count += self.slots
+        return count
+
+    # Format one message and write it out.  Allocates.
+    def write(self, level: int, message: int, ticks: int, args):
+        text = self.formats[message]
+        if ( self.argCounts[message] > 0 ):
+            text = text % tuple(args[:self.argCounts[message]])
+        if ( level != self.INFO ):
+            text = self.NAMES[level] + ": " + text
+        if ( self.showTicks ):
+            print(ticks, text)
+        else:
+            print(text)
+
+    # Write out up to count waiting messages, and report any that were dropped.
+    # Called from the main loop, never from an interrupt handler.
+    #
+    # Returns the number of messages written.
+    def drain(self, count=8):
+        if ( self.dropped != self.reported ):
+            print("WARN: ", self.dropped - self.reported, " log messages dropped")
+            self.reported = self.dropped
+
+        written = 0
+        ring    = self.ring
+        while ( written < count and self.tail != self.head ):
+            offset = self.tail * self.FIELDS
+            self.write(ring[offset] & 3, ring[offset] >> 2, ring[offset + 1], ring[offset + 2:offset + self.FIELDS])
+            # Only free the slot once it has been read
+            tail = self.tail + 1
+            if ( tail >= self.slots ):
+                tail = 0
+            self.tail = tail
+            written  += 1
+        self.written += written
+        return written
+
+    #
+    # End of Logger class
+    #
@@ -0,0 +1,99 @@
+# Class for passing small messages from one core to the other.
+#
+# A Mailbox has exactly one producer, which only calls put(), and one
+# consumer, which only calls get().  A message is up to FIELDS small integers,
+# held in a preallocated array of slots.  The producer only ever writes the
+# head index and the consumer only ever writes the tail index, and each index
+# is one word in an array, so no lock is needed: the producer fills a slot
+# before moving the head past it, and the consumer reads a slot before moving
+# the tail past it.
+#
+# put() and get() do not allocate, so either side can be an interrupt handler
+# or the control loop on the other core.  If the mailbox is full, put() drops
+# the message and counts it rather than waiting.
+#
+
+from array import array
+
+class Mailbox:
+    """Lock free single producer, single consumer message queue between cores."""
+
+    FIELDS = 4      # Integers in one message
+
+    HEAD    = 0     # Written only by the producer
+    TAIL    = 1     # Written only by the consumer
+    DROPPED = 2     # Written only by the producer
+
+    # Constructor
+    #
+    # @param slots  Number of messages the mailbox holds.  One slot is always
+    #               left empty, so at most slots - 1 messages wait at once.
+    def __init__(self, slots=16):
+        if ( slots < 2 ):
+            raise ValueError("Mailbox Constructor: At least 2 slots are needed")
+        self.slots   = slots
+        self.buffer  = array("i", bytearray(4 * slots * self.FIELDS))
+        self.index   = array("I", bytearray(4 * 3))
+
+    # Add a message.  Producer only.
+    #
+    # Returns False if the mailbox was full and the message was dropped.
+    def put(self, kind: int, a=0, b=0, c=0):
+        index    = self.index
+        head     = index[self.HEAD]
+        nextHead = head + 1
+        if ( nextHead >= self.slots ):
+            nextHead = 0
+        if ( nextHead == index[self.TAIL] ):
+            index[self.DROPPED] += 1
+            return False
+
+        buffer = self.buffer
+        offset = head * self.FIELDS
+        buffer[offset]     = kind
+        buffer[offset + 1] = a
+        buffer[offset + 2] = b
+        buffer[offset + 3] = c
+
+        # Only publish the message once it is complete
+        index[self.HEAD] = nextHead
+        return True
+
+    # Take the oldest message.  Consumer only.
+    #
+    # @param message  Array of at least FIELDS integers that the message is copied into
+    #
+    # Returns False if there was no message.
+    def get(self, message):
+        index = self.index
+        tail  = index[self.TAIL]
+        if ( tail == index[self.HEAD] ):
+            return False
+
+        buffer = self.buffer
+        offset = tail * self.FIELDS
+        message[0] = buffer[offset]
+        message[1] = buffer[offset + 1]
+        message[2] = buffer[offset + 2]
+        message[3] = buffer[offset + 3]
+
+        tail += 1
+        if ( tail >= self.slots ):
+            tail = 0
+        index[self.TAIL] = tail
+        return True
+
+    # Returns the number of messages waiting
+    def pending(self):
+        count = self.index[self.HEAD] - self.index[self.TAIL]
+        if ( count < 0 ):
+            count += self.slots
+        return count
+
+    # Returns the number of messages dropped because the mailbox was full
+    def dropped(self):
+        return self.index[self.DROPPED]
+
+    #
+    # End of Mailbox class
+    #
@@ -0,0 +1,241 @@
+# Class for the calibration of one motor and its potentiometer, and the lookup
+# table from potentiometer value to duty built from it.
+#
+# A TT motor does not turn at all below some duty, and the potentiometers never
+# read right down to 0 or up to 65535, so mapping the potentiometer value
+# straight to the duty wastes a large part of the knob.  The calibration holds:
+#
+#   - startDuty  The lowest duty that starts the motor from rest
+#   - stallDuty  The duty at which a running motor stops, lower than startDuty
+#   - potMin     The lowest value the potentiometer reads
+#   - potMax     The highest value the potentiometer reads
+#   - pwmFreq    The best PWM frequency found by FrequencySweep, 0 if not measured
+#
+# buildTable() works out a table with one duty for every 2**TABLE_SHIFT counts
+# of potentiometer value.  The bottom offBand counts of the knob are off, the
+# top offBand counts are full speed, and the rest of the knob runs from
+# stallDuty to full speed, so every part of the knob does something.  duty() is
+# then one shift and one table index.  A duty below startDuty only keeps a
+# running motor turning, so until the motor is running duty() gives startDuty
+# for those, and once it is running the lower duties are used.
+#
+# measureDeadBand() and measurePotRange() find the values on the test bed, and
+# saveCalibrations() and loadCalibrations() keep them in a JSON file on the
+# Pico's flash so they are only measured once.
+#
+
+import json
+import utime
+
+from array import array
+
+class MotorCalibration:
+    """Dead band and potentiometer range of one motor, and its duty lookup table."""
+
+    TABLE_SHIFT = 6
+    TABLE_SIZE  = 65536 >> TABLE_SHIFT      # 1024 entries, 2KB
+    FULL        = 65535
+
+    # Constructor
+    #
+    # The defaults map the potentiometer value straight to the duty.
+    #
+    # @param offBand  Counts above potMin that are treated as off, and below
+    #                 potMax that are treated as full speed.  This should be more
+    #                 than the PotFilter hysteresis, or the published value may
+    #                 never get into the bands.
+    def __init__(self, startDuty=0, stallDuty=0, potMin=0, potMax=65535, offBand=0, pwmFreq=0):
+        self.startDuty = startDuty
+        self.stallDuty = stallDuty
+        self.potMin    = potMin
+        self.potMax    = potMax
+        self.offBand   = offBand
+        self.pwmFreq   = pwmFreq
+        self.table     = None
+        self.running   = False
+
+    # Returns True if this holds measured values rather than the defaults
+    def isCalibrated(self):
+        return self.startDuty > 0 or self.potMin > 0 or self.potMax < self.FULL
+
+    # Returns the values as a dictionary for saving
+    def toDict(self):
+        return { "startDuty": self.startDuty, "stallDuty": self.stallDuty,
+                 "potMin": self.potMin, "potMax": self.potMax, "offBand": self.offBand,
+                 "pwmFreq": self.pwmFreq }
+
+    # Set the values from a dictionary made by toDict()
+    def fromDict(self, values):
+        self.startDuty = values.get("startDuty", 0)
+        self.stallDuty = values.get("stallDuty", 0)
+        self.potMin    = values.get("potMin", 0)
+        self.potMax    = values.get("potMax", self.FULL)
+        self.offBand   = values.get("offBand", 0)
+        self.pwmFreq   = values.get("pwmFreq", 0)
+        self.table     = None
+        self.running   = False
+
+    # Returns the lowest duty in the table: the stall duty, or the start duty if
+    # the stall duty was not measured
+    def lowDuty(self):
+        if ( self.stallDuty > 0 and self.stallDuty < self.startDuty ):
+            return self.stallDuty
+        return self.startDuty
+
+    # Work out the duty for every table entry, from the middle of the
+    # potentiometer values the entry covers.
+    #
+    # Returns the table, an array('H') of TABLE_SIZE duties.
+    def buildTable(self):
+        table = array("H", bytearray(2 * self.TABLE_SIZE))
+        low   = self.potMin + self.offBand
+        high  = self.potMax - self.offBand
+        if ( high <= low ):
+            high = low + 1
+        base  = self.lowDuty()
+        span  = self.FULL - base
+        half  = (1 << self.TABLE_SHIFT) >> 1
+
+        for index in range(self.TABLE_SIZE):
+            pot = (index << self.TABLE_SHIFT) + half
+            if ( pot <= low ):
+                duty = 0
+            elif ( pot >= high ):
+                duty = self.FULL
+            else:
+                duty = base + (pot - low) * span // (high - low)
+            table[index] = duty
+
+        self.table = table
+        return table
+
+    # Returns the duty for a potentiometer value.  Without a table the value is used as it is.
+    #
+    # @param pot     The potentiometer value
+    # @param driven  False if the motor is STOPPED.  The motor is taken to be
+    #                running from the first duty it is driven at until it is
+    #                STOPPED or given a duty of 0.  Until then a duty between 0
+    #                and startDuty is raised to startDuty, so the motor starts.
+    def duty(self, pot: int, driven=True):
+        table = self.table
+        if ( table == None ):
+            return pot
+        duty = table[pot >> self.TABLE_SHIFT]
+        if ( not driven or duty == 0 ):
+            self.running = False
+        elif ( not self.running ):
+            self.running = True
+            if ( duty < self.startDuty ):
+                duty = self.startDuty
+        return duty
+
+    # Find the start and stall duties of a motor.
+    #
+    # The motor is driven FORWARD with the duty going up by stepDuty every
+    # settleMs until isMoving() returns True, which is the start duty.  The duty
+    # then goes down by stepDuty every settleMs until isMoving() returns False,
+    # and the last duty it was still moving at is the stall duty.  The motor is
+    # stopped at the end.
+    #
+    # @param motorControl  The MotorControl the motor belongs to, which writes the
+    #                      direction pins in batched mode
+    # @param motor         The TTMotor to calibrate
+    # @param isMoving      Function that returns True while the motor is turning, e.g.
+    #                      from an encoder, or from a button held down by the person
+    #                      watching the wheel
+    # @param stepDuty      Duty change per step
+    # @param settleMs      Time the motor is given at each duty before isMoving() is called
+    #
+    # Returns True if the motor started before full duty.
+    def measureDeadBand(self, motorControl, motor, isMoving, stepDuty=512, settleMs=100):
+        duty    = 0
+        started = False
+        while ( duty < self.FULL ):
+            duty += stepDuty
+            if ( duty > self.FULL ):
+                duty = self.FULL
+            self.drive(motorControl, motor, motor.FORWARD, duty)
+            utime.sleep_ms(settleMs)
+            if ( isMoving() ):
+                started = True
+                break
+
+        if ( started ):
+            self.startDuty = duty
+            stall = duty
+            while ( duty > 0 ):
+                duty -= stepDuty
+                if ( duty < 0 ):
+                    duty = 0
+                self.drive(motorControl, motor, motor.FORWARD, duty)
+                utime.sleep_ms(settleMs)
+                if ( not isMoving() ):
+                    break
+                stall = duty
+            self.stallDuty = stall
+
+        self.drive(motorControl, motor, motor.STOPPED, 0)
+        self.table   = None
+        self.running = False
+        return started
+
+    # Write a direction and duty straight to a motor, without ramping
+    def drive(self, motorControl, motor, direction, duty):
+        motor.writeOutput(direction, duty)
+        if ( motorControl.batched ):
+            motorControl.writePins()
+        motorControl.updateStandby()
+
+    # Find the range of a potentiometer while someone turns it all the way both ways.
+    #
+    # @param potFilter  PotFilter of the potentiometer.  Its filtered value is used
+    #                   so single noisy readings do not stretch the range.
+    # @param ms         How long to watch the potentiometer for
+    # @param sampleMs   Time between samples
+    def measurePotRange(self, potFilter, ms=5000, sampleMs=20):
+        potFilter.sample()
+        low  = potFilter.filteredValue()
+        high = low
+        startTicks = utime.ticks_ms()
+        while ( utime.ticks_diff(utime.ticks_ms(), startTicks) < ms ):
+            utime.sleep_ms(sampleMs)
+            potFilter.sample()
+            value = potFilter.filteredValue()
+            if ( value < low ):
+                low = value
+            if ( value > high ):
+                high = value
+
+        self.potMin = low
+        self.potMax = high
+        self.table  = None
+        return high - low
+
+    #
+    # End of MotorCalibration class
+    #
+
+
+# Write calibrations to a JSON file.
+#
+# @param path          File name, e.g. "calibration.json"
+# @param calibrations  Dictionary of name --> MotorCalibration
+def saveCalibrations(path: str, calibrations):
+    with open(path, "w") as file:
+        json.dump({ name: calibration.toDict() for name, calibration in calibrations.items() }, file)
+
+
+# Read calibrations written by saveCalibrations() into existing MotorCalibration objects.
+#
+# Returns False if there is no file, or it cannot be read, and the objects are unchanged.
+def loadCalibrations(path: str, calibrations):
+    try:
+        with open(path) as file:
+            values = json.load(file)
+    except (OSError, ValueError):
+        return False
+
+    for name, calibration in calibrations.items():
+        if ( name in values ):
+            calibration.fromDict(values[name])
+    return True
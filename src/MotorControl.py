@@ -4,9 +4,22 @@
 
 
 
-from machine import Pin
+from machine import Pin, mem32
+from micropython import const
 
-import TTMotor
+from TTMotor import STOP_COAST, STOP_STANDBY
+
+# RP2040 SIO registers for the GPIO outputs.  Writing a mask to GPIO_OUT_XOR
+# flips every pin in the mask with a single write.
+SIO_GPIO_OUT     = 0xd0000010
+SIO_GPIO_OUT_XOR = 0xd000001c
+
+# Set to 1 to compile in the latency probes.  See LatencyProbe.py.
+PROBES = const(0)
+
+# Keys of the Front and Back Motors in the motors dictionary
+_FRONT = const(1)
+_BACK  = const(2)
 
 # The TB6612FNG Dual H-Bridge control class.
 #
@@ -18,6 +31,9 @@ class MotorControl:
     """Class to manage two TTMotor objects connected to the same
     TB6612FN Dual MOSFET H-Bridge module."""
 
+    FRONT = _FRONT
+    BACK  = _BACK
+
     # Primary Constructor for this Class
     #
     # Note: It is the responsibility of the caller to have already created
@@ -43,27 +59,192 @@ class MotorControl:
         self.pinSTANDBY  = Pin( self.gpioSTANDBY, mode=Pin.OUT )
         self.motors      = {}
 
-        # Offsets for the Front and Back Motors in the motors array
-        self.FRONT = 1
-        self.BACK  = 2
+        # The same motors in a list.  Looping over a list does not allocate in
+        # MicroPython, where looping over motors.values() does, so this is used
+        # by the methods that run from interrupt handlers.
+        self.motorList   = []
+
+        # Lookup table from GPIO Pin Number to the TTMotor object that pin
+        # belongs to.  It holds each motor's own pins and any other pins, such
+        # as buttons and potentiometers, bound to a motor with bindPin().
+        self.pinMotors   = {}
+
+        if ( PROBES ):
+            from LatencyProbe import probe
+            self.speedProbe = probe("change speed")
+            self.pressProbe = probe("button to motor")
+
+        # Batched mode: the direction pins of all motors are written together.
+        # See setBatched().
+        self.batched     = False
+        self.pinMask     = 0
+
+        # Stop mode of the motors, see setStopMode().  standby is True while the
+        # module has been put in standby because every motor is stopped.
+        self.stopMode    = STOP_COAST
+        self.standby     = False
 
         if ( frontMotor != None ):
-            self.motors[self.FRONT] = frontMotor
+            self.motors[_FRONT] = frontMotor
+            self.motorList.append(frontMotor)
+            self.bindMotorPins(frontMotor)
 
         if ( backMotor != None ):
-            self.motors[self.BACK]  = backMotor
+            self.motors[_BACK]  = backMotor
+            self.motorList.append(backMotor)
+            self.bindMotorPins(backMotor)
 
         self.pinSTANDBY.high()
 
-    # There is no general way to obtain the ID used to create a Pin object
-    # after it has been created.  The following is a HACK, that assumes that
-    # when a Pin object is converted to a string "Pin(xx, yy==zz, gg=pp)"
-    # that the first parameter after the "(" starts in offset [4] and 
-    # ends with a comma.
-    def getPinID( self, pin ):
-        pinString = str(pin)
-        pinData   = pinString[4:-1].split(",")
-        return int(pinData[0])
+    # Add the PWM, IN1 and IN2 pins of a motor to the pin lookup table
+    #
+    # Raises ValueError if the motor's PWM pin is on the same RP2040 PWM slice
+    # as another motor's and they cannot both work, see pwmConflict().
+    def bindMotorPins( self, motor ):
+        for other in self.motorList:
+            if ( other is not motor ):
+                conflict = self.pwmConflict(motor, other, motor.pwmFreq)
+                if ( conflict != None ):
+                    raise ValueError("MotorControl: " + conflict)
+        self.pinMotors[motor.gpioPWM] = motor
+        self.pinMotors[motor.gpioIN1] = motor
+        self.pinMotors[motor.gpioIN2] = motor
+        self.pinMask |= motor.in1Mask | motor.in2Mask
+
+    # Bind another GPIO Pin, such as a button or potentiometer, to the motor
+    # that uses gpioPWM.  This is done once at setup time so that finding the
+    # motor for a pin later is a single table lookup with no allocation, which
+    # makes it safe to do in an interrupt handler.
+    #
+    # @param gpio     The GPIO Pin Number of the button or potentiometer
+    # @param gpioPWM  The GPIO Pin Number of the motor's PWM pin
+    def bindPin( self, gpio: int, gpioPWM: int ):
+        motor = self.pinMotors.get(gpioPWM)
+        if ( motor == None ):
+            raise ValueError("MotorControl.bindPin: No motor uses PWM Pin: " + str(gpioPWM))
+        self.pinMotors[gpio] = motor
+
+    # Returns why motor cannot run at freq next to other, or None if it can.
+    #
+    # The RP2040 has eight PWM slices of two channels each, and GPIO Pin n is
+    # channel n & 1 of slice (n >> 1) & 7, so GPIO 4 and 5 share slice 2, and so
+    # do GPIO 20 and 21.  Both channels of a slice run at one frequency, and two
+    # pins on the same channel always have the same duty.
+    def pwmConflict( self, motor, other, freq: int ):
+        if ( motor.pwmSlice() != other.pwmSlice() ):
+            return None
+        if ( motor.pwmChannel() == other.pwmChannel() ):
+            return ("PWM Pins " + str(motor.gpioPWM) + " and " + str(other.gpioPWM) +
+                    " are the same channel of PWM slice " + str(motor.pwmSlice()))
+        if ( freq != other.pwmFreq ):
+            return ("PWM Pin " + str(motor.gpioPWM) + " at " + str(freq) + "Hz shares PWM slice " +
+                    str(motor.pwmSlice()) + " with PWM Pin " + str(other.gpioPWM) + " at " + str(other.pwmFreq) + "Hz")
+        return None
+
+    # Set the PWM frequency of one motor, or of every motor.  See TTMotor.setFrequency().
+    #
+    # @param freq     Frequency in Hz
+    # @param gpioPWM  The GPIO Pin Number of the motor's PWM pin, or -1 for every motor
+    # @param shared   If True, the other motors on the same PWM slice are set to
+    #                 freq too.  If False, a motor sharing the slice at another
+    #                 frequency is an error.
+    #
+    # Raises ValueError, and changes nothing, if the frequency cannot be set.
+    def setFrequency( self, freq: int, gpioPWM=-1, shared=False ):
+        if ( gpioPWM < 0 ):
+            changing = list(self.motorList)
+        else:
+            motor = self.pinMotors.get(gpioPWM)
+            if ( motor == None or motor.gpioPWM != gpioPWM ):
+                raise ValueError("MotorControl.setFrequency: No motor uses PWM Pin: " + str(gpioPWM))
+            changing = [motor]
+            if ( shared ):
+                for other in self.motorList:
+                    if ( other is not motor and other.pwmSlice() == motor.pwmSlice() ):
+                        changing.append(other)
+
+        for motor in changing:
+            for other in self.motorList:
+                if ( other not in changing ):
+                    conflict = self.pwmConflict(motor, other, freq)
+                    if ( conflict != None ):
+                        raise ValueError("MotorControl.setFrequency: " + conflict)
+
+        for motor in changing:
+            motor.setFrequency(freq)
+
+    # Returns the TTMotor object a GPIO Pin is bound to, or None if the pin is not bound
+    def motorFor( self, gpio: int ):
+        return self.pinMotors.get(gpio)
+
+    # Turn the H-Bridge module on or off with its STANDBY Pin.  While it is off,
+    # both motors coast whatever their IN1, IN2 and PWM pins are set to.
+    def setEnabled( self, flag=True ):
+        self.pinSTANDBY.value(1 if flag else 0)
+
+    # Returns True if the H-Bridge module is on, i.e. not in standby
+    def isEnabled( self ):
+        return self.pinSTANDBY.value() == 1
+
+    # Set what the module does with stopped motors.  See TTMotor.setStopMode().
+    #
+    # With STOP_STANDBY the motors coast, and once every motor is stopped the
+    # whole module is put in standby, where it draws almost nothing.  It is
+    # turned back on as soon as a motor is given a speed.
+    def setStopMode( self, mode: int, brakeMs=100 ):
+        self.stopMode = mode
+        for motor in self.motorList:
+            motor.setStopMode(mode, brakeMs)
+        if ( mode != STOP_STANDBY and self.standby ):
+            self.standby = False
+            self.setEnabled(True)
+        self.updateStandby()
+
+    # In STOP_STANDBY mode, put the module in standby if every motor is
+    # stopped, or take it out if not.  Called after the motors are written.
+    def updateStandby( self ):
+        if ( self.stopMode != STOP_STANDBY ):
+            return
+        stopped = True
+        for motor in self.motorList:
+            if ( not motor.isStopped() ):
+                stopped = False
+        if ( stopped != self.standby ):
+            self.standby = stopped
+            self.setEnabled(not stopped)
+
+
+    # Turn batched direction pin writes on or off.
+    #
+    # Normally each motor writes its IN1 and IN2 pins one after the other, so the
+    # motors change direction a few microseconds apart.  In batched mode the
+    # motors only record the new pin values, and writePins() switches every
+    # direction pin that changed with a single write to the RP2040 GPIO_OUT_XOR
+    # register, so both H-Bridge channels switch together.
+    def setBatched( self, flag=True ):
+        self.batched = flag
+        for motor in self.motorList:
+            motor.batched = flag
+        if ( flag ):
+            self.writePins()
+
+    # Write the direction pins of all motors with one register write.
+    #
+    # Only the pins that differ from what the GPIO_OUT register already holds are
+    # flipped, and if none differ nothing is written.
+    def writePins( self ):
+        wanted = 0
+        for motor in self.motorList:
+            if ( motor.IN1Value ):
+                wanted |= motor.in1Mask
+            if ( motor.IN2Value ):
+                wanted |= motor.in2Mask
+
+        change = (mem32[SIO_GPIO_OUT] ^ wanted) & self.pinMask
+        if ( change ):
+            mem32[SIO_GPIO_OUT_XOR] = change
+            if ( PROBES ):
+                self.pressProbe.stop()
 
 
     # Modify speed being written to the each of the wheels
@@ -76,6 +257,9 @@ class MotorControl:
     #       the motors to physically change speed.
     #
     def changeSpeed( self, speed=-1, frontSpeed=-1, backSpeed=-1):
+        if ( PROBES ):
+            self.speedProbe.start()
+
         # Determining actual speeds based on which speed parameters are set or
         # in are their default values.
         if ( speed < 0 ):
@@ -94,22 +278,64 @@ class MotorControl:
         # change Motor Speeds
         #
         # NOTE: If TTMotor object was None, the if statements will evaluate to False
-        if ( self.FRONT in self.motors.keys() ):
-            self.motors[self.FRONT].motorControl(frontSpeed)
+        if ( _FRONT in self.motors ):
+            self.motors[_FRONT].motorControl(frontSpeed)
+
+        if ( _BACK  in self.motors ):
+            self.motors[_BACK].motorControl(backSpeed)
 
-        if ( self.BACK  in self.motors.keys() ):
-            self.motors[self.BACK].motorControl(backSpeed)
+        if ( self.batched ):
+            self.writePins()
+        self.updateStandby()
+
+        if ( PROBES ):
+            self.speedProbe.stop()
+
+
+    # Set the ramp rate of every motor.  See TTMotor.setRamp().
+    def setRamp( self, rate: int, jerk=0 ):
+        for motor in self.motorList:
+            motor.setRamp(rate, jerk)
+
+    # Move every motor one ramp step towards its target.  Called from a timer.
+    #
+    # Returns True if any motor has not reached its target yet.
+    def rampTick( self ):
+        ramping = False
+        for motor in self.motorList:
+            if ( motor.rampTick() ):
+                ramping = True
+        if ( self.batched ):
+            self.writePins()
+        self.updateStandby()
+        return ramping
+
+
+    # Run one closed loop control update on every motor with an encoder.  Called
+    # from a timer at a fixed rate.  See TTMotor.controlTick().
+    def controlTick( self ):
+        for motor in self.motorList:
+            if ( motor.encoder != None ):
+                motor.controlTick()
+        if ( self.batched ):
+            self.writePins()
+        self.updateStandby()
 
 
     # Toggle the direction the motor should turn based on Pin Number
-    def toggleDirection(self, gpioPWM: int ):
-        print("Toggle Direction on PWM Motor: ", gpioPWM)
-
-        # Loop through motors array and toggle the direction on the appropriate motor
-        for motor in self.motors.values():
-            if ( motor.usesPin( gpioPWM ) ):
-                motor.toggleDirection()
-                print("Toggle Direction: Motor ID: ", gpioPWM, ", Direction = ", motor.direction())
+    #
+    # Any pin bound to the motor can be used, see bindPin().  The motor is found with
+    # a single table lookup and nothing is allocated, so this can be called from an
+    # interrupt handler.
+    #
+    # Returns the new direction of the motor, or -1 if no motor is bound to the pin.
+    def toggleDirection(self, gpioPin: int ):
+        motor = self.pinMotors.get(gpioPin)
+        if ( motor == None ):
+            return -1
+
+        motor.toggleDirection()
+        return motor.direction()
         
 
     #
@@ -0,0 +1,196 @@
+# Class to handle any number of motors spread over several TB6612FNG Dual
+# H-Bridge modules.
+#
+# Each module is still a MotorControl object with its own STANDBY Pin and up
+# to two TTMotor objects.  The group puts the motors of all of the modules in
+# one list, numbered in the order the modules were added: the front motor of
+# the first module is 0, its back motor is 1, the front motor of the second
+# module is 2, and so on.
+#
+# setSpeeds() takes one array of speeds, and optionally one of directions, and
+# sets every motor in a single pass.  The direction pins of all of the motors,
+# on every module, are then switched with one write to the RP2040 GPIO_OUT_XOR
+# register.  The cost of an update grows by one TTMotor write per motor and
+# nothing is allocated, so it can run from a timer.
+#
+
+from machine import mem32
+
+from MotorControl import SIO_GPIO_OUT, SIO_GPIO_OUT_XOR
+
+class MotorGroup:
+    """Class to manage any number of TTMotor objects on several TB6612FNG modules."""
+
+    # Constructor
+    #
+    # @param bridges  Optional list of MotorControl objects, one per H-Bridge module
+    # @param batched  If True, the direction pins of all motors are written together
+    def __init__( self, bridges=None, batched=True ):
+        self.bridges   = []
+        self.motorList = []
+        self.pinMotors = {}
+        self.pinMask   = 0
+        self.batched   = batched
+
+        if ( bridges != None ):
+            for bridge in bridges:
+                self.addBridge(bridge)
+
+    # Add an H-Bridge module.  Its motors are numbered after those already in the group.
+    #
+    # Raises ValueError if one of its pins is already used by another motor, or
+    # one of its motors shares a PWM slice with a motor of another module and
+    # they cannot both work.  See MotorControl.pwmConflict().
+    def addBridge( self, bridge ):
+        for gpio, motor in bridge.pinMotors.items():
+            if ( gpio in self.pinMotors and self.pinMotors[gpio] is not motor ):
+                raise ValueError("MotorGroup.addBridge: Pin already used by another motor: " + str(gpio))
+        for motor in bridge.motorList:
+            for other in self.motorList:
+                conflict = bridge.pwmConflict(motor, other, motor.pwmFreq)
+                if ( conflict != None ):
+                    raise ValueError("MotorGroup.addBridge: " + conflict)
+
+        self.bridges.append(bridge)
+        self.pinMotors.update(bridge.pinMotors)
+        self.pinMask |= bridge.pinMask
+        for motor in bridge.motorList:
+            self.motorList.append(motor)
+
+        # The module's own methods still write its pins, but the group writes
+        # the pins of every module together
+        bridge.batched = self.batched
+        for motor in bridge.motorList:
+            motor.batched = self.batched
+        if ( self.batched ):
+            self.writePins()
+
+    # Returns the number of motors in the group
+    def count( self ):
+        return len(self.motorList)
+
+    # Returns the motor with the given number
+    def motor( self, index: int ):
+        return self.motorList[index]
+
+    # Returns the TTMotor object a GPIO Pin is bound to, or None.  See MotorControl.bindPin().
+    def motorFor( self, gpio: int ):
+        return self.pinMotors.get(gpio)
+
+    # Turn batched direction pin writes on or off.  See MotorControl.setBatched().
+    def setBatched( self, flag=True ):
+        self.batched = flag
+        for bridge in self.bridges:
+            bridge.batched = flag
+        for motor in self.motorList:
+            motor.batched = flag
+        if ( flag ):
+            self.writePins()
+
+    # Turn every H-Bridge module on or off with its STANDBY Pin
+    def setEnabled( self, flag=True ):
+        for bridge in self.bridges:
+            bridge.setEnabled(flag)
+
+    # Set what every module does with stopped motors.  See MotorControl.setStopMode().
+    def setStopMode( self, mode: int, brakeMs=100 ):
+        for bridge in self.bridges:
+            bridge.setStopMode(mode, brakeMs)
+
+    # Put each module in standby, or take it out, as its motors stop and start.
+    # See MotorControl.updateStandby().
+    def updateStandby( self ):
+        for bridge in self.bridges:
+            bridge.updateStandby()
+
+    # Write the direction pins of every motor on every module with one register write
+    def writePins( self ):
+        wanted = 0
+        for motor in self.motorList:
+            if ( motor.IN1Value ):
+                wanted |= motor.in1Mask
+            if ( motor.IN2Value ):
+                wanted |= motor.in2Mask
+
+        change = (mem32[SIO_GPIO_OUT] ^ wanted) & self.pinMask
+        if ( change ):
+            mem32[SIO_GPIO_OUT_XOR] = change
+
+    # Set the speed of every motor in one pass.
+    #
+    # @param speeds      Array or list with one speed per motor.  Without
+    #                    directions, the speeds are signed: positive is FORWARD,
+    #                    negative is BACKWARD and 0 is STOPPED.
+    # @param directions  Optional array or list with one TTMotor direction per
+    #                    motor.  The speeds are then used as they are, as the
+    #                    potentiometer speeds are.
+    #
+    # If the arrays are shorter than the group, the motors after them are not changed.
+    def setSpeeds( self, speeds, directions=None ):
+        motors = self.motorList
+        count  = len(motors)
+        if ( len(speeds) < count ):
+            count = len(speeds)
+
+        if ( directions == None ):
+            for n in range(count):
+                motors[n].setSpeed(speeds[n])
+        else:
+            if ( len(directions) < count ):
+                count = len(directions)
+            for n in range(count):
+                motors[n].setDirection(directions[n], speeds[n])
+
+        if ( self.batched ):
+            self.writePins()
+        self.updateStandby()
+
+    # Set every motor to the same signed speed
+    def setAll( self, speed: int ):
+        for motor in self.motorList:
+            motor.setSpeed(speed)
+        if ( self.batched ):
+            self.writePins()
+        self.updateStandby()
+
+    # Set the ramp rate of every motor.  See TTMotor.setRamp().
+    def setRamp( self, rate: int, jerk=0 ):
+        for motor in self.motorList:
+            motor.setRamp(rate, jerk)
+
+    # Move every motor one ramp step towards its target.  Called from a timer.
+    #
+    # Returns True if any motor has not reached its target yet.
+    def rampTick( self ):
+        ramping = False
+        for motor in self.motorList:
+            if ( motor.rampTick() ):
+                ramping = True
+        if ( self.batched ):
+            self.writePins()
+        self.updateStandby()
+        return ramping
+
+    # Run one closed loop control update on every motor with an encoder.  See TTMotor.controlTick().
+    def controlTick( self ):
+        for motor in self.motorList:
+            if ( motor.encoder != None ):
+                motor.controlTick()
+        if ( self.batched ):
+            self.writePins()
+        self.updateStandby()
+
+    # Toggle the direction of the motor a GPIO Pin is bound to.  See MotorControl.toggleDirection().
+    #
+    # Returns the new direction of the motor, or -1 if no motor is bound to the pin.
+    def toggleDirection( self, gpioPin: int ):
+        motor = self.pinMotors.get(gpioPin)
+        if ( motor == None ):
+            return -1
+
+        motor.toggleDirection()
+        return motor.direction()
+
+    #
+    # End of MotorGroup class
+    #
@@ -0,0 +1,113 @@
+# Class for building a motor test profile as a table of setpoints.
+#
+# A profile is a list of segments: steps, ramps, sine waves and custom
+# sequences.  Each segment is given in milliseconds and build() works out the
+# signed speed for every tick at the profile's tick rate, once, before the test
+# starts.  Positive speeds are FORWARD, negative are BACKWARD and 0 is STOPPED,
+# with 65535 being full speed.
+#
+# The table is an array of 32 bit ints, so a 10 second profile at 100Hz takes
+# 4KB.  ProfilePlayer plays the tables back.
+#
+# Example, 1 second stopped, ramp up to half speed over 2 seconds, hold for
+# 3 seconds, then one slow sine wave around half speed:
+#
+#   profile = MotorProfile(100)
+#   profile.step(0, 1000)
+#   profile.ramp(0, 32768, 2000)
+#   profile.step(32768, 3000)
+#   profile.sine(32768, 16384, 4000, 4000)
+#   table = profile.build()
+#
+
+import math
+
+from array import array
+
+class MotorProfile:
+    """Builder for a precomputed table of signed motor speeds."""
+
+    FULL = 65535
+
+    STEP   = 0
+    RAMP   = 1
+    SINE   = 2
+    CUSTOM = 3
+
+    # Constructor
+    #
+    # @param tickHz  Rate the profile is played back at, in ticks per second
+    def __init__(self, tickHz=100):
+        if ( tickHz <= 0 ):
+            raise ValueError("MotorProfile Constructor: tickHz must be greater than 0")
+        self.tickHz   = tickHz
+        self.segments = []
+
+    # Returns the number of ticks in a time, at least one
+    def ticks(self, ms: int):
+        count = (ms * self.tickHz + 500) // 1000
+        if ( count < 1 ):
+            count = 1
+        return count
+
+    # Hold one speed
+    def step(self, speed: int, ms: int):
+        self.segments.append((self.STEP, self.ticks(ms), speed))
+
+    # Change speed in a straight line, ending on toSpeed
+    def ramp(self, fromSpeed: int, toSpeed: int, ms: int):
+        self.segments.append((self.RAMP, self.ticks(ms), (fromSpeed, toSpeed)))
+
+    # A sine wave around a center speed
+    #
+    # @param center     Speed at the middle of the wave
+    # @param amplitude  Largest change from the center speed
+    # @param periodMs   Time for one cycle
+    # @param ms         Length of the segment
+    def sine(self, center: int, amplitude: int, periodMs: int, ms: int):
+        self.segments.append((self.SINE, self.ticks(ms), (center, amplitude, self.ticks(periodMs))))
+
+    # Any sequence of speeds, each held for ticksEach ticks
+    def custom(self, speeds, ticksEach=1):
+        self.segments.append((self.CUSTOM, len(speeds) * ticksEach, (list(speeds), ticksEach)))
+
+    # Returns the number of ticks in the whole profile
+    def length(self):
+        return sum(segment[1] for segment in self.segments)
+
+    # Returns the length of the whole profile in milliseconds
+    def durationMs(self):
+        return self.length() * 1000 // self.tickHz
+
+    # Work out the speed for every tick.
+    #
+    # Returns an array('i') with one signed speed per tick, limited to +/- FULL.
+    def build(self):
+        table = array("i", bytearray(4 * self.length()))
+        index = 0
+        for kind, count, args in self.segments:
+            for tick in range(count):
+                if ( kind == self.STEP ):
+                    speed = args
+                elif ( kind == self.RAMP ):
+                    fromSpeed, toSpeed = args
+                    speed = fromSpeed + (toSpeed - fromSpeed) * (tick + 1) // count
+                elif ( kind == self.SINE ):
+                    center, amplitude, period = args
+                    speed = center + int(amplitude * math.sin(2 * math.pi * tick / period))
+                else:
+                    speeds, ticksEach = args
+                    speed = speeds[tick // ticksEach]
+
+                if ( speed > self.FULL ):
+                    speed = self.FULL
+                elif ( speed < -self.FULL ):
+                    speed = -self.FULL
+                table[index] = speed
+                index += 1
+
+        return table
+
+    #
+    # End of MotorProfile class
+    #
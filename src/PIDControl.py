@@ -0,0 +1,73 @@
+# Class for a fixed point PID controller.
+#
+# The gains are integers scaled by 2**SHIFT, so a gain of 1.0 is 256.  All of
+# the arithmetic is done on small integers, so update() is quick and does not
+# allocate, and it can run from a timer interrupt.
+#
+# The controller runs at a fixed rate, so the integral and derivative gains are
+# per update rather than per second.  The derivative is taken on the measured
+# value rather than on the error, so a step in the setpoint does not kick the
+# output.  The integral is clamped to plus or minus the output span so it cannot
+# wind up while the output is saturated, but can still take away from the feed
+# forward.  An optional feed forward gain adds a part of
+# the output that is proportional to the setpoint.
+#
+
+class PIDControl:
+    """Fixed point PID controller with feed forward and anti-windup."""
+
+    SHIFT = 8
+    ONE   = 1 << SHIFT
+
+    # Constructor
+    #
+    # @param kp       Proportional gain, scaled by ONE
+    # @param ki       Integral gain per update, scaled by ONE
+    # @param kd       Derivative gain per update, scaled by ONE
+    # @param kff      Feed forward gain, scaled by ONE
+    # @param outMin   Smallest output
+    # @param outMax   Largest output
+    def __init__(self, kp: int, ki=0, kd=0, kff=0, outMin=0, outMax=65535):
+        self.kp     = kp
+        self.ki     = ki
+        self.kd     = kd
+        self.kff    = kff
+        self.outMin = outMin
+        self.outMax = outMax
+        self.reset()
+
+    # Clear the integral and derivative history, e.g. when the motor changes direction
+    def reset(self):
+        self.integral     = 0
+        self.lastMeasured = 0
+        self.output       = 0
+
+    # Run one update of the controller.
+    #
+    # Returns the new output.
+    def update(self, setpoint: int, measured: int):
+        error = setpoint - measured
+
+        integral = self.integral + error * self.ki
+        limit    = (self.outMax - self.outMin) << self.SHIFT
+        if ( integral > limit ):
+            integral = limit
+        elif ( integral < -limit ):
+            integral = -limit
+        self.integral = integral
+
+        derivative        = measured - self.lastMeasured
+        self.lastMeasured = measured
+
+        output = (error * self.kp + integral - derivative * self.kd + setpoint * self.kff) >> self.SHIFT
+        if ( output > self.outMax ):
+            output = self.outMax
+        elif ( output < self.outMin ):
+            output = self.outMin
+
+        self.output = output
+        return output
+
+    #
+    # End of PIDControl class
+    #
@@ -0,0 +1,144 @@
+# Class for filtering the readings of a single potentiometer.
+#
+# The potentiometer readings wander by a few hundred counts even when the
+# knob is not being turned, and now and then a reading is far off.  Each call
+# to sample() oversamples the ADC, averages the readings into one value and
+# stores it in a ring buffer.  The ring buffer is filtered, with either a
+# median or an IIR (exponential average) filter, and the result only becomes
+# the published, stable, value when it moves further than the hysteresis band
+# away from the last published value.
+#
+# All of the buffers are allocated in the constructor so sample() does not
+# allocate and can run from a timer.
+#
+
+from array import array
+from micropython import const
+
+# Set to 1 to compile in the latency probes.  See LatencyProbe.py.
+PROBES = const(0)
+
+class PotFilter:
+    """Oversampled, filtered and hysteresis limited reading of one potentiometer."""
+
+    # Filter modes
+    MEDIAN = 0
+    IIR    = 1
+
+    # Constructor
+    #
+    # @param adc         The ADC object the potentiometer is connected to
+    # @param size        Number of entries in the ring buffer, the median window.
+    #                    An odd number gives a true median.
+    # @param oversample  Number of ADC reads averaged into each ring buffer entry
+    # @param mode        PotFilter.MEDIAN or PotFilter.IIR
+    # @param iirShift    IIR smoothing: each new value moves the output 1/2**iirShift
+    #                    of the way to it
+    # @param hysteresis  The published value only changes when the filtered value
+    #                    moves more than this many counts away from it
+    def __init__(self, adc, size=5, oversample=4, mode=MEDIAN, iirShift=2, hysteresis=1000):
+        if ( size < 1 or oversample < 1 ):
+            raise ValueError("PotFilter Constructor: size and oversample must be at least 1")
+
+        self.adc        = adc
+        self.size       = size
+        self.oversample = oversample
+        self.mode       = mode
+        self.iirShift   = iirShift
+        self.hysteresis = hysteresis
+
+        self.ring     = array('H', [0] * size)
+        self.scratch  = array('H', [0] * size)  # Work space for the median
+        self.index    = 0
+        self.iirValue = 0                       # IIR output with 4 extra fraction bits
+        self.filtered = 0
+        self.stable   = 0
+        self.primed   = False
+
+        if ( PROBES ):
+            from LatencyProbe import probe
+            self.adcProbe = probe("adc read")
+
+    # Returns the published, stable, potentiometer value
+    def value(self):
+        return self.stable
+
+    # Returns the latest filtered value, before the hysteresis is applied
+    def filteredValue(self):
+        return self.filtered
+
+    # Read the ADC oversample times and return the average
+    def readAverage(self):
+        if ( PROBES ):
+            self.adcProbe.start()
+        total = 0
+        for n in range(self.oversample):
+            total += self.adc.read_u16()
+        if ( PROBES ):
+            self.adcProbe.stop()
+        return total // self.oversample
+
+    # Returns the median of the ring buffer, sorting a copy in the scratch buffer
+    def median(self):
+        ring    = self.ring
+        scratch = self.scratch
+        size    = self.size
+
+        # Insertion sort; the ring buffer is only a handful of entries long
+        for i in range(size):
+            value = ring[i]
+            j = i
+            while ( j > 0 and scratch[j - 1] > value ):
+                scratch[j] = scratch[j - 1]
+                j -= 1
+            scratch[j] = value
+        return scratch[size >> 1]
+
+    # Start the filter again, so the next reading fills the ring buffer and is
+    # published straight away.  Used after the Pico wakes up from a sleep, when
+    # the readings in the ring buffer are out of date.
+    def restart(self):
+        self.primed = False
+
+    # Take one sample and update the filtered and published values.
+    #
+    # Returns True if the published value changed.
+    def sample(self):
+        return self.addReading(self.readAverage())
+
+    # Update the filtered and published values with a reading taken elsewhere,
+    # e.g. the average of a block from AdcCapture, scaled to [0..65535].
+    #
+    # Returns True if the published value changed.
+    def addReading(self, reading: int):
+        if ( not self.primed ):
+            # First sample: fill the filter so it starts at the current position
+            for i in range(self.size):
+                self.ring[i] = reading
+            self.iirValue = reading << 4
+            self.filtered = reading
+            self.stable   = reading
+            self.primed   = True
+            return True
+
+        self.ring[self.index] = reading
+        self.index += 1
+        if ( self.index >= self.size ):
+            self.index = 0
+
+        if ( self.mode == self.IIR ):
+            self.iirValue += ((reading << 4) - self.iirValue) >> self.iirShift
+            self.filtered  = self.iirValue >> 4
+        else:
+            self.filtered = self.median()
+
+        if ( self.filtered > self.stable + self.hysteresis or
+             self.filtered < self.stable - self.hysteresis ):
+            self.stable = self.filtered
+            return True
+
+        return False
+
+    #
+    # End of PotFilter class
+    #
@@ -0,0 +1,128 @@
+# Class for playing precomputed motor profiles through a MotorControl object.
+#
+# Each motor gets a table of signed speeds, one per tick, built by
+# MotorProfile.  A timer calls tick() at the profile rate, and each tick only
+# moves an index on by one and sets each motor to the next speed in its table.
+# TTMotor skips writes that do not change anything, so a held speed costs no
+# pin writes.  As the tables are worked out before the test starts, a profile
+# plays back the same way on every run.
+#
+# The motors follow the profile exactly, so ramping should be off while a
+# profile plays.  Use MotorProfile.ramp() to shape speed changes instead.
+#
+
+from machine import Timer
+
+class ProfilePlayer:
+    """Plays tables of signed motor speeds back at a fixed tick rate."""
+
+    # Constructor
+    #
+    # @param motorControl  MotorControl object whose motors play the profiles
+    # @param tickHz        Ticks per second; must match the MotorProfile tick rate
+    def __init__(self, motorControl, tickHz=100):
+        self.motorControl = motorControl
+        self.tickHz       = tickHz
+        self.motors       = []      # Motors with a table, in the same order as tables
+        self.tables       = []
+        self.length       = 0
+        self.index        = 0
+        self.loop         = False
+        self.running      = False
+        self.loops        = 0       # Number of times the profile has wrapped around
+
+        self.timer        = None
+        self.timerHandler = self.timerTick   # Bound once so the timer does not allocate
+
+    # Set the table for the motor a GPIO pin is bound to.  See MotorControl.bindPin().
+    #
+    # The profile is as long as its longest table.  Motors with a shorter table
+    # hold their last speed until the end of the profile.
+    def load(self, gpio: int, table):
+        motor = self.motorControl.motorFor(gpio)
+        if ( motor == None ):
+            raise ValueError("ProfilePlayer.load: No motor bound to GPIO %d" % gpio)
+        if ( len(table) == 0 ):
+            raise ValueError("ProfilePlayer.load: Empty table")
+
+        if ( motor in self.motors ):
+            self.tables[self.motors.index(motor)] = table
+        else:
+            self.motors.append(motor)
+            self.tables.append(table)
+        self.length = max(len(table) for table in self.tables)
+
+    # Remove every table
+    def clear(self):
+        self.stop()
+        self.motors = []
+        self.tables = []
+        self.length = 0
+
+    # Start playing from the beginning
+    #
+    # @param loop    If True, start again from the beginning at the end of the
+    #                profile, otherwise stop the motors at the end
+    # @param timer   If False, no timer is started and the caller calls tick()
+    def start(self, loop=False, timer=True):
+        self.index   = 0
+        self.loop    = loop
+        self.loops   = 0
+        self.running = self.length > 0
+        if ( self.running and timer ):
+            if ( self.timer == None ):
+                self.timer = Timer()
+            self.timer.init(mode=Timer.PERIODIC, freq=self.tickHz, callback=self.timerHandler)
+
+    # Stop playing
+    #
+    # @param stopMotors  If True, the motors with a table are stopped
+    def stop(self, stopMotors=True):
+        self.running = False
+        if ( self.timer != None ):
+            self.timer.deinit()
+        if ( stopMotors ):
+            for motor in self.motors:
+                motor.setSpeed(0)
+            if ( self.motorControl.batched ):
+                self.motorControl.writePins()
+            self.motorControl.updateStandby()
+
+    def isRunning(self):
+        return self.running
+
+    # Set every motor to its speed for the next tick
+    #
+    # Returns False once the profile has ended.
+    def tick(self):
+        if ( not self.running ):
+            return False
+
+        index = self.index
+        if ( index >= self.length ):
+            if ( not self.loop ):
+                self.stop()
+                return False
+            index = 0
+            self.loops += 1
+
+        tables = self.tables
+        motors = self.motors
+        for n in range(len(motors)):
+            table = tables[n]
+            if ( index < len(table) ):
+                motors[n].setSpeed(table[index])
+        if ( self.motorControl.batched ):
+            self.motorControl.writePins()
+        self.motorControl.updateStandby()
+
+        self.index = index + 1
+        return True
+
+    # Timer Interrupt Handler: play one tick
+    def timerTick(self, timer):
+        self.tick()
+
+    #
+    # End of ProfilePlayer class
+    #
@@ -10,18 +10,38 @@
 # a single motor so the A and B labels are ignored.  See the MotorControl class 
 # for dealing with both motors and the Standby Pin.
 
-from machine import Pin, PWM
+from machine import Pin, PWM, Timer
+from micropython import const
+
+# Set to 1 to compile in the latency probes.  See LatencyProbe.py.
+PROBES = const(0)
+
+# Constants that denote motor direction.  const() only works at the top level
+# of a module, where the compiler puts the number itself in the code that uses
+# it instead of looking up a name.  A leading underscore keeps the name out of
+# the module's dictionary too.  Please do no change these values.
+_STOPPED          = const(0)
+_FORWARD          = const(1)
+_BACKWARD         = const(2)
+
+# What the H-Bridge does with a STOPPED motor.  See TTMotor.setStopMode().
+# Without the underscore these stay in the module's dictionary, so MotorControl
+# can import them.
+STOP_COAST       = const(0)     # IN1 = IN2 = LOW: the motor spins down on its own
+STOP_BRAKE       = const(1)     # IN1 = IN2 = HIGH: short brake, the motor's windings are shorted
+STOP_BRAKE_COAST = const(2)     # Short brake for brakeMs, then coast
+STOP_STANDBY     = const(3)     # Coast, and MotorControl puts the module in standby once every motor is stopped
 
 # This class represents the part of the Dual H-Bridge module.
 class TTMotor:
     """A Class that contains the state of a DC Motor, primarily for TT Gearbox Motors"""
 
-    # Constants that denote motor direction.
-    # Should be constants but Python const() does not appear to work in MicroPython
-    # Please do no change these variables.
-    STOPPED   = 0
-    FORWARD   = 1
-    BACKWARD  = 2
+    # The constants for the code using this class, e.g. TTMotor.FORWARD or
+    # motor.FORWARD.  The methods use the module constants, which cost nothing
+    # to look up.  The stop modes are added after the class.
+    STOPPED          = _STOPPED
+    FORWARD          = _FORWARD
+    BACKWARD         = _BACKWARD
 
     # Default Constructor
     #    Current Direction is none or STOPPED
@@ -33,14 +53,25 @@ class TTMotor:
     #                   conjunction with gpioIN2
     # @param  gpioIN2   The GPIO Pin Number used to determine direction of motor in
     #                    conjunction with gpioIN1
+    # @param  freq      PWM frequency in Hz, see setFrequency()
     #
-    def __init__(self, gpioPWM: int, gpioIN1: int, gpioIN2: int ):
+    def __init__(self, gpioPWM: int, gpioIN1: int, gpioIN2: int, freq=10000 ):
         self.gpioPWM = gpioPWM
         self.gpioIN1 = gpioIN1
         self.gpioIN2 = gpioIN2
+        self.pwmFreq = freq
         self.motorSpeed  = 0
         self.IN1Value = False
         self.IN2Value = False
+        self.dutyValue = 0
+
+        # Bit masks of the IN1 and IN2 pins in the RP2040 GPIO registers, used
+        # by MotorControl to write the direction pins of all motors at once.
+        # When batched is True, writeOutput() leaves the direction pins to
+        # MotorControl.
+        self.in1Mask = 1 << gpioIN1
+        self.in2Mask = 1 << gpioIN2
+        self.batched = False
 
         if ( gpioPWM < 0 ):
             # Invalid value
@@ -50,7 +81,7 @@ class TTMotor:
             self.pinPWM = Pin(gpioPWM, mode=Pin.OUT)
 
             self.pwmPin = PWM(self.pinPWM)
-            self.pwmPin.freq(10000)  # 10kHz
+            self.pwmPin.freq(freq)
             self.pwmPin.duty_u16(0)  # off
 
             # Initialize the two signal input pins
@@ -60,8 +91,38 @@ class TTMotor:
             self.in1.low()
             self.in2.low()
 
-        self.currentDirection  = self.STOPPED
-        self.previousDirection = self.BACKWARD
+        self.currentDirection  = _STOPPED
+        self.previousDirection = _BACKWARD
+
+        # Ramping.  The output is a signed duty: positive is FORWARD, negative
+        # is BACKWARD.  With a ramp rate of 0, motorControl() writes the new
+        # speed straight away.  Otherwise it only sets the target, and rampTick()
+        # moves the output towards it.
+        self.rampRate  = 0      # Largest change in duty per tick
+        self.rampJerk  = 0      # S-curve: change in the step size per tick, 0 is a linear ramp
+        self.rampStep  = 0      # Step size used on the last tick
+        self.output    = 0      # Signed duty being written to the H-Bridge
+        self.target    = 0      # Signed duty being ramped towards
+
+        # Closed loop speed control, see attachEncoder().  The target RPM is signed
+        # the same way as the output.
+        self.encoder        = None
+        self.pid            = None
+        self.maxRpm         = 0
+        self.stopRpm        = 0
+        self.targetRpm      = 0
+        self.driveDirection = _STOPPED
+
+        # Stop mode, see setStopMode()
+        self.stopMode     = STOP_COAST
+        self.brakeMs      = 0
+        self.braking      = False   # True if the next stop should brake
+        self.brakeTimer   = None
+        self.brakeHandler = self.brakeEnd   # Bound once so the timer does not allocate
+
+        if ( PROBES ):
+            from LatencyProbe import probe
+            self.pressProbe = probe("button to motor")
 
  
     # Determine if Pin ID is one of the GPIO Pins associated with this motor
@@ -73,6 +134,36 @@ class TTMotor:
         
 
 
+    # Returns the RP2040 PWM slice of the PWM pin.  Both channels of a slice,
+    # the even and the odd GPIO Pin, always run at the same frequency.
+    def pwmSlice(self):
+        return (self.gpioPWM >> 1) & 7
+
+    # Returns the channel of the PWM pin in its slice: 0 for A, 1 for B
+    def pwmChannel(self):
+        return self.gpioPWM & 1
+
+    # Set the PWM frequency.
+    #
+    # A low frequency gives more torque at low speed but whines, and loses
+    # power in the motor's windings to the current ripple.  A high frequency
+    # is quiet but loses more in the H-Bridge switching.  The best one differs
+    # from motor to motor; see FrequencySweep.
+    #
+    # On the RP2040 this also changes the frequency of the other pin of the same
+    # PWM slice.  Use MotorControl.setFrequency(), which checks for that.
+    #
+    # @param freq  Frequency in Hz.  The TB6612FNG switches up to 100kHz.
+    def setFrequency(self, freq: int):
+        self.pwmFreq = freq
+        self.pwmPin.freq(freq)
+        # Older MicroPython releases do not keep the duty when the frequency changes
+        self.pwmPin.duty_u16(self.dutyValue)
+
+    # Returns the PWM frequency in Hz
+    def frequency(self):
+        return self.pwmFreq
+
     # Return the configured GPIO Pin object
     def pwm(self):
         return self.gpioPWM
@@ -106,66 +197,315 @@ class TTMotor:
     # The the toggle sequence is FORWARD --> STOPPED --> BACKWARD --> STOPPED --> repeat
     # So the next direction refers to the next N0N-Stopped direction.
     def nextDirection(self):
-        if ( self.previousDirection == self.BACKWARD ):
-            return self.FORWARD
+        if ( self.previousDirection == _BACKWARD ):
+            return _FORWARD
         else:
             # all other values for Previous Direction leads to 
-            return self.BACKWARD
+            return _BACKWARD
 
     # Change direction based on the last none-stopped direction
     # Toggle Cycle:  FORWARD --> STOPPED --> BACKWARD --> STOPPED --> repeat
     def toggleDirection(self):
-        if ( self.currentDirection == self.STOPPED ):
+        if ( self.currentDirection == _STOPPED ):
             # If currect direction is STOPPED, use the previous (non-STOPPED) direction
             # to determine the new current direction.
-            if ( self.previousDirection == self.BACKWARD ):
-                self.currentDirection = self.FORWARD
+            if ( self.previousDirection == _BACKWARD ):
+                self.currentDirection = _FORWARD
             else:
-                self.currentDirection = self.BACKWARD
+                self.currentDirection = _BACKWARD
         else:
             # If current direction is FORWARD or BACKWARD, new current direction is STOPPED
             # and new previous direction is set to the old current direction
             self.previousDirection = self.currentDirection
-            self.currentDirection  = self.STOPPED
+            self.currentDirection  = _STOPPED
+
+    # Set the direction and speed from one signed speed: positive is FORWARD,
+    # negative is BACKWARD and 0 is STOPPED.  Used by profiles, which give the
+    # direction along with the speed.  Nothing is allocated.
+    def setSpeed(self, speed: int):
+        if ( speed > 0 ):
+            self.currentDirection = _FORWARD
+        elif ( speed < 0 ):
+            self.currentDirection = _BACKWARD
+            speed = -speed
+        else:
+            if ( self.currentDirection != _STOPPED ):
+                self.previousDirection = self.currentDirection
+            self.currentDirection = _STOPPED
+
+        if ( speed > 0xFFFF ):
+            speed = 0xFFFF
+        self.motorControl(speed)
+
+    # Set the direction and keep the speed.  Used by remote commands, which can
+    # set a direction without a speed.
+    #
+    # @param speed  New speed to set along with the direction, or -1 to keep it
+    def setDirection(self, direction: int, speed=-1):
+        if ( direction == _STOPPED and self.currentDirection != _STOPPED ):
+            self.previousDirection = self.currentDirection
+        self.currentDirection = direction
+        if ( speed < 0 ):
+            speed = self.motorSpeed
+        self.motorControl(speed)
+
+    # Set what the H-Bridge does when the motor is STOPPED.
+    #
+    # Coasting lets the motor spin down slowly.  A short brake stops it many
+    # times faster, but holds the windings shorted for as long as the motor is
+    # stopped.  STOP_BRAKE_COAST brakes for brakeMs and then lets go.  With
+    # ramping on, the motor is ramped down first and the stop mode only applies
+    # once the duty reaches 0.
+    #
+    # @param mode     STOP_COAST, STOP_BRAKE, STOP_BRAKE_COAST or STOP_STANDBY
+    # @param brakeMs  Time to brake for with STOP_BRAKE_COAST
+    def setStopMode(self, mode: int, brakeMs=100):
+        self.stopMode = mode
+        self.brakeMs  = brakeMs
+        self.braking  = False
+        if ( mode == STOP_BRAKE_COAST and self.brakeTimer == None ):
+            self.brakeTimer = Timer()
+
+    # Returns True if the motor is STOPPED and nothing is being written to it
+    def isStopped(self):
+        return self.target == 0 and self.dutyValue == 0
+
+    # Timer Handler for the end of a STOP_BRAKE_COAST brake: let the motor coast.
+    #
+    # The pins are written straight away even in batched mode, as only this
+    # motor changes.
+    def brakeEnd(self, timer):
+        if ( self.braking and self.IN1Value and self.IN2Value ):
+            self.braking  = False
+            self.IN1Value = False
+            self.IN2Value = False
+            self.in1.off()
+            self.in2.off()
+
+    # Turn on closed loop speed control.
+    #
+    # The speed passed to motorControl() then sets a target RPM, with 65535 being
+    # maxRpm, and controlTick() uses the PID controller to set the duty that holds
+    # the encoder RPM at the target.  Ramping is not used in closed loop.
+    #
+    # @param encoder  Encoder object for this motor
+    # @param pid      PIDControl object, whose output is the duty
+    # @param maxRpm   Target RPM for a speed of 65535
+    # @param stopRpm  On a change of direction, the motor coasts until the RPM is at
+    #                 or below this before it is driven the other way
+    def attachEncoder(self, encoder, pid, maxRpm: int, stopRpm=5):
+        self.encoder        = encoder
+        self.pid            = pid
+        self.maxRpm         = maxRpm
+        self.stopRpm        = stopRpm
+        self.driveDirection = _STOPPED
+        pid.reset()
+
+    # Returns True if closed loop speed control is on
+    def isClosedLoop(self):
+        return self.encoder != None
+
+    # Returns the measured RPM, or 0 if there is no encoder
+    def rpm(self):
+        if ( self.encoder == None ):
+            return 0
+        return self.encoder.rpm()
+
+    # Run one closed loop control update.  Called from a timer at a fixed rate.
+    #
+    # Only integer arithmetic is used so nothing is allocated.
+    def controlTick(self):
+        if ( self.encoder == None ):
+            return
+
+        rpm    = self.encoder.update()
+        target = self.targetRpm
+        if ( target > 0 ):
+            wanted = _FORWARD
+        elif ( target < 0 ):
+            wanted = _BACKWARD
+            target = -target
+        else:
+            wanted = _STOPPED
+
+        if ( wanted != self.driveDirection ):
+            # Let the motor run down before driving it the other way.  The encoder
+            # does not give the direction, so this is judged on speed alone.
+            if ( rpm > self.stopRpm ):
+                self.writeOutput(_STOPPED, 0)
+                return
+            self.driveDirection = wanted
+            self.pid.reset()
+
+        if ( wanted == _STOPPED ):
+            self.writeOutput(_STOPPED, 0)
+        else:
+            self.writeOutput(wanted, self.pid.update(target, rpm))
+
+    # Set the ramp rate used by motorControl() and rampTick()
+    #
+    # @param rate   Largest change in duty per tick, 0 to turn ramping off
+    # @param jerk   If greater than 0, the step size grows by this much per tick up to
+    #               rate, and shrinks again approaching the target, giving an S-curve
+    def setRamp(self, rate: int, jerk=0):
+        self.rampRate = rate
+        self.rampJerk = jerk
+        self.rampStep = 0
+
+    # Returns True if the output has not reached the target yet
+    def isRamping(self):
+        return self.output != self.target
 
     # Set actual Motor Speed and Direction
     #
     # This function actually writes to the Dual H-Bridge module, hence causing the motors to 
-    # turn or to stop.
+    # turn or to stop.  If ramping is on, it only sets the target and rampTick() does the
+    # writing.  In closed loop, it sets the target RPM and controlTick() does the writing.
     def  motorControl( self, speed ):
-        signal1 = False
-        signal2 = False
-
         # Set Motor Speed to the passed value which may not match the zero speed of STOPPED
         # but it does match the Potentiometer that determines the moving speeds.
         self.motorSpeed = speed
 
         #print("Current Direction = ", self.currentDirection)
-        if ( self.currentDirection == self.FORWARD ):
+        if ( self.currentDirection == _FORWARD ):
+            self.target = speed
+        elif ( self.currentDirection == _BACKWARD ):
+            self.target = -speed
+        else:
+            self.target = 0
+
+        if ( self.encoder != None ):
+            # Closed loop: controlTick() does the writing
+            self.targetRpm = (self.target * self.maxRpm) // 65535
+        elif ( self.rampRate <= 0 ):
+            self.output = self.target
+            self.writeOutput(self.currentDirection, speed)
+
+        # End of MotorControl()
+
+    # Move the output one step towards the target.
+    #
+    # Called from a timer at a fixed rate.  A change of direction ramps down to zero,
+    # spends one tick stopped, then ramps up the other way.  Only integer arithmetic
+    # is used so nothing is allocated.
+    #
+    # Returns True if the output has not reached the target yet.
+    def rampTick(self):
+        if ( self.encoder != None ):
+            return False
+
+        output = self.output
+        error  = self.target - output
+        if ( error == 0 ):
+            self.rampStep = 0
+            return False
+
+        distance = error if error > 0 else -error
+        step     = self.rampRate
+        jerk     = self.rampJerk
+        if ( jerk > 0 ):
+            # S-curve: speed the step up by jerk per tick, but slow it down again
+            # once the distance left is what it takes to bring the step back to zero.
+            step = self.rampStep + jerk
+            if ( (step * (step + jerk)) // (2 * jerk) >= distance ):
+                step = self.rampStep - jerk
+                if ( step < jerk ):
+                    step = jerk
+            if ( step > self.rampRate ):
+                step = self.rampRate
+            self.rampStep = step
+
+        if ( distance <= step ):
+            newOutput = self.target
+        elif ( error > 0 ):
+            newOutput = output + step
+        else:
+            newOutput = output - step
+
+        # Reversing: stop at zero for one tick instead of jumping across it
+        if ( (output > 0 and newOutput < 0) or (output < 0 and newOutput > 0) ):
+            newOutput = 0
+
+        self.output = newOutput
+        if ( newOutput > 0 ):
+            self.writeOutput(_FORWARD, newOutput)
+        elif ( newOutput < 0 ):
+            self.writeOutput(_BACKWARD, -newOutput)
+        else:
+            self.writeOutput(_STOPPED, 0)
+
+        return newOutput != self.target
+
+    # Write a direction and duty to the H-Bridge
+    #
+    # IN1Value, IN2Value and dutyValue hold what was last written, so outputs that
+    # have not changed are not written again.  In batched mode the direction pins
+    # are only recorded in IN1Value and IN2Value, and MotorControl writes them for
+    # all of the motors together.
+    def writeOutput( self, direction, duty ):
+        signal1 = False
+        signal2 = False
+
+        if ( direction == _FORWARD ):
             signal2 = True
-        elif ( self.currentDirection == self.BACKWARD ):
+        elif ( direction == _BACKWARD ):
             signal1 = True
         else:
-            speed = 0
+            duty = 0
+
+        stopMode = self.stopMode
+        if ( stopMode == STOP_BRAKE_COAST ):
+            if ( signal1 or signal2 ):
+                # Brake the next time the motor stops
+                self.braking = True
+            elif ( self.braking ):
+                signal1 = True
+                signal2 = True
+                if ( not (self.IN1Value and self.IN2Value) ):
+                    self.brakeTimer.init(mode=Timer.ONE_SHOT, period=self.brakeMs, callback=self.brakeHandler)
+        elif ( stopMode == STOP_BRAKE and direction == _STOPPED ):
+            signal1 = True
+            signal2 = True
 
         # Set Direction: STOPPED, FORWARD, or BACKWARD
-        self.IN1Value = signal1
-        if ( signal1 ):
-            self.in1.on()
-        else:
-            self.in1.off()
+        if ( signal1 != self.IN1Value ):
+            self.IN1Value = signal1
+            if ( not self.batched ):
+                if ( signal1 ):
+                    self.in1.on()
+                else:
+                    self.in1.off()
+                if ( PROBES ):
+                    self.pressProbe.stop()
 
-        self.IN2Value = signal2
-        if ( signal2 ):
-            self.in2.on()
-        else:
-            self.in2.off()
+        if ( signal2 != self.IN2Value ):
+            self.IN2Value = signal2
+            if ( not self.batched ):
+                if ( signal2 ):
+                    self.in2.on()
+                else:
+                    self.in2.off()
+                if ( PROBES ):
+                    self.pressProbe.stop()
 
         ## Set Speed
-        self.pwmPin.duty_u16(speed)
+        if ( duty != self.dutyValue ):
+            self.dutyValue = duty
+            self.pwmPin.duty_u16(duty)
+            if ( PROBES ):
+                self.pressProbe.stop()
 
-        # End of MotorControl()
+        # End of writeOutput()
 
 
         
-        
\ No newline at end of file
+        
+
+
+# The stop modes for the code using this class, e.g. TTMotor.STOP_COAST.  They
+# cannot be set in the class body, where the compiler would put the numbers in
+# place of the names being assigned.
+TTMotor.STOP_COAST       = STOP_COAST
+TTMotor.STOP_BRAKE       = STOP_BRAKE
+TTMotor.STOP_BRAKE_COAST = STOP_BRAKE_COAST
+TTMotor.STOP_STANDBY     = STOP_STANDBY
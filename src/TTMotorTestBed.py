@@ -18,20 +18,68 @@
 from machine import ADC
 from machine import Pin
 from machine import PWM
+from machine import Timer
+from machine import idle
 
+import gc
+import sys
 import utime
+import _thread
+
+# Start of the start up, before the modules below are loaded.  See startupReport.
+startUs = utime.ticks_us()
+
+from array import array
 
 # The emergency exception buffer is for use is any Exceptions are thrown.  This provides pre-allocated space
 # and allows interrupt handlers to throw exceptions.
 import micropython
 micropython.alloc_emergency_exception_buf(128)
 
+from micropython import const
+
+# Set to 1 to compile in the latency probes of this program.  The modules each
+# have their own PROBES constant.  See LatencyProbe.py.
+PROBES = const(0)
+
 from TTMotor      import TTMotor
 from MotorControl import MotorControl
 from ButtonInfo   import ButtonInfo
+from PotFilter    import PotFilter
+from Telemetry    import Telemetry
+from Encoder      import Encoder
+from PIDControl   import PIDControl
+from MotorProfile  import MotorProfile
+from ProfilePlayer import ProfilePlayer
+from Mailbox       import Mailbox
+from MotorCalibration import MotorCalibration, saveCalibrations, loadCalibrations
+from AdcCapture    import AdcCapture
+from CommandProtocol import CommandProtocol
+from IdleManager   import IdleManager
+from Logger        import Logger
+from FrequencySweep import FrequencySweep
 
 print("Running TTMotorTestBed --")
 
+# Logging.  The messages from the event handlers are kept by a Logger and
+# written out by the main loop, so a slow USB host does not hold up the motor
+# updates.  With logDirect True they are printed straight away instead, the
+# way print() does.  Messages below logLevel are not kept.
+logSlots  = 64
+logLevel  = Logger.INFO
+logDirect = False
+
+logger = Logger(slots=logSlots, level=logLevel, direct=logDirect)
+MSG_CHANGE          = logger.message("Change Speed or Direction")
+MSG_BUTTON          = logger.message("Button Pushed: Pin: %d, Direction = %d")
+MSG_PROFILE_STARTED = logger.message("Profile Started")
+MSG_PROFILE_STOPPED = logger.message("Profile Stopped")
+MSG_STATUS          = logger.message("Status: A: %d %d %d  B: %d %d %d")
+
+if ( PROBES ):
+    from LatencyProbe import probe, dumpProbes
+    periodProbe = probe("pot sample period")
+
 ## Defining GPIO Pins used 
 
 gpioPWA   = 4
@@ -53,6 +101,15 @@ gpioPotB = 26
 
 gpioLED  = 25
 
+# Optional speed encoders, one per motor.  -1 means no encoder is fitted and
+# the motor runs open loop.
+gpioEncA = -1
+gpioEncB = -1
+
+# Optional current sense amplifier on the battery line, on the third ADC pin,
+# GPIO 28.  -1 means there is none.  Used by the frequency sweep.
+gpioCurrent = -1
+
 ## Initialize Pins
 
 #print("Initializing Button Pins")
@@ -73,197 +130,675 @@ potB = ADC(pinPotB)
 pinLED = Pin(gpioLED, mode=Pin.OUT)
 pinLED.on()
 
-# There is no general way to obtain the ID used to create a Pin object
-# after it has been created.  The following is a HACK, that assumes that
-# when a Pin object is converted to a string "Pin(xx, yy==zz, gg=pp)"
-# that the first parameter after the "(" starts in offset [4] and 
-# ends with a comma.
-def getPinID( pin: Pin ):
-    pinString = str(pin)
-    pinData   = pinString[4:-1].split(",")
-    return int(pinData[0])
-    # End of getPinID()
-
-# Determine which motor based on its GPIO Pin for the PWM signal based
-# on the Button or Potentiometer Pin.
-def whichPWM( pin: Pin ):
-    pinID = getPinID(pin)
-    if ( pinID == gpioPotA or pinID == gpioButtonA ):
-        return gpioPWA
-    elif ( pinID == gpioPotB or pinID == gpioButtonB ):
-        return gpioPWB
-    else:
-        return -1
-    # End of whichPWM()
-
-
 ## Initialize Motor Data
 
+# PWM frequency of each motor, in Hz.  Both pins of an RP2040 PWM slice, e.g.
+# GPIO 4 and 5, run at one frequency, so two motors on one slice must use the
+# same one, or MotorControl stops the program with an error.  A frequency
+# found by the frequency sweep and saved in calibrationFile is used instead.
+pwmFreqA = 10000
+pwmFreqB = 10000
+
 #print("Initializing Motor Objects")
-motorA = TTMotor(gpioPWA, gpioAN1, gpioAN2)
-motorB = TTMotor(gpioPWB, gpioBN1, gpioBN2)
+motorA = TTMotor(gpioPWA, gpioAN1, gpioAN2, freq=pwmFreqA)
+motorB = TTMotor(gpioPWB, gpioBN1, gpioBN2, freq=pwmFreqB)
 
 motorControl = MotorControl(gpioStandby, motorA, motorB)
 
+# Write the direction pins of both motors with one register write, so both
+# H-Bridge channels switch at the same time.
+motorControl.setBatched(True)
+
+# Bind the buttons and potentiometers to their motors once, here, so that the
+# interrupt handlers and scheduled events never have to work out which motor a
+# pin belongs to.
+motorControl.bindPin(gpioButtonA, gpioPWA)
+motorControl.bindPin(gpioPotA,    gpioPWA)
+motorControl.bindPin(gpioButtonB, gpioPWB)
+motorControl.bindPin(gpioPotB,    gpioPWB)
+
 ## Initializing Button Data
 
-buttons = { gpioPWA: ButtonInfo( gpioPWA ), gpioPWB: ButtonInfo(gpioPWB)}
+buttons = { gpioButtonA: ButtonInfo( gpioButtonA ), gpioButtonB: ButtonInfo(gpioButtonB)}
 
-# Push Button Pin Debouncing
+# Queue a function to run as soon as the current interrupt handler returns.
 #
-# Watches Button values until it stablizes on the same value
-# for 50ms.  It does not matter whether that value is HIGH or LOW.
+# micropython.schedule() raises RuntimeError when its queue is full.  Dropping the
+# event is safe here: a dropped button event leaves the Change flag set and is
+# picked up by the next button event, and a dropped potentiometer sample is
+# followed by the next one.
+def scheduleEvent( func, arg ):
+    try:
+        micropython.schedule(func, arg)
+    except RuntimeError:
+        pass
+
+# Write the current filtered potentiometer speeds and motor directions to the H-Bridge.
 #
-# Returns the final, stable, Pin value.
-def buttonDebounce( pin: Pin ):
-    curr_value = pin.value()
-    period     = 50 # stable within 50 ms
-
-    active = 0
-    while ( active < period ):
-        if ( pin.value() == curr_value ):
-            # Pin value did not change, increment ms counter
-            active += 1
-        else:
-            # Pin value did change.  Use the new pin value as the
-            # current value.  Reset ms counter to start new period
-            # of watching.
-            active = 0
-            curr_value = pin.value()
-    utime.sleep_ms(1)
-    return curr_value
-    # End of buttonDebounce()
-  
-
-# Interrupt Handler for all Button Events: Being Pressed (Rising Signal) and
-# Being Released (Falling Signal)
-#
-# The handler determines which event occurred by the value of the Button Pin
-# after it has stablized in the buttonDebounce() method.
+# The speeds are the stable values published by the potentiometer filters, so
+# the value written is the same value that was tested in sampleSpeeds().  The
+# calibration lookup tables turn the potentiometer values into duties, and
+# need to know if each motor is STOPPED.
 #
-# If the Button Pin is HIGH, the button has been pressed.  If this is the first
-# occurance of this type of event for a single button push, the Change flag is set
-# to True as well as the Busy flag is set to True.  If this is not the first occurance,
-# as determined by the Busy flag, then the interrupt is ignored and nothing happens.
+# With ramping on, this only sets the new targets and starts the ramp timer.
+def updateMotors():
+    logger.log(Logger.INFO, MSG_CHANGE)
+    motorControl.changeSpeed(frontSpeed=calibrationA.duty(potFilterA.value(), motorA.direction() != TTMotor.STOPPED),
+                             backSpeed=calibrationB.duty(potFilterB.value(), motorB.direction() != TTMotor.STOPPED))
+    startRamp()
+
+# Start the ramp timer if ramping is on and the timer is not already running.
 #
-# If the Button Pin is LOW, the button has been release.  In this case, the
-# Busy flag is cleared and the next Button Pressed event will be considered
-# the first event for that pressing of the button.
-def buttonHandler(pin: Pin):
-    global buttons
-
-    # Let the button stablize before determining if the button was actually released
-    pinValue = buttonDebounce(pin)
-
-    # Determine which pin triggered the interrupt
-    pinID = whichPWM(pin)
-    
-    #print("Button Interrupt: Pin: ", str(pin), ", PWM Pin ID: ", pinID, ", Button Value: ", pinValue)
+# The first step is taken straight away so a button press reaches the motor
+# without waiting for the first timer tick.
+def startRamp():
+    global rampRunning
 
+    if ( rampRate > 0 and not rampRunning ):
+        if ( motorControl.rampTick() ):
+            rampRunning = True
+            rampTimer.init(mode=Timer.PERIODIC, freq=rampHz, callback=rampTimerHandler)
 
-    if ( pinID < 0 ):
-        # Unknown Pin cased the interrupt.  Cannot process this interrupt - IGNORE IT
-        return
- 
-    if ( pinValue > 0 ):
-        # Button High -- Being Pressed
-        # If Busy, we are already processing an interrupt for this pin on a single
-        # button press.  Do not process another one until the button is released.
-        if ( not buttons[pinID].isBusy() ):
-            buttons[pinID].setChange(True)
-            buttons[pinID].setBusy( flag=True )
-            valueStr = "HIGH"  # for debug print statement below
-        else:
-            valueStr = "BUSY"
-    else:
-        # We do not care if multiple interrupts occur when the button is released
-        # so we are skipping checking to see if the button is Busy.
-        buttons[pinID].setBusy(flag=False)
-        valueStr = "LOW"
-   
-    #print("Button Handler: Button: ", str(pin), ", Value: ", valueStr)
-    return
-    # End of buttonHandler()
-
-# Determine if the first value is equal to the second value +/- delta
+# Timer Interrupt Handler for ramping the motors.
 #
-# It turns out that each time the potentiometers are read, their value might
-# change even if the knob is not being turned.  This method compensates for
-# that small variation in readings so that the motor speeds are not changed
-# everytime the potentiometers are read.
-def closeEnough(value1, value2, delta):
-    if ( (value1 >= (value2 - delta)) and (value1 <= (value2 + delta)) ):
-        return True
-    else:
-        return False
+# Moves both motors one step towards their target speeds, and stops the timer
+# once they get there so the Pico is not woken up when nothing is changing.
+def rampTimerHandler( timer ):
+    global rampRunning
 
-    
-# Setting up Interrup Handlers
+    if ( not motorControl.rampTick() ):
+        timer.deinit()
+        rampRunning = False
+
+# Scheduled Event: a button has been pushed.
 #
-# If multiple Interrupt Handlers are assigned to the same Pin for different
-# triggers, only the last one set will run.
+# Runs outside of the interrupt handler, as soon as possible after the button
+# press has been debounced, and toggles the direction of the button's motor.
 #
-# Previously, there were two interrupt handlers; one for rising signal or
-# Pressed Button events and the other for falling signal or Released Button
-# events.  These two interrupt handlers have been rewritten as a single
-# interrupt handler that handles both events.
-
-#print("Initializing Button Interrupt Handlers")
-
-pinButtonA.irq(handler=buttonHandler, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
-pinButtonB.irq(handler=buttonHandler, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
-
-
-print("Starting Infinite Loop")
+# Any other button that was pushed but whose event was dropped is handled too.
+def buttonAction( pinID ):
+    updateFlag = False
 
-myDelta = 1000
+    if ( idleManager != None ):
+        idleManager.touch()
 
-while True:
-    # The update flag will be set to True if either buttons have been pushed
-    # and the toggling of direction will be done in the main code instead of
-    # in the interrupt handler, thus minimizing what the interrupt handler has
-    # to do.
-    #
-    # If this flag is True later in the loop, the Motors will be told to 
-    # change speeds, will will automatically use the new current direction.
-    updateFlag = False
+    if ( calibrating ):
+        # The buttons are being used to calibrate the motors
+        for buttonInfo in buttons.values():
+            buttonInfo.setChange(False)
+        return
 
     for buttonInfo in buttons.values():
         if ( buttonInfo.getChange() ):
             updateFlag = True
-            print("Button Pushed: Pin: ", buttonInfo.pinID())
-            motorControl.toggleDirection(buttonInfo.pinID())
             buttonInfo.setChange(False) 
+            if ( profilePlayer != None ):
+                # Either button starts and stops the profile
+                continue
+            if ( controlCore ):
+                # The control loop on the second core changes the direction
+                commands.put(CMD_TOGGLE, buttonInfo.pinID())
+                updateFlag = False
+                continue
+            direction = motorControl.toggleDirection(buttonInfo.pinID())
+            logger.log(Logger.INFO, MSG_BUTTON, buttonInfo.pinID(), direction)
+
+    if ( updateFlag and profilePlayer != None ):
+        if ( profilePlayer.isRunning() ):
+            logger.log(Logger.INFO, MSG_PROFILE_STOPPED)
+            profilePlayer.stop()
+        else:
+            logger.log(Logger.INFO, MSG_PROFILE_STARTED)
+            profilePlayer.start(loop=profileLoop)
+    elif ( updateFlag ):
+        updateMotors()
+    # End of buttonAction()
 
-    frontSpeed = potA.read_u16()
-    backSpeed  = potB.read_u16()
-
-    if ( updateFlag or 
-        ( not closeEnough(frontSpeed, motorA.speed(), myDelta ) ) or 
-        ( not closeEnough(backSpeed, motorB.speed(), myDelta ) ) ):
-        print("Change Speed or Direction")
-        motorControl.changeSpeed(frontSpeed=potA.read_u16(), backSpeed=potB.read_u16())
+# Scheduled Event: time to sample the potentiometers.
+#
+# It turns out that each time the potentiometers are read, their value might
+# change even if the knob is not being turned.  The PotFilter objects oversample
+# and filter the readings, and only publish a new value when the filtered value
+# has moved more than myDelta.  The motors are only updated when a published
+# value changes.
+def sampleSpeeds( arg ):
+    if ( PROBES ):
+        periodProbe.mark()
+
+    # Both filters must take a sample every time, so do not combine these calls with "or"
+    changedA = potFilterA.sample()
+    changedB = potFilterB.sample()
+
+    if ( changedA or changedB ):
+        if ( idleManager != None ):
+            idleManager.touch()
+        updateMotors()
 
         # print("Motor A: PWM: ", motorA.pwm(), 
         #   " Direction:", motorA.direction(), 
-        #   ", IN1: [", getPinID(motorA.signal1Pin()),
+        #   ", IN1: [", motorA.gpioIN1,
         #   ", Flag: ", motorA.signal1(), ", Value: ", motorA.signal1Pin().value(), "]",
-        #   ", IN2: [", getPinID(motorA.signal2Pin()),
+        #   ", IN2: [", motorA.gpioIN2,
         #   ", Flag: ", motorA.signal2(), ", Value: ", motorA.signal2Pin().value(), "]",
         #   ", Speed: ", motorA.speed() )
         
         # print("Motor B: PWM: ", motorB.pwm(),
         #   " Direction:", motorB.direction(), 
-        #   ", IN1: [", getPinID(motorB.signal1Pin()),
+        #   ", IN1: [", motorB.gpioIN1,
         #   ", Flag: ", motorB.signal1(), ", Value: ", motorB.signal1Pin().value(), "]",
-        #   ", IN2: [", getPinID(motorB.signal2Pin()),
+        #   ", IN2: [", motorB.gpioIN2,
         #   ", Flag: ", motorB.signal2(), ", Value: ", motorB.signal2Pin().value(), "]",
         #   ", Speed: ", motorB.speed() )
 
-  
-    #print("Pot A: ", potA.read_u16(), "  Pot B: ", potB.read_u16())
+    #print("Pot A: ", potFilterA.filteredValue(), "  Pot B: ", potFilterB.filteredValue())
+    # End of sampleSpeeds()
+
+# Timer Interrupt Handler for sampling the potentiometers.
+#
+# ADC reads and H-Bridge writes are not done in the interrupt handler.  They are
+# scheduled to run as soon as the handler returns.
+def potTimerHandler( timer ):
+    scheduleEvent(sampleSpeeds, None)
+
+potTimer    = None
+idleManager = None      # See Low power idle below
 
-    # Sleep for 1 second and repeat loop.  This time can be made smaller if the response
-    # time between changes (buttons pushed or potentiometers turned) is too sluggish.
-    utime.sleep(1)
+# buttonAction() looks at these as soon as the button interrupts are attached,
+# so they are set here, before the calibration and the frequency sweep run.
+profilePlayer = None    # See Test profiles below
+controlCore   = False   # True once the control loop is running on the second core
+calibrating   = False   # True while the motors are being calibrated or swept
+
+# Setting up Interrup Handlers
+#
+# If multiple Interrupt Handlers are assigned to the same Pin for different
+# triggers, only the last one set will run.
+#
+# Each ButtonInfo object handles both the rising (Pressed Button) and falling
+# (Released Button) edges of its own pin and debounces them with a timer, so
+# the interrupt handlers never wait for a button to stop bouncing.  See the
+# ButtonInfo class.  When a press has been debounced, buttonAction() is
+# scheduled with the button's GPIO Pin Number.
+
+#print("Initializing Button Interrupt Handlers")
 
+# How long after an edge further edges are treated as bounce, in milliseconds
+debounceMs = 50
+
+buttons[gpioButtonA].attach(pinButtonA, buttonAction, debounceMs)
+buttons[gpioButtonB].attach(pinButtonB, buttonAction, debounceMs)
+
+
+print("Starting Event Loop")
+
+# Difference between the filtered potentiometer value and the published speed
+# that is treated as the potentiometer being turned.
+myDelta = 1000
+
+# How often the potentiometers are sampled, in milliseconds.  Button presses
+# do not wait for this period; they are handled as soon as they are debounced.
+potSampleMs = 20
+
+# Each sample averages potOversample ADC reads, and the median of the last
+# potWindow samples is the filtered value.
+potOversample = 4
+potWindow     = 5
+
+potFilterA = PotFilter(potA, size=potWindow, oversample=potOversample, mode=PotFilter.MEDIAN, hysteresis=myDelta)
+potFilterB = PotFilter(potB, size=potWindow, oversample=potOversample, mode=PotFilter.MEDIAN, hysteresis=myDelta)
+
+# Background ADC capture.  With adcCapture set to ADC_TIMER or ADC_DMA, the
+# potentiometers are not read in sampleSpeeds().  Both ADC channels are
+# converted in turn in the background, adcSampleHz times a second each, into
+# blocks of adcBlockSamples.  Each full block gives each PotFilter one sample,
+# the average of the block.  With ADC_DMA the CPU does no conversions at all.
+# Not used with test profiles or in dual core mode.
+ADC_OFF   = 0
+ADC_TIMER = 1
+ADC_DMA   = 2
+
+adcCapture      = ADC_OFF
+adcSampleHz     = 2000
+adcBlockSamples = 40        # One block every 20ms at 2000Hz, the same as potSampleMs
+capture         = None
+
+# Interrupt Handler: a block is done
+def captureHandler( capture ):
+    scheduleEvent(sampleBlock, None)
+
+# Scheduled Event: filter the newest block, like sampleSpeeds()
+def sampleBlock( arg ):
+    block = capture.read()
+    if ( block == None ):
+        return
+    if ( PROBES ):
+        periodProbe.mark()
+
+    # Both filters must take a sample every time, so do not combine these calls with "or"
+    changedA = potFilterA.addReading(capture.average(block, 0))
+    changedB = potFilterB.addReading(capture.average(block, 1))
+
+    if ( changedA or changedB ):
+        updateMotors()
+
+if ( adcCapture == ADC_DMA ):
+    from AdcDmaBackend import AdcDmaBackend
+    capture = AdcCapture([gpioPotA - 26, gpioPotB - 26], adcBlockSamples, AdcDmaBackend())
+elif ( adcCapture == ADC_TIMER ):
+    from AdcTimerBackend import AdcTimerBackend
+    capture = AdcCapture([gpioPotA - 26, gpioPotB - 26], adcBlockSamples, AdcTimerBackend())
+
+# Motor speed ramping.  Every 1/rampHz seconds the duty moves at most rampRate
+# counts towards the new speed, so full speed is reached in 65535 / rampRate
+# ticks.  A change of direction ramps down through zero.  Setting rampJerk
+# above 0 gives an S-curve, and setting rampRate to 0 turns ramping off.
+rampHz      = 1000
+rampRate    = 256
+rampJerk    = 0
+rampRunning = False
+rampTimer   = Timer()
+motorControl.setRamp(rampRate, rampJerk)
+
+# What the motors do when they are STOPPED: TTMotor.STOP_COAST lets them spin
+# down on their own, TTMotor.STOP_BRAKE short brakes them, TTMotor.STOP_BRAKE_COAST
+# brakes for stopBrakeMs then coasts, and TTMotor.STOP_STANDBY coasts and puts
+# the H-Bridge in standby once both motors are stopped.  The brake only stops a
+# motor faster with ramping off, as a ramp slows the motor down first.
+stopMode    = TTMotor.STOP_COAST
+stopBrakeMs = 100
+motorControl.setStopMode(stopMode, stopBrakeMs)
+
+# Dual core mode.  When dualCore is True, the second core runs the motor
+# control loop every controlLoopUs: it samples and filters the potentiometers,
+# and writes the speeds, directions, ramp steps and closed loop updates to the
+# H-Bridge.  Core 0 keeps the button interrupts, printing and telemetry.  The
+# cores only talk through two Mailboxes, so a print held up by a slow USB host
+# does not hold up the motors.  Not used with test profiles.
+dualCore       = False
+controlLoopUs  = 1000
+controlRunning = False
+
+# Messages from core 0 to the control loop
+CMD_TOGGLE    = 1           # a = GPIO Pin Number of the button pushed
+
+# Messages from the control loop to core 0
+EVT_DIRECTION = 1           # a = GPIO Pin Number of the button, b = new direction
+EVT_SPEED     = 2           # a = motor A speed, b = motor B speed
+
+commands = Mailbox(8)
+events   = Mailbox(16)
+
+# The control loop that runs on the second core.
+#
+# The loop keeps to a fixed period by sleeping until the next multiple of
+# controlLoopUs.  Nothing in the loop allocates or prints; anything core 0
+# should know about is put in the events Mailbox.
+def controlLoop():
+    message      = array("i", [0, 0, 0, 0])
+    sampleEvery  = potSampleMs * 1000 // controlLoopUs
+    controlEvery = 1000000 // (controlHz * controlLoopUs) if controlHz > 0 else 0
+    sampleCount  = sampleEvery
+    controlCount = 0
+    nextTicks    = utime.ticks_us()
+
+    while ( controlRunning ):
+        changed = False
+        while ( commands.get(message) ):
+            if ( message[0] == CMD_TOGGLE ):
+                direction = motorControl.toggleDirection(message[1])
+                events.put(EVT_DIRECTION, message[1], direction)
+                changed = True
+
+        sampleCount += 1
+        if ( sampleCount >= sampleEvery ):
+            sampleCount = 0
+            if ( PROBES ):
+                periodProbe.mark()
+            # Both filters must take a sample every time, so do not combine these calls with "or"
+            changedA = potFilterA.sample()
+            changedB = potFilterB.sample()
+            if ( changedA or changedB ):
+                events.put(EVT_SPEED, potFilterA.value(), potFilterB.value())
+                changed = True
+
+        if ( changed ):
+            motorControl.changeSpeed(frontSpeed=calibrationA.duty(potFilterA.value(), motorA.direction() != TTMotor.STOPPED),
+                                     backSpeed=calibrationB.duty(potFilterB.value(), motorB.direction() != TTMotor.STOPPED))
+        if ( rampRate > 0 ):
+            motorControl.rampTick()
+        if ( controlTimer == None and controlEvery > 0 ):
+            controlCount += 1
+            if ( controlCount >= controlEvery ):
+                controlCount = 0
+                motorControl.controlTick()
+
+        nextTicks = utime.ticks_add(nextTicks, controlLoopUs)
+        waitUs    = utime.ticks_diff(nextTicks, utime.ticks_us())
+        if ( waitUs > 0 ):
+            utime.sleep_us(waitUs)
+        else:
+            # Fell behind; start the next period from now rather than catching up
+            nextTicks = utime.ticks_us()
+
+# Log the messages from the control loop.  Runs on core 0 in the main loop.
+eventMessage = array("i", [0, 0, 0, 0])
+def printEvents():
+    while ( events.get(eventMessage) ):
+        if ( eventMessage[0] == EVT_DIRECTION ):
+            logger.log(Logger.INFO, MSG_BUTTON, eventMessage[1], eventMessage[2])
+        elif ( eventMessage[0] == EVT_SPEED ):
+            logger.log(Logger.INFO, MSG_CHANGE)
+
+# Closed loop speed control.  A motor with an encoder has its duty set by a PID
+# controller, controlHz times a second, to hold the RPM set by its
+# potentiometer, with 65535 being maxRpm.  The PID gains are fixed point with
+# 256 being 1.0; pidKff feeds the duty for the target RPM forward.
+controlHz  = 50
+maxRpm     = 200
+encoderPPR = 20
+pidKp      = 256 * 200
+pidKi      = 256 * 60
+pidKd      = 0
+pidKff     = 256 * 65535 // maxRpm
+
+# Timer Interrupt Handler for closed loop control
+def controlTimerHandler( timer ):
+    motorControl.controlTick()
+
+# The control timer is started after the calibration, which drives the motors itself
+controlTimer = None
+for gpioEnc, motor in ((gpioEncA, motorA), (gpioEncB, motorB)):
+    if ( gpioEnc >= 0 ):
+        motor.attachEncoder(Encoder(gpioEnc, pulsesPerRev=encoderPPR),
+                            PIDControl(pidKp, pidKi, pidKd, pidKff), maxRpm)
+
+# Calibration.  The start and stall duties of each motor and the range of each
+# potentiometer are kept in calibrationFile.  When it is there, the
+# potentiometer values are mapped to duties with a lookup table so that the
+# whole knob is useful: the bottom calibrationOffBand counts are off and the
+# rest runs from the stall duty to full speed, with a motor that is not yet
+# running given the start duty.  Open loop motors only; in
+# closed loop the potentiometer sets the RPM.
+#
+# Setting calibrate to True measures everything again at start up and saves it.
+# A motor with an encoder is measured on its own.  For a motor without one,
+# hold its button down while the wheel turns as the duty goes up and then down.
+# Then turn each potentiometer all the way both ways within potRangeMs.
+calibrate           = False
+calibrationFile     = "calibration.json"
+calibrationOffBand  = 1500
+calibrationSettleMs = 300
+potRangeMs          = 5000
+
+calibrationA = MotorCalibration(offBand=calibrationOffBand)
+calibrationB = MotorCalibration(offBand=calibrationOffBand)
+calibrations = { "A": calibrationA, "B": calibrationB }
+
+def calibrateMotor( name, motor, calibration, pinButton, potFilter ):
+    if ( motor.isClosedLoop() ):
+        print("Motor ", name, ": measuring with its encoder")
+        isMoving = lambda: motor.encoder.moved()
+    else:
+        print("Motor ", name, ": hold its button down while the wheel turns")
+        isMoving = lambda: pinButton.value() == 1
+
+    if ( calibration.measureDeadBand(motorControl, motor, isMoving, settleMs=calibrationSettleMs) ):
+        print("Motor ", name, ": start duty ", calibration.startDuty, ", stall duty ", calibration.stallDuty)
+    else:
+        print("Motor ", name, ": did not start")
+
+    print("Potentiometer ", name, ": turn it all the way both ways")
+    calibration.measurePotRange(potFilter, potRangeMs)
+    print("Potentiometer ", name, ": ", calibration.potMin, " to ", calibration.potMax)
+
+if ( calibrate ):
+    # The PWM frequencies found by an earlier sweep are not measured here, so
+    # keep them from the saved file
+    saved = { name: MotorCalibration() for name in calibrations }
+    if ( loadCalibrations(calibrationFile, saved) ):
+        for name, calibration in calibrations.items():
+            calibration.pwmFreq = saved[name].pwmFreq
+    calibrating = True
+    calibrateMotor("A", motorA, calibrationA, pinButtonA, potFilterA)
+    calibrateMotor("B", motorB, calibrationB, pinButtonB, potFilterB)
+    saveCalibrations(calibrationFile, calibrations)
+    calibrating = False
+elif ( loadCalibrations(calibrationFile, calibrations) ):
+    print("Calibration loaded from ", calibrationFile)
+
+# Frequency sweep.  With sweepFreqs set to a list of frequencies, each motor in
+# turn is driven at each of sweepDuties at every frequency, and the frequency
+# that gives the most speed for the current is saved in calibrationFile.  The
+# speed is read from the motor's encoder and the current from the current
+# sense amplifier on gpioCurrent, which gives currentCountsPerAmp ADC counts
+# per amp.  With only one of them, the frequency with the most speed, or the
+# least current, is taken.  See FrequencySweep.py.
+sweepFreqs          = []
+sweepDuties         = [16000, 24000, 40000, 65535]
+sweepSettleMs       = 300
+sweepHoldMs         = 500
+currentCountsPerAmp = 19859     # 1V per amp, e.g. an INA169 with a 0.1 ohm shunt and a 10k load
+
+currentSense = None
+if ( gpioCurrent >= 0 ):
+    currentSense = ADC(Pin(gpioCurrent))
+
+# Sensors for the sweep: the motor's RPM, and the battery current in mA
+def readSpeed( motor ):
+    return motor.encoder.update()
+
+def readCurrent( motor ):
+    return currentSense.read_u16() * 1000 // currentCountsPerAmp
+
+def sweepMotor( name, motor, calibration ):
+    speedSensor   = readSpeed if motor.isClosedLoop() else None
+    currentSensor = readCurrent if currentSense != None else None
+    if ( speedSensor == None and currentSensor == None ):
+        print("Motor ", name, ": no encoder or current sensor to sweep with")
+        return
+    sweep = FrequencySweep(motorControl, sweepFreqs, sweepDuties, speedSensor, currentSensor,
+                           settleMs=sweepSettleMs, holdMs=sweepHoldMs)
+    print("Motor ", name, ": sweeping ", len(sweepFreqs), " frequencies for ", sweep.runMs() // 1000, "s")
+    calibration.pwmFreq = sweep.run(motor)
+    for freq, score in sweep.scores(motor.gpioPWM):
+        print("  ", freq, "Hz: score ", score)
+    print("Motor ", name, ": best frequency ", calibration.pwmFreq, "Hz")
+
+if ( sweepFreqs ):
+    calibrating = True
+    sweepMotor("A", motorA, calibrationA)
+    sweepMotor("B", motorB, calibrationB)
+    saveCalibrations(calibrationFile, calibrations)
+    calibrating = False
+
+# Use the frequencies found by a sweep.  One that cannot be used, because the
+# motors share a PWM slice, is reported and the motor keeps its frequency.
+for name, motor, calibration in (("A", motorA, calibrationA), ("B", motorB, calibrationB)):
+    if ( calibration.pwmFreq > 0 and calibration.pwmFreq != motor.frequency() ):
+        try:
+            motorControl.setFrequency(calibration.pwmFreq, motor.gpioPWM)
+        except ValueError as error:
+            print("Motor ", name, ": ", error)
+
+for motor, calibration in ((motorA, calibrationA), (motorB, calibrationB)):
+    if ( calibration.isCalibrated() and not motor.isClosedLoop() ):
+        calibration.buildTable()
+
+# In dual core mode the control loop runs the closed loop updates instead of a timer
+if ( (motorA.isClosedLoop() or motorB.isClosedLoop()) and not dualCore ):
+    controlTimer = Timer(mode=Timer.PERIODIC, freq=controlHz, callback=controlTimerHandler)
+
+# Test profiles.  When profileHz is above 0, the motors play the profiles built
+# by buildProfiles() instead of following the potentiometers, and either button
+# starts and stops the profile.  The profiles are worked out before they start,
+# so each run of a test is the same.  Ramping is turned off so the motors
+# follow the profile exactly.
+profileHz     = 0
+profileLoop   = True
+
+# Motor A: step, ramp and sine wave forward.  Motor B: the same, backward.
+def buildProfiles():
+    tables = []
+    for sign in (1, -1):
+        profile = MotorProfile(profileHz)
+        profile.step(0, 1000)
+        profile.step(sign * 30000, 2000)
+        profile.ramp(sign * 30000, sign * 65535, 2000)
+        profile.step(sign * 65535, 2000)
+        profile.ramp(sign * 65535, 0, 2000)
+        profile.sine(sign * 40000, 20000, 2000, 6000)
+        profile.step(0, 1000)
+        tables.append(profile.build())
+    return tables
+
+if ( profileHz > 0 ):
+    motorControl.setRamp(0)
+    profileA, profileB = buildProfiles()
+    profilePlayer = ProfilePlayer(motorControl, profileHz)
+    profilePlayer.load(gpioPWA, profileA)
+    profilePlayer.load(gpioPWB, profileB)
+    print("Profile: ", len(profileA), " ticks at ", profileHz, "Hz")
+    profilePlayer.start(loop=profileLoop)
+elif ( dualCore ):
+    # The control loop takes the first samples and sets the initial speeds
+    print("Starting control loop on core 1")
+    controlRunning = True
+    controlCore    = True
+    _thread.start_new_thread(controlLoop, ())
+else:
+    # Set the motors to the initial potentiometer speeds, then let the timer take over
+    potFilterA.sample()
+    potFilterB.sample()
+    updateMotors()
+    if ( capture != None ):
+        print("Starting ADC capture at ", adcSampleHz, "Hz")
+        capture.start(adcSampleHz, captureHandler)
+    else:
+        potTimer = Timer(mode=Timer.PERIODIC, period=potSampleMs, callback=potTimerHandler)
+
+# Time from the start of the imports to the motors being given their first
+# speeds, or to the start of the profile or of the control loop on core 1.
+# With ramping on, the ramp towards the first speeds starts here.
+startupUs = utime.ticks_diff(utime.ticks_us(), startUs)
+
+# Remote control.  When remoteControl is True, the motors can also be driven by
+# binary command frames sent over the USB serial port, e.g. with
+# host/CommandClient.py.  The main loop reads the frames as they arrive.  Ctrl-C
+# is turned off, as a command frame may hold a 0x03 byte, so stop the program
+# with the RUN button.  A knob that is turned still sets its motor's speed.
+# Not used in dual core mode.
+remoteControl = False
+remote        = None
+
+# Called after a command frame changed the motors
+def remoteChanged():
+    if ( idleManager != None ):
+        idleManager.touch()
+    if ( motorControl.batched ):
+        motorControl.writePins()
+    motorControl.updateStandby()
+    startRamp()
+
+if ( remoteControl and not dualCore ):
+    micropython.kbd_intr(-1)
+    remote = CommandProtocol([motorA, motorB], sys.stdout.buffer, player=profilePlayer, changed=remoteChanged)
+    remote.open(sys.stdin.buffer)
+
+# Telemetry.  When telemetryHz is above 0, a record of the potentiometers and
+# both motors is taken telemetryHz times a second and streamed over the USB
+# serial port as binary frames.  Decode a capture with host/TelemetryDecoder.py.
+# The records are sent from the main loop once telemetryBatch are waiting, so a
+# slow USB host only holds up the main loop and never the motor control.
+telemetryHz      = 0
+telemetryBatch   = 50
+telemetryRecords = 512
+telemetry        = None
+telemetryStream  = None
+
+if ( telemetryHz > 0 ):
+    telemetry = Telemetry([motorA, motorB], [potFilterA, potFilterB], records=telemetryRecords)
+    # Write the frames as bytes, without any text encoding
+    telemetryStream = sys.stdout.buffer
+    telemetry.start(telemetryHz)
+
+# Status printing.  When statusMs is above 0, the motor speeds and directions
+# are printed every statusMs milliseconds.
+statusMs    = 0
+statusTimer = None
+
+def printStatus( arg ):
+    logger.log(Logger.INFO, MSG_STATUS, motorA.direction(), motorA.speed(), motorA.dutyValue,
+               motorB.direction(), motorB.speed(), motorB.dutyValue)
+
+def statusTimerHandler( timer ):
+    scheduleEvent(printStatus, None)
+
+if ( statusMs > 0 ):
+    statusTimer = Timer(mode=Timer.PERIODIC, period=statusMs, callback=statusTimerHandler)
+
+# Latency probe dump.  With PROBES set to 1 and probeDumpMs above 0, every
+# probe's histogram is printed every probeDumpMs milliseconds.  dumpProbes()
+# can also be called from the REPL once the program is stopped.
+probeDumpMs    = 0
+probeDumpTimer = None
+
+def dumpTimerHandler( timer ):
+    scheduleEvent(dumpEvent, None)
+
+def dumpEvent( arg ):
+    dumpProbes()
+
+if ( PROBES and probeDumpMs > 0 ):
+    probeDumpTimer = Timer(mode=Timer.PERIODIC, period=probeDumpMs, callback=dumpTimerHandler)
+
+# Low power idle.  When idleMs is above 0 and every motor has been stopped,
+# with no button pressed and no knob turned, for idleMs milliseconds, the
+# H-Bridge is put in standby and the Pico in lightsleep.  A button press wakes
+# it straight away; the knobs are checked every idlePollMs and wake it when one
+# moves more than idlePotDelta.  Only used when the potentiometers are sampled
+# by potTimer and there is no remote control, which cannot wake a sleeping
+# Pico.  Turn off the status and telemetry timers too, or they keep waking it.
+idleMs       = 0
+idlePollMs   = 200
+idlePotDelta = 2000
+
+def idleSleep():
+    potTimer.deinit()
+    print("Idle: sleeping, ", idleManager.sleptMs, "ms asleep before this")
+
+def idleWake():
+    potTimer.init(mode=Timer.PERIODIC, period=potSampleMs, callback=potTimerHandler)
+    # The filters were restarted, so this publishes the knobs where they are now
+    sampleSpeeds(None)
+
+if ( idleMs > 0 and potTimer != None and remote == None ):
+    idleManager = IdleManager(motorControl, [potFilterA, potFilterB],
+                              idleMs=idleMs, pollMs=idlePollMs, potDelta=idlePotDelta)
+    idleManager.setHandlers(idleSleep, idleWake)
+
+# Start up report.  When startupReport is True, the time the start up took and
+# the free memory once it is done are printed before the main loop starts.
+# Loading the modules from .mpy files, or freezing them into the firmware,
+# makes both better.  See host/BuildFirmware.py.
+startupReport = True
+
+if ( startupReport ):
+    gc.collect()
+    print("Start up: ", startupUs, "us to the first motor speeds, ", gc.mem_free(), " bytes free")
+
+# All of the work is done by the scheduled events, or by the control loop on
+# the second core.  The main loop only waits for the next interrupt so the Pico
+# is idle between events, and writes out the log and the control loop's
+# messages, reads any remote commands and sends any telemetry.  When the test bed has been idle
+# long enough, the idle manager puts it to sleep until it is used again.
+while True:
+    idle()
+    if ( idleManager != None ):
+        idleManager.check()
+    if ( controlCore ):
+        printEvents()
+    logger.drain()
+    if ( remote != None ):
+        remote.service()
+    if ( telemetry != None ):
+        telemetry.drain(telemetryStream, telemetryBatch)
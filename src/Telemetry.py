@@ -0,0 +1,162 @@
+# Class for recording motor telemetry into a preallocated ring buffer and
+# streaming it out as compact binary frames.
+#
+# Each record is a fixed size and holds:
+#   - The time, utime.ticks_us(), as an unsigned 32 bit value
+#   - The published value of each potentiometer, unsigned 16 bits each
+#   - For each motor, the duty last written (unsigned 16 bits) and a flags byte:
+#     bits 0-1 the current direction, bit 2 IN1 and bit 3 IN2
+#
+# All values are little endian.  record() is called from a timer at a fixed
+# rate, or from any other point in the control path.  It only packs values into
+# the ring buffer, so it does not allocate and never waits.  If the ring buffer
+# is full the record is dropped and counted.
+#
+# drain() is called from the main loop and writes the waiting records as frames:
+#
+#   0xA5 0x5A  layout  count  sequence(16 bits)  dropped(16 bits)  records...
+#
+# layout is the number of potentiometers in the high 4 bits and the number of
+# motors in the low 4 bits, which gives the record size.  sequence counts frames
+# and dropped is the total number of records dropped, both wrapping at 65536.
+# The host side decoder is host/TelemetryDecoder.py.
+#
+
+import struct
+import utime
+
+from machine import Timer
+
+class Telemetry:
+    """Fixed record telemetry ring buffer with binary frame output."""
+
+    SYNC1       = 0xA5
+    SYNC2       = 0x5A
+    HEADER_SIZE = 8
+    MAX_FRAME   = 255   # Most records in one frame
+
+    # Constructor
+    #
+    # @param motors   List of TTMotor objects to record
+    # @param pots     List of PotFilter objects to record
+    # @param records  Number of records the ring buffer holds
+    def __init__(self, motors, pots, records=256):
+        if ( len(motors) > 15 or len(pots) > 15 ):
+            raise ValueError("Telemetry Constructor: At most 15 motors and 15 potentiometers")
+
+        self.motors     = list(motors)
+        self.pots       = list(pots)
+        self.layout     = (len(self.pots) << 4) | len(self.motors)
+        self.recordSize = 4 + 2 * len(self.pots) + 3 * len(self.motors)
+        self.records    = records
+
+        self.buffer  = bytearray(records * self.recordSize)
+        self.view    = memoryview(self.buffer)
+        self.header  = bytearray(self.HEADER_SIZE)
+        self.head    = 0     # Next record to write, only changed by record()
+        self.tail    = 0     # Next record to send, only changed by drain()
+
+        self.sequence = 0
+        self.dropped  = 0
+        self.recorded = 0
+
+        self.timer         = None
+        self.timerHandler  = self.timerRecord   # Bound once so the timer does not allocate
+
+    # Returns the number of records waiting to be sent
+    def pending(self):
+        count = self.head - self.tail
+        if ( count < 0 ):
+            count += self.records
+        return count
+
+    # Add a record of the current state to the ring buffer.
+    #
+    # Returns False if the ring buffer was full and the record was dropped.
+    def record(self):
+        head     = self.head
+        nextHead = head + 1
+        if ( nextHead >= self.records ):
+            nextHead = 0
+        if ( nextHead == self.tail ):
+            self.dropped += 1
+            return False
+
+        buffer = self.buffer
+        offset = head * self.recordSize
+        struct.pack_into("<I", buffer, offset, utime.ticks_us())
+        offset += 4
+        for pot in self.pots:
+            struct.pack_into("<H", buffer, offset, pot.value())
+            offset += 2
+        for motor in self.motors:
+            flags = motor.currentDirection
+            if ( motor.IN1Value ):
+                flags |= 4
+            if ( motor.IN2Value ):
+                flags |= 8
+            struct.pack_into("<HB", buffer, offset, motor.dutyValue, flags)
+            offset += 3
+
+        # Only publish the record once it is complete
+        self.head = nextHead
+        self.recorded += 1
+        return True
+
+    # Timer Interrupt Handler: record one sample
+    def timerRecord(self, timer):
+        self.record()
+
+    # Record from a timer at a fixed rate
+    #
+    # @param hz   Records per second
+    def start(self, hz: int):
+        if ( self.timer == None ):
+            self.timer = Timer()
+        self.timer.init(mode=Timer.PERIODIC, freq=hz, callback=self.timerHandler)
+
+    def stop(self):
+        if ( self.timer != None ):
+            self.timer.deinit()
+
+    # Write the waiting records to a stream as frames.
+    #
+    # Only the main loop is held up if the stream is slow.  The timer keeps
+    # recording and drops records if the ring buffer fills up.
+    #
+    # @param stream      Object with a write() method that takes bytes, e.g. sys.stdout.buffer
+    # @param minRecords  Do nothing unless at least this many records are waiting
+    #
+    # Returns the number of records written.
+    def drain(self, stream, minRecords=1):
+        written = 0
+        count   = self.pending()
+        if ( count < minRecords ):
+            return 0
+
+        while ( count > 0 ):
+            # A frame holds records that are next to each other in the ring buffer
+            tail = self.tail
+            if ( count > self.records - tail ):
+                count = self.records - tail
+            if ( count > self.MAX_FRAME ):
+                count = self.MAX_FRAME
+
+            struct.pack_into("<BBBBHH", self.header, 0, self.SYNC1, self.SYNC2, self.layout, count,
+                             self.sequence, self.dropped & 0xFFFF)
+            stream.write(self.header)
+            stream.write(self.view[tail * self.recordSize:(tail + count) * self.recordSize])
+
+            tail += count
+            if ( tail >= self.records ):
+                tail = 0
+            self.tail     = tail
+            self.sequence = (self.sequence + 1) & 0xFFFF
+            written      += count
+            count         = self.pending()
+
+        return written
+
+    #
+    # End of Telemetry class
+    #